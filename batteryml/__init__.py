@@ -1,27 +1,29 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .data import (
-    BatteryData,
-    CycleData,
-    CyclingProtocol,
-    DataBundle,
-    ZScoreDataTransformation,
-    LogScaleDataTransformation,
-    SequentialDataTransformation
-)
-from .models import CNNRULPredictor
-from .feature import (
-    VarianceModelFeatureExtractor,
-    DischargeModelFeatureExtractor,
-    FullModelFeatureExtractor,
-    VoltageCapacityMatrixFeatureExtractor,
-)
-from .label import RULLabelAnnotator
-from .train_test_split import (
-    MATRPrimaryTestTrainTestSplitter,
-    MATRSecondaryTestTrainTestSplitter,
-    MATRCLOTestTrainTestSplitter,
-    RandomTrainTestSplitter,
-    HUSTTrainTestSplitter
-)
+# The subpackages only register their classes by name here, the modules
+# with heavy dependencies, such as torch, sklearn and numba, are imported
+# when the classes are first built or accessed.
+from .utils import lazy_exports
+from . import data, models, feature, label, train_test_split, preprocess
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'BatteryData': '.data',
+    'CycleData': '.data',
+    'CyclingProtocol': '.data',
+    'DataBundle': '.data',
+    'ZScoreDataTransformation': '.data',
+    'LogScaleDataTransformation': '.data',
+    'SequentialDataTransformation': '.data',
+    'CNNRULPredictor': '.models',
+    'VarianceModelFeatureExtractor': '.feature',
+    'DischargeModelFeatureExtractor': '.feature',
+    'FullModelFeatureExtractor': '.feature',
+    'VoltageCapacityMatrixFeatureExtractor': '.feature',
+    'RULLabelAnnotator': '.label',
+    'MATRPrimaryTestTrainTestSplitter': '.train_test_split',
+    'MATRSecondaryTestTrainTestSplitter': '.train_test_split',
+    'MATRCLOTestTrainTestSplitter': '.train_test_split',
+    'RandomTrainTestSplitter': '.train_test_split',
+    'HUSTTrainTestSplitter': '.train_test_split',
+})
@@ -1,10 +1,18 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .databundle import DataBundle
-from .battery_data import BatteryData, CycleData, CyclingProtocol
-from .transformation import (
-    ZScoreDataTransformation,
-    LogScaleDataTransformation,
-    SequentialDataTransformation
-)
+from batteryml.utils import lazy_exports
+
+from . import transformation
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'DataBundle': '.databundle',
+    'BatteryData': '.battery_data',
+    'CycleData': '.battery_data',
+    'CyclingProtocol': '.battery_data',
+    'RaggedTensor': '.ragged',
+    'WindowDataset': '.window',
+    'ZScoreDataTransformation': '.transformation',
+    'LogScaleDataTransformation': '.transformation',
+    'SequentialDataTransformation': '.transformation',
+})
@@ -154,15 +154,22 @@ class BatteryData:
     def load(path):
         with open(path, 'rb') as fin:
             obj = pickle.load(fin)
-        if obj['charge_protocol'] is not None:
+        return BatteryData.from_dict(obj)
+
+    @staticmethod
+    def from_dict(obj: dict):
+        """Build the cell from the output of `to_dict`."""
+        obj = dict(obj)
+        if obj.get('charge_protocol') is not None:
             obj['charge_protocol'] = [
                 CyclingProtocol(**protocol)
                 for protocol in obj['charge_protocol']
             ]
-        if obj['discharge_protocol'] is not None:
+        if obj.get('discharge_protocol') is not None:
             obj['discharge_protocol'] = [
                 CyclingProtocol(**protocol)
                 for protocol in obj['discharge_protocol']
             ]
-        obj['cycle_data'] = [CycleData(**data) for data in obj['cycle_data']]
+        obj['cycle_data'] = [
+            CycleData(**data) for data in obj.get('cycle_data') or []]
         return BatteryData(**obj)
@@ -4,15 +4,39 @@
 import torch
 import pickle
 
-from batteryml.data.transformation.base import BaseDataTransformation
+from typing import List, Union
+
+from batteryml.data.transformation.base import (
+    BaseDataTransformation,
+    CHUNK_ELEMENTS,
+    iter_chunks
+)
+from batteryml.evaluation import INTERVAL_METRICS, Evaluator
 
 
 class Dataset:
-    def __init__(self, feature: torch.Tensor, label: torch.Tensor):
+    def __init__(self,
+                 feature: torch.Tensor,
+                 label: torch.Tensor,
+                 cell_ids: list = None,
+                 cycle_indices: torch.Tensor = None):
+        """
+        Args:
+            cell_ids (list): cell of each example.
+            cycle_indices (torch.Tensor): cycle of each example, for the
+                datasets with many examples per cell.
+        """
         assert len(feature) == len(label), (len(feature), len(label))
+        if cell_ids is not None:
+            assert len(cell_ids) == len(label), (len(cell_ids), len(label))
+        if cycle_indices is not None:
+            assert len(cycle_indices) == len(label), \
+                (len(cycle_indices), len(label))
 
         self.label = label
         self.feature = feature
+        self.cell_ids = cell_ids
+        self.cycle_indices = cycle_indices
 
     def __len__(self):
         return len(self.label)
@@ -27,42 +51,263 @@ class Dataset:
     def device(self):
         return self.label.device
 
+    @property
+    def feature_shape(self) -> torch.Size:
+        return self.feature.shape[1:]
+
+    @property
+    def example_ids(self):
+        """Unique id of each example, the cell id followed by the cycle
+        index if there are many examples per cell."""
+        cell_ids = getattr(self, 'cell_ids', None)
+        cycle_indices = getattr(self, 'cycle_indices', None)
+        if cell_ids is None or cycle_indices is None:
+            return cell_ids
+        return [
+            f'{cell_id}@{cycle}'
+            for cell_id, cycle in zip(cell_ids, cycle_indices.tolist())
+        ]
+
     def to(self, device: str):
         self.label = self.label.to(device)
         self.feature = self.feature.to(device)
         return self
 
 
+class ChunkedDataset(Dataset):
+    """Dataset whose features are kept as chunks of rows, e.g., the
+    outputs of chunked or parallel feature extraction, or views of the
+    rows of a larger tensor, which are never concatenated.
+
+    The features can also be kept untransformed and transformed per batch
+    when loaded, so that the transformed features are never materialized
+    by the neural models. The `feature` attribute still gives all the
+    (transformed) features, e.g., for the sklearn models.
+
+    Args:
+        chunks (List[torch.Tensor]): features of consecutive examples.
+        feature_transformation: fitted transformation applied when the
+            features are loaded, which is moved along with the
+            `DataBundle`.
+    """
+    def __init__(self,
+                 chunks: List[torch.Tensor],
+                 label: torch.Tensor,
+                 feature_transformation: BaseDataTransformation = None,
+                 cell_ids: list = None,
+                 cycle_indices: torch.Tensor = None):
+        assert len(chunks) > 0, 'No chunk of features'
+        lengths = torch.tensor([len(chunk) for chunk in chunks])
+        assert lengths.sum() == len(label), (int(lengths.sum()), len(label))
+        if cell_ids is not None:
+            assert len(cell_ids) == len(label), (len(cell_ids), len(label))
+        if cycle_indices is not None:
+            assert len(cycle_indices) == len(label), \
+                (len(cycle_indices), len(label))
+
+        self.chunks = list(chunks)
+        self.offsets = torch.cat([torch.zeros(1, dtype=torch.long),
+                                  lengths.cumsum(0)])
+        self.label = label
+        self.feature_transformation = feature_transformation
+        self.cell_ids = cell_ids
+        self.cycle_indices = cycle_indices
+
+    @property
+    def feature(self) -> torch.Tensor:
+        return self.features(torch.arange(len(self)))
+
+    @property
+    def feature_shape(self) -> torch.Size:
+        return self.chunks[0].shape[1:]
+
+    def features(self, index) -> torch.Tensor:
+        """(Transformed) features of the examples at `index`."""
+        index = torch.as_tensor(index, dtype=torch.long).view(-1)
+        if len(self.chunks) == 1:
+            feature = self.chunks[0][index.to(self.chunks[0].device)]
+        else:
+            # Chunk of each example, skipping the empty chunks
+            chunk = torch.searchsorted(
+                self.offsets[1:], index, right=True)
+            position = index - self.offsets[chunk]
+            feature = self.chunks[0].new_empty(
+                (len(index), *self.feature_shape))
+            for i in chunk.unique().tolist():
+                mask = chunk == i
+                feature[mask.to(feature.device)] = self.chunks[i][
+                    position[mask].to(feature.device)]
+        feature = feature.float()
+        if self.feature_transformation is not None:
+            # The gathered features are a new tensor
+            feature = self.feature_transformation.transform_(feature)
+        return feature
+
+    def __getitem__(self, item: int):
+        return {
+            'feature': self.features([item])[0],
+            'label': self.label[item]
+        }
+
+    def __getitems__(self, items: List[int]):
+        # Batched loading of `DataLoader`
+        features = self.features(items)
+        return [
+            {'feature': feature, 'label': self.label[item]}
+            for feature, item in zip(features, items)
+        ]
+
+    def to(self, device: str):
+        self.label = self.label.to(device)
+        self.chunks = [chunk.to(device) for chunk in self.chunks]
+        return self
+
+
 class DataBundle:
     def __init__(self,
-                 train_feature: torch.Tensor,
-                 train_label: torch.Tensor,
-                 test_feature: torch.Tensor,
-                 test_label: torch.Tensor,
+                 train_feature: Union[torch.Tensor, List[torch.Tensor]],
+                 train_label: Union[torch.Tensor, List[torch.Tensor]],
+                 test_feature: Union[torch.Tensor, List[torch.Tensor]],
+                 test_label: Union[torch.Tensor, List[torch.Tensor]],
                  feature_transformation: BaseDataTransformation = None,
-                 label_transformation: BaseDataTransformation = None):
-        # Convert the dtype
-        train_feature = train_feature.float()
+                 label_transformation: BaseDataTransformation = None,
+                 train_cell_ids: list = None,
+                 test_cell_ids: list = None,
+                 fit_transformations: bool = True,
+                 train_cycle_indices: torch.Tensor = None,
+                 test_cycle_indices: torch.Tensor = None,
+                 inplace: bool = False,
+                 lazy_feature_transformation: bool = False):
+        """
+        Args:
+            train_feature, test_feature: features, or a list of chunks of
+                the features of consecutive examples which are never
+                concatenated, see `ChunkedDataset`. The transformations are
+                fitted over the chunks in a streaming pass.
+            train_label, test_label: labels, or a list of chunks of them.
+            fit_transformations (bool): fit the transformations on the
+                training data. Set to `False` to apply transformations that
+                are already fitted, e.g., for inference without training
+                data.
+            train_cycle_indices, test_cycle_indices (torch.Tensor): cycle
+                of each example, see `Dataset`.
+            inplace (bool): transform the given float tensors in place
+                instead of copying them, for the callers that own them.
+            lazy_feature_transformation (bool): keep the features
+                untransformed and transform them per batch when loaded,
+                see `ChunkedDataset`.
+        """
+        chunked = isinstance(train_feature, (list, tuple))
+        if chunked:
+            train_feature = [x.float() for x in train_feature]
+            test_feature = [x.float() for x in test_feature]
+        else:
+            train_feature = train_feature.float()
+            test_feature = test_feature.float()
+        # Labels are small enough to be concatenated
+        if isinstance(train_label, (list, tuple)):
+            train_label = torch.cat(train_label)
+        if isinstance(test_label, (list, tuple)):
+            test_label = torch.cat(test_label)
         train_label = train_label.float()
-        test_feature = test_feature.float()
         test_label = test_label.float()
 
         self.feature_transformation = feature_transformation
         self.label_transformation = label_transformation
 
-        # Fit the stateful transformations
+        # Fit the stateful transformations in a streaming pass
+        lazy = lazy_feature_transformation \
+            and feature_transformation is not None
         if feature_transformation is not None:
-            self.feature_transformation.fit(train_feature)
-            train_feature = self.feature_transformation.transform(train_feature)
-            test_feature = self.feature_transformation.transform(test_feature)
+            if fit_transformations and chunked:
+                self.feature_transformation.fit_chunks(
+                    chunk for x in train_feature for chunk in iter_chunks(x))
+            elif fit_transformations:
+                self.feature_transformation.fit(train_feature)
+            if lazy:
+                pass
+            elif chunked:
+                train_feature = self._transform(
+                    self.feature_transformation, inplace, *train_feature)
+                test_feature = self._transform(
+                    self.feature_transformation, inplace, *test_feature)
+            else:
+                train_feature, test_feature = self._transform(
+                    self.feature_transformation, inplace,
+                    train_feature, test_feature)
         if label_transformation is not None:
-            self.label_transformation.fit(train_label)
-            train_label = self.label_transformation.transform(train_label)
-            test_label = self.label_transformation.transform(test_label)
+            if fit_transformations:
+                self.label_transformation.fit(train_label)
+            train_label, test_label = self._transform(
+                self.label_transformation, inplace, train_label, test_label)
 
         # Build datasets
-        self.train_data = Dataset(train_feature, train_label)
-        self.test_data = Dataset(test_feature, test_label)
+        if chunked or lazy:
+            if not chunked:
+                train_feature, test_feature = [train_feature], [test_feature]
+            transformation = self.feature_transformation if lazy else None
+            self.train_data = ChunkedDataset(
+                train_feature, train_label, transformation,
+                train_cell_ids, train_cycle_indices)
+            self.test_data = ChunkedDataset(
+                test_feature, test_label, transformation,
+                test_cell_ids, test_cycle_indices)
+        else:
+            self.train_data = Dataset(
+                train_feature, train_label,
+                train_cell_ids, train_cycle_indices)
+            self.test_data = Dataset(
+                test_feature, test_label, test_cell_ids, test_cycle_indices)
+
+    @staticmethod
+    def _transform(transformation: BaseDataTransformation,
+                   inplace: bool,
+                   *tensors: torch.Tensor) -> list:
+        if inplace:
+            return [transformation.transform_(x) for x in tensors]
+        return [transformation.transform(x) for x in tensors]
+
+    @classmethod
+    def from_datasets(cls,
+                      train_data: Dataset,
+                      test_data: Dataset,
+                      feature_transformation: BaseDataTransformation = None,
+                      label_transformation: BaseDataTransformation = None,
+                      fit_transformations: bool = True) -> 'DataBundle':
+        """Bundle datasets that generate their features when loaded, e.g.,
+        `WindowDataset`, without materializing the features. The feature
+        transformation is fitted in a streaming pass over the batches of
+        the training features and applied by the datasets per batch, see
+        their `feature_transformation`.
+        """
+        bundle = cls.__new__(cls)
+        bundle.feature_transformation = feature_transformation
+        bundle.label_transformation = label_transformation
+
+        if feature_transformation is not None:
+            if fit_transformations:
+                train_data.feature_transformation = None
+                rows = max(1, CHUNK_ELEMENTS // max(
+                    1, train_data.feature_shape.numel()))
+                feature_transformation.fit_chunks(
+                    train_data.features(index)
+                    for index in torch.arange(len(train_data)).split(rows))
+            train_data.feature_transformation = feature_transformation
+            test_data.feature_transformation = feature_transformation
+
+        train_data.label = train_data.label.float()
+        test_data.label = test_data.label.float()
+        if label_transformation is not None:
+            if fit_transformations:
+                label_transformation.fit(train_data.label)
+            train_data.label = label_transformation.transform(
+                train_data.label)
+            test_data.label = label_transformation.transform(
+                test_data.label)
+
+        bundle.train_data = train_data
+        bundle.test_data = test_data
+        return bundle
 
     def to(self, device: str):
         self.train_data = self.train_data.to(device)
@@ -75,37 +320,42 @@ class DataBundle:
 
     @property
     def device(self):
-        return self.train_data.feature.device
+        return self.train_data.device
 
     @torch.no_grad()
-    def evaluate(self, prediction: torch.Tensor, metric: str, data_type: str='test'):
-        if data_type == 'train':
-            target = self.train_data.label
-        else:
-            target = self.test_data.label
-            
-        # target = self.test_data.label
-        if self.label_transformation is not None:
-            target = self.label_transformation.inverse_transform(target)
-            prediction = self.label_transformation.inverse_transform(prediction)
-
-        return self._evaluate_score(target, prediction, metric)
+    def inverse_transform_label(self, label: torch.Tensor) -> torch.Tensor:
+        if self.label_transformation is None:
+            return label
+        return self.label_transformation.inverse_transform(label)
 
-    @staticmethod
-    def _evaluate_score(
-        target: torch.Tensor,
-        prediction: torch.Tensor,
-        metric: str
-    ) -> float:
-        assert metric in ['RMSE', 'MAE', 'MAPE'], metric
-        if metric == 'RMSE':
-            score = torch.mean((target - prediction) ** 2) ** 0.5
-        elif metric == 'MAE':
-            score = torch.mean((target - prediction).abs())
-        else:
-            score = torch.abs((target - prediction) / target).mean()
+    @torch.no_grad()
+    def evaluate(self,
+                 prediction: torch.Tensor,
+                 metric: str,
+                 data_type: str = 'test',
+                 interval: tuple = None):
+        """Score the predictions in the original label scale.
 
-        return float(score)
+        Args:
+            prediction (torch.Tensor): predictions of the (transformed)
+                labels.
+            metric (str): one of `RMSE`, `MAE`, `MAPE`, `R2`, the
+                percentiles of the errors such as `AE_P90`, or the interval
+                metrics `COVERAGE` (fraction of the labels within the
+                prediction intervals) and `WIDTH` (mean interval width),
+                see `batteryml.evaluation`. Use `Evaluator` to compute
+                many metrics at once.
+            data_type (str): `train` or `test`.
+            interval (tuple): lower and upper bounds of the prediction
+                intervals of the (transformed) labels, required by the
+                interval metrics.
+        """
+        if metric in INTERVAL_METRICS:
+            assert interval is not None, \
+                f'Prediction intervals are required by {metric}'
+        report = Evaluator([metric])(
+            self, prediction, interval, data_type=data_type)
+        return report['scores'][metric]
 
     @staticmethod
     def load(path: str):
@@ -0,0 +1,66 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+
+from typing import List
+
+
+class RaggedTensor:
+    """Rows of different lengths, e.g., the examples of every cycle of
+    each cell, stored as the concatenated values and the offsets of the
+    rows instead of a list of tensors.
+
+    Args:
+        values (torch.Tensor): values of all rows concatenated on the first
+            dimension.
+        offsets (torch.Tensor): start of each row in `values` followed by
+            the total length, i.e., `len(rows) + 1` increasing integers.
+    """
+    def __init__(self, values: torch.Tensor, offsets: torch.Tensor):
+        offsets = torch.as_tensor(offsets, dtype=torch.long)
+        assert offsets.ndim == 1 and len(offsets) > 0, offsets.shape
+        assert int(offsets[-1]) == len(values), (offsets[-1], len(values))
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_tensors(cls, tensors: List[torch.Tensor]) -> 'RaggedTensor':
+        lengths = torch.tensor([len(x) for x in tensors], dtype=torch.long)
+        offsets = torch.zeros(len(tensors) + 1, dtype=torch.long)
+        torch.cumsum(lengths, 0, out=offsets[1:])
+        return cls(torch.cat(tensors), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item: int) -> torch.Tensor:
+        return self.values[self.offsets[item]:self.offsets[item + 1]]
+
+    @property
+    def lengths(self) -> torch.Tensor:
+        return self.offsets[1:] - self.offsets[:-1]
+
+    def row_ids(self) -> torch.Tensor:
+        """Row of each value."""
+        return torch.repeat_interleave(
+            torch.arange(len(self)), self.lengths)
+
+    def positions(self) -> torch.Tensor:
+        """Position of each value within its row."""
+        return torch.arange(len(self.values)) \
+            - self.offsets[:-1][self.row_ids()]
+
+    def truncate(self, lengths: torch.Tensor) -> 'RaggedTensor':
+        """Keep the first `lengths[i]` values of the i-th row."""
+        lengths = torch.minimum(torch.as_tensor(lengths), self.lengths)
+        keep = self.positions() < lengths[self.row_ids()]
+        offsets = torch.zeros_like(self.offsets)
+        torch.cumsum(lengths, 0, out=offsets[1:])
+        return RaggedTensor(self.values[keep], offsets)
+
+    def float(self) -> 'RaggedTensor':
+        return RaggedTensor(self.values.float(), self.offsets)
+
+    def to(self, device: str) -> 'RaggedTensor':
+        return RaggedTensor(self.values.to(device), self.offsets)
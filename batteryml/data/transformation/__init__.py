@@ -1,6 +1,15 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .z_score import ZScoreDataTransformation
-from .log_scale import LogScaleDataTransformation
-from .sequential import SequentialDataTransformation
+from batteryml.builders import DATA_TRANSFORMATIONS
+from batteryml.utils import lazy_exports
+
+_EXPORTS = {
+    'ZScoreDataTransformation': '.z_score',
+    'LogScaleDataTransformation': '.log_scale',
+    'SequentialDataTransformation': '.sequential',
+}
+for _name, _module in _EXPORTS.items():
+    DATA_TRANSFORMATIONS.register_lazy(_name, _module, __name__)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -3,18 +3,79 @@
 
 import abc
 import torch
+import torch.nn as nn
+
+from typing import Iterable, Iterator
+
+# Elements of the chunks of the streaming fits and in-place transforms,
+# which bounds the temporaries to a few tens of MB whatever the data size
+CHUNK_ELEMENTS = 1 << 22
+
+
+def iter_chunks(data: torch.Tensor,
+                chunk_elements: int = CHUNK_ELEMENTS
+                ) -> Iterator[torch.Tensor]:
+    """Views of consecutive rows of `data` with about `chunk_elements`
+    elements each, at least a row."""
+    row_elements = max(1, data[0].numel()) if len(data) else 1
+    rows = max(1, chunk_elements // row_elements)
+    for start in range(0, len(data), rows):
+        yield data[start:start + rows]
 
 
 class BaseDataTransformation(abc.ABC):
+    # Whether `fit` learns parameters from the data, the stateless
+    # transformations are skipped when fitting a sequence of them
+    stateful = True
+
     def fit(self, data: torch.Tensor) -> torch.Tensor:
         """Fit the parameters for stateful transformations."""
 
+    def fit_chunks(self, chunks: Iterable[torch.Tensor]):
+        """Fit on the data given as chunks of rows in a single pass, e.g.,
+        without materializing the whole data. Transformations that can not
+        accumulate their statistics concatenate the chunks."""
+        if self.stateful:
+            self.fit(torch.cat(list(chunks)))
+
+    def partial_fit(self, data: torch.Tensor) -> 'BaseDataTransformation':
+        """Update the fitted parameters with more rows, continuing from
+        the data fitted so far, so that the transformation is fitted over
+        data that never exists as a whole."""
+        if self.stateful:
+            raise NotImplementedError(
+                f'{type(self).__name__} can not be fitted partially.')
+        return self
+
+    def merge(self,
+              other: 'BaseDataTransformation') -> 'BaseDataTransformation':
+        """Merge the parameters partially fitted on other data, e.g., in
+        another worker, as if this transformation were fitted on both."""
+        if self.stateful:
+            raise NotImplementedError(
+                f'{type(self).__name__} can not be merged.')
+        return self
+
     def transform(self, data: torch.Tensor) -> torch.Tensor:
         """Transform a data tensor and return a same-sized tensor."""
 
+    @torch.no_grad()
+    def transform_(self, data: torch.Tensor) -> torch.Tensor:
+        """Transform a floating point data tensor in place, chunk by chunk,
+        and return it."""
+        for chunk in iter_chunks(data):
+            chunk.copy_(self.transform(chunk))
+        return data
+
     def inverse_transform(self, data: torch.Tensor) -> torch.Tensor:
         """Inverse-transform a data tensor and return a same-sized tensor."""
 
     def to(self, device):
         """Map the transformation object to specific group."""
         return self
+
+    def to_module(self, inverse: bool = False) -> nn.Module:
+        """Export the fitted (inverse) transformation as a torch module
+        that can be traced into TorchScript or ONNX."""
+        raise NotImplementedError(
+            f'{type(self).__name__} can not be exported.')
@@ -3,6 +3,7 @@
 
 import math
 import torch
+import torch.nn as nn
 
 from functools import partial
 
@@ -16,6 +17,8 @@ def forward(base, x):
 
 @DATA_TRANSFORMATIONS.register()
 class LogScaleDataTransformation(BaseDataTransformation):
+    stateful = False
+
     def __init__(self, base: float = None):
         self.base = base or math.e
         if base is None:
@@ -29,6 +32,28 @@ class LogScaleDataTransformation(BaseDataTransformation):
     def transform(self, data: torch.Tensor) -> torch.Tensor:
         return self._func(data)
 
+    @torch.no_grad()
+    def transform_(self, data: torch.Tensor) -> torch.Tensor:
+        data.log_()
+        if self.base != math.e:
+            data.div_(math.log(self.base))
+        return data
+
     @torch.no_grad()
     def inverse_transform(self, data: torch.Tensor) -> torch.Tensor:
         return self._inv_func(data)
+
+    def to_module(self, inverse: bool = False) -> nn.Module:
+        return LogScaleModule(self.base, inverse)
+
+
+class LogScaleModule(nn.Module):
+    def __init__(self, base: float, inverse: bool):
+        nn.Module.__init__(self)
+        self.base = float(base)
+        self.inverse = inverse
+
+    def forward(self, data: torch.Tensor) -> torch.Tensor:
+        if self.inverse:
+            return torch.pow(self.base, data)
+        return torch.log(data) / math.log(self.base)
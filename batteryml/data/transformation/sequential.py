@@ -1,16 +1,30 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from typing import List
+from typing import Iterable, Iterator, List
 
 import torch
+import torch.nn as nn
 
 from batteryml.builders import DATA_TRANSFORMATIONS
-from batteryml.data.transformation.base import BaseDataTransformation
+from batteryml.data.transformation.base import (
+    BaseDataTransformation,
+    iter_chunks
+)
 
 
 @DATA_TRANSFORMATIONS.register()
 class SequentialDataTransformation(BaseDataTransformation):
+    """Transformations applied one after another.
+
+    Each stateful transformation is fitted in a streaming pass over the
+    chunks of the data, which are transformed in place by the preceding
+    transformations, so that no transformed copy of the whole data is
+    made, and a sequence with a single stateful transformation, e.g., log
+    then z-score, is fitted in one pass. The composed transformation is
+    applied to each chunk in place by `transform_`. Sequences with a
+    single stateful transformation also support `partial_fit` and `merge`.
+    """
     def __init__(self, transformations: List[BaseDataTransformation]):
         self.transformations = []
         for trans in transformations:
@@ -18,16 +32,90 @@ class SequentialDataTransformation(BaseDataTransformation):
                 trans = DATA_TRANSFORMATIONS.build(trans)
             self.transformations.append(trans)
 
+    @property
+    def stateful(self) -> bool:
+        return any(trans.stateful for trans in self.transformations)
+
     @torch.no_grad()
     def fit(self, data: torch.Tensor) -> torch.Tensor:
-        for trans in self.transformations:
-            trans.fit(data)
-            data = trans.transform(data)
+        for i, trans in enumerate(self.transformations):
+            if trans.stateful:
+                trans.fit_chunks(self._transform_chunks(
+                    iter_chunks(data), self.transformations[:i]))
+
+    @torch.no_grad()
+    def fit_chunks(self, chunks: Iterable[torch.Tensor]):
+        stateful = [
+            i for i, trans in enumerate(self.transformations)
+            if trans.stateful
+        ]
+        if len(stateful) > 1:
+            # The chunks can only be read once
+            self.fit(torch.cat(list(chunks)))
+        elif stateful:
+            self.transformations[stateful[0]].fit_chunks(
+                self._transform_chunks(
+                    chunks, self.transformations[:stateful[0]]))
+
+    @torch.no_grad()
+    def partial_fit(self,
+                    data: torch.Tensor) -> 'SequentialDataTransformation':
+        i = self._single_stateful()
+        if i is not None:
+            for chunk in self._transform_chunks(
+                    [data], self.transformations[:i]):
+                self.transformations[i].partial_fit(chunk)
+        return self
+
+    def merge(self,
+              other: 'SequentialDataTransformation'
+              ) -> 'SequentialDataTransformation':
+        assert len(other.transformations) == len(self.transformations)
+        self._single_stateful()
+        for trans, other_trans in zip(
+                self.transformations, other.transformations):
+            trans.merge(other_trans)
+        return self
+
+    def _single_stateful(self):
+        # The data of a stateful transformation after another one depends
+        # on the final parameters of the other one
+        stateful = [
+            i for i, trans in enumerate(self.transformations)
+            if trans.stateful
+        ]
+        if len(stateful) > 1:
+            raise NotImplementedError(
+                'Sequences of more than one stateful transformation can '
+                'not be fitted partially.')
+        return stateful[0] if stateful else None
+
+    @staticmethod
+    def _transform_chunks(chunks: Iterable[torch.Tensor],
+                          transformations: List[BaseDataTransformation]
+                          ) -> Iterator[torch.Tensor]:
+        for chunk in chunks:
+            if transformations:
+                chunk = chunk.clone()
+            for trans in transformations:
+                chunk = trans.transform_(chunk)
+            yield chunk
 
     @torch.no_grad()
     def transform(self, data: torch.Tensor) -> torch.Tensor:
-        for trans in self.transformations:
-            data = trans.transform(data)
+        if not self.transformations:
+            return data
+        # A single new tensor transformed in place by the following steps
+        data = self.transformations[0].transform(data)
+        for trans in self.transformations[1:]:
+            data = trans.transform_(data)
+        return data
+
+    @torch.no_grad()
+    def transform_(self, data: torch.Tensor) -> torch.Tensor:
+        for chunk in iter_chunks(data):
+            for trans in self.transformations:
+                trans.transform_(chunk)
         return data
 
     @torch.no_grad()
@@ -39,3 +127,9 @@ class SequentialDataTransformation(BaseDataTransformation):
     def to(self, device):
         self.transformations = [t.to(device) for t in self.transformations]
         return self
+
+    def to_module(self, inverse: bool = False) -> nn.Module:
+        transformations = self.transformations[::-1] if inverse \
+            else self.transformations
+        return nn.Sequential(*[
+            trans.to_module(inverse) for trans in transformations])
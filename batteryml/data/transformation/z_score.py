@@ -2,20 +2,106 @@
 # Copyright (c) Microsoft Corporation.
 
 import torch
+import torch.nn as nn
 
 from batteryml.builders import DATA_TRANSFORMATIONS
-from batteryml.data.transformation.base import BaseDataTransformation
+from batteryml.data.transformation.base import (
+    BaseDataTransformation,
+    iter_chunks
+)
+
+
+class RunningMoments:
+    """Mean and sum of squared deviations of the rows seen so far,
+    accumulated in float64 by merging the moments of each chunk with the
+    parallel form of Welford's algorithm (Chan et al.), so that the
+    variance is computed in a single pass without cancellation."""
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    @torch.no_grad()
+    def update(self, chunk: torch.Tensor) -> 'RunningMoments':
+        if len(chunk) == 0:
+            return self
+        chunk = chunk.to(torch.float64, copy=True)
+        other = RunningMoments()
+        other.count = len(chunk)
+        other.mean = chunk.mean(0, keepdim=True)
+        other.m2 = chunk.sub_(other.mean).square_().sum(0, keepdim=True)
+        return self.merge(other)
+
+    @torch.no_grad()
+    def merge(self, other: 'RunningMoments') -> 'RunningMoments':
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean.clone()
+            self.m2 = other.m2.clone()
+            return self
+        count = self.count + other.count
+        delta = other.mean.to(self.mean.device) - self.mean
+        self.mean += delta * (other.count / count)
+        self.m2 += other.m2.to(self.m2.device) \
+            + delta.square_() * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    def std(self) -> torch.Tensor:
+        """Unbiased standard deviation, as `torch.std`."""
+        return (self.m2 / (self.count - 1)).sqrt()
 
 
 @DATA_TRANSFORMATIONS.register()
 class ZScoreDataTransformation(BaseDataTransformation):
+    """Standardize the data with the mean and std of each feature, which
+    are accumulated from chunks by `partial_fit` and can be merged across
+    workers, see `RunningMoments`."""
     def __init__(self):
         self._mean = None
         self._std = None
+        self._moments = None
 
     def fit(self, data: torch.Tensor) -> torch.Tensor:
-        self._mean = data.mean(0, keepdim=True)
-        self._std = torch.clamp(data.std(0, keepdim=True), min=1e-8)
+        self.fit_chunks(iter_chunks(data))
+
+    @torch.no_grad()
+    def fit_chunks(self, chunks):
+        self._moments = RunningMoments()
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        assert self._moments.count > 0, 'No data to fit!'
+
+    @torch.no_grad()
+    def partial_fit(self, data: torch.Tensor) -> 'ZScoreDataTransformation':
+        if getattr(self, '_moments', None) is None:
+            self._moments = RunningMoments()
+        self._moments.update(data)
+        self._update_parameters(data.dtype)
+        return self
+
+    @torch.no_grad()
+    def merge(self,
+              other: 'ZScoreDataTransformation'
+              ) -> 'ZScoreDataTransformation':
+        assert getattr(other, '_moments', None) is not None, \
+            'Only partially fitted transformations can be merged!'
+        if getattr(self, '_moments', None) is None:
+            self._moments = RunningMoments()
+        self._moments.merge(other._moments)
+        # Either side may be fitted on no rows and have no parameters yet
+        mean = self._mean if self._mean is not None else other._mean
+        self._update_parameters(
+            torch.float32 if mean is None else mean.dtype)
+        return self
+
+    def _update_parameters(self, dtype: torch.dtype):
+        if self._moments.count == 0:
+            return
+        self._mean = self._moments.mean.to(dtype)
+        self._std = torch.clamp(self._moments.std(), min=1e-8).to(dtype)
 
     def assert_fitted(self):
         assert self._mean is not None, 'Transformation not fitted!'
@@ -27,6 +113,11 @@ class ZScoreDataTransformation(BaseDataTransformation):
         data = (data - self._mean) / self._std
         return data
 
+    @torch.no_grad()
+    def transform_(self, data: torch.Tensor) -> torch.Tensor:
+        self.assert_fitted()
+        return data.sub_(self._mean).div_(self._std)
+
     @torch.no_grad()
     def inverse_transform(self, data: torch.Tensor) -> torch.Tensor:
         self.assert_fitted()
@@ -37,3 +128,20 @@ class ZScoreDataTransformation(BaseDataTransformation):
         self._mean = self._mean.to(device)
         self._std = self._std.to(device)
         return self
+
+    def to_module(self, inverse: bool = False) -> nn.Module:
+        self.assert_fitted()
+        return ZScoreModule(self._mean, self._std, inverse)
+
+
+class ZScoreModule(nn.Module):
+    def __init__(self, mean: torch.Tensor, std: torch.Tensor, inverse: bool):
+        nn.Module.__init__(self)
+        self.register_buffer('mean', mean.detach().clone())
+        self.register_buffer('std', std.detach().clone())
+        self.inverse = inverse
+
+    def forward(self, data: torch.Tensor) -> torch.Tensor:
+        if self.inverse:
+            return data * self.std + self.mean
+        return (data - self.mean) / self.std
@@ -0,0 +1,159 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+
+from typing import List
+
+from batteryml.data.databundle import Dataset
+from batteryml.data.ragged import RaggedTensor
+
+
+class WindowDataset(Dataset):
+    """Windows of consecutive cycles whose voltage-capacity matrices are
+    generated on the fly from the Qdlin curves of the cells.
+
+    Only the Qdlin curves of every cycle of each cell are kept, and the
+    feature of a window, the Qdlin of its cycles minus the one of the
+    `diff_base` cycle, is gathered when the window is loaded. So a cell
+    gives many windows of different starts and lengths without storing a
+    matrix for each of them.
+
+    Args:
+        qdlin (RaggedTensor): Qdlin curves of the cycles of each cell, with
+            a row per cell.
+        windows (torch.Tensor): `[N, 3]` cell (row of `qdlin`), first cycle
+            and number of cycles of each window.
+        label (torch.Tensor): label of each window.
+        cells (list): id of each cell.
+        cycle_indices (torch.Tensor): cycle predicted by each window.
+        max_length (int): number of rows of the features, the rows after
+            the cycles of shorter windows are zeros.
+        diff_base (int): cycle of the cell to subtract, the first cycle of
+            the window if `None`.
+        feature_transformation: fitted transformation applied to the
+            features when loaded, see `DataBundle.from_datasets`.
+    """
+    feature_transformation = None
+
+    def __init__(self,
+                 qdlin: RaggedTensor,
+                 windows: torch.Tensor,
+                 label: torch.Tensor = None,
+                 cells: List[str] = None,
+                 cycle_indices: torch.Tensor = None,
+                 max_length: int = None,
+                 diff_base: int = None):
+        windows = torch.as_tensor(windows, dtype=torch.long).view(-1, 3)
+        if label is not None:
+            assert len(label) == len(windows), (len(label), len(windows))
+        if cycle_indices is not None:
+            assert len(cycle_indices) == len(windows), \
+                (len(cycle_indices), len(windows))
+        if max_length is None:
+            max_length = int(windows[:, 2].max()) if len(windows) else 1
+
+        self.qdlin = qdlin
+        self.windows = windows
+        self.label = label
+        self.cells = cells
+        self.cycle_indices = cycle_indices
+        self.max_length = max_length
+        self.diff_base = diff_base
+        self.feature_device = torch.device('cpu')
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __getitem__(self, item: int):
+        return {
+            'feature': self.features(torch.tensor([item]))[0],
+            'label': self.label[item]
+        }
+
+    def __getitems__(self, items: List[int]):
+        # Batched loading of `DataLoader`
+        features = self.features(torch.as_tensor(items))
+        return [
+            {'feature': feature, 'label': self.label[item]}
+            for feature, item in zip(features, items)
+        ]
+
+    def features(self, index: torch.Tensor) -> torch.Tensor:
+        """Features of the windows at `index`."""
+        cell, start, length = self.windows[index].T
+        first = self.qdlin.offsets[cell] + start
+        steps = torch.arange(self.max_length)
+        valid = steps < length[:, None]
+        rows = torch.where(valid, first[:, None] + steps, first[:, None])
+        if self.diff_base is None:
+            base = first
+        else:
+            base = self.qdlin.offsets[cell] + self.diff_base
+
+        values = self.qdlin.values
+        feature = values[rows] - values[base][:, None]
+        feature[~valid] = 0.
+
+        # Fill NaN
+        feature = feature.nan_to_num(0., posinf=0., neginf=0.)
+
+        feature = feature.to(self.feature_device)
+        if self.feature_transformation is not None:
+            # The gathered features are a new tensor
+            feature = self.feature_transformation.transform_(feature)
+        return feature
+
+    @property
+    def feature(self) -> torch.Tensor:
+        """Features of all windows, which are materialized, e.g., for the
+        sklearn models."""
+        return self.features(torch.arange(len(self)))
+
+    @property
+    def feature_shape(self) -> torch.Size:
+        return torch.Size([self.max_length, *self.qdlin.values.shape[1:]])
+
+    @property
+    def cell_ids(self):
+        if self.cells is None:
+            return None
+        return [self.cells[i] for i in self.windows[:, 0].tolist()]
+
+    @property
+    def example_ids(self):
+        if self.cells is None:
+            return None
+        return [
+            f'{self.cells[cell]}@{start}+{length}'
+            for cell, start, length in self.windows.tolist()
+        ]
+
+    def subset(self,
+               keep: torch.Tensor,
+               label: torch.Tensor = None) -> 'WindowDataset':
+        """Windows at `keep` with the labels `label`, sharing the Qdlin
+        curves of this dataset."""
+        dataset = WindowDataset(
+            self.qdlin,
+            self.windows[keep],
+            label=label if label is not None or self.label is None
+            else self.label[keep],
+            cells=self.cells,
+            cycle_indices=None if self.cycle_indices is None
+            else self.cycle_indices[keep],
+            max_length=self.max_length,
+            diff_base=self.diff_base)
+        dataset.feature_transformation = self.feature_transformation
+        return dataset
+
+    @property
+    def device(self):
+        return self.feature_device if self.label is None \
+            else self.label.device
+
+    def to(self, device: str):
+        if self.label is not None:
+            self.label = self.label.to(device)
+        self.feature_device = torch.device(device)
+        return self
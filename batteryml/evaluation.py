@@ -0,0 +1,291 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Scoring of the predictions with many metrics at once, with breakdowns
+by groups of cells and bootstrap confidence intervals."""
+
+from __future__ import annotations
+
+import re
+import json
+import torch
+
+from typing import Dict, List
+
+from batteryml.data.transformation.base import CHUNK_ELEMENTS
+
+
+POINT_METRICS = ['RMSE', 'MAE', 'MAPE', 'R2']
+INTERVAL_METRICS = ['COVERAGE', 'WIDTH']
+# Percentiles of the absolute errors (AE) or the absolute percentage
+# errors (APE), e.g., `AE_P90` or `APE_P50`
+PERCENTILE_METRIC = re.compile(r'^(AE|APE)_P(\d+(?:\.\d+)?)$')
+GROUP_KEYS = ['cell', 'dataset', 'chemistry', 'protocol']
+
+
+def check_metric(metric: str):
+    match = PERCENTILE_METRIC.match(metric)
+    if match is not None:
+        assert 0 <= float(match.group(2)) <= 100, metric
+        return
+    assert metric in POINT_METRICS + INTERVAL_METRICS, \
+        f'Unknown metric {metric}'
+
+
+@torch.no_grad()
+def compute_metrics(target: torch.Tensor,
+                    prediction: torch.Tensor,
+                    metrics: List[str],
+                    lower: torch.Tensor = None,
+                    upper: torch.Tensor = None) -> Dict[str, torch.Tensor]:
+    """Compute the metrics over the last dim of the labels, for every
+    leading dim at once, e.g., the bootstrap resamples.
+
+    The errors are computed once and shared by the metrics, and the
+    percentiles of the same errors are computed in one call.
+
+    Args:
+        target, prediction (torch.Tensor): `[..., M]` labels.
+        metrics (List[str]): see `POINT_METRICS`, `INTERVAL_METRICS` and
+            `PERCENTILE_METRIC`.
+        lower, upper (torch.Tensor): bounds of the prediction intervals,
+            required by the interval metrics.
+
+    Returns:
+        the `[...]` scores of each metric.
+    """
+    for metric in metrics:
+        check_metric(metric)
+    error = target - prediction
+    cache = {}
+
+    def absolute_error():
+        if 'AE' not in cache:
+            cache['AE'] = error.abs()
+        return cache['AE']
+
+    def absolute_percentage_error():
+        if 'APE' not in cache:
+            cache['APE'] = (error / target).abs()
+        return cache['APE']
+
+    scores, percentiles = {}, {}
+    for metric in metrics:
+        if metric == 'RMSE':
+            scores[metric] = torch.mean(error ** 2, -1) ** 0.5
+        elif metric == 'MAE':
+            scores[metric] = torch.mean(absolute_error(), -1)
+        elif metric == 'MAPE':
+            scores[metric] = absolute_percentage_error().mean(-1)
+        elif metric == 'R2':
+            total = (target - target.mean(-1, keepdim=True)) ** 2
+            scores[metric] = 1 - (error ** 2).sum(-1) / total.sum(-1)
+        elif metric in INTERVAL_METRICS:
+            assert lower is not None and upper is not None, \
+                f'Prediction intervals are required by {metric}'
+            if metric == 'COVERAGE':
+                covered = (target >= lower) & (target <= upper)
+                scores[metric] = covered.float().mean(-1)
+            else:
+                scores[metric] = torch.mean(upper - lower, -1)
+        else:
+            base, q = PERCENTILE_METRIC.match(metric).groups()
+            percentiles.setdefault(base, []).append((metric, float(q)))
+
+    for base, items in percentiles.items():
+        values = absolute_error() if base == 'AE' \
+            else absolute_percentage_error()
+        q = torch.tensor(
+            [q / 100 for _, q in items],
+            dtype=values.dtype, device=values.device)
+        result = torch.quantile(values, q, dim=-1)
+        for (metric, _), score in zip(items, result):
+            scores[metric] = score
+    return {metric: scores[metric] for metric in metrics}
+
+
+def cell_group(cell_id: str, cell=None, group_by: str = 'dataset') -> str:
+    """Group of a cell, i.e., the cell itself, its dataset given by the
+    prefix of the cell id such as `MATR` of `MATR_b1c4`, its cathode
+    material, or its cycling protocols. The last two require the
+    `BatteryData` of the cell."""
+    assert group_by in GROUP_KEYS, f'Unknown group {group_by}'
+    if group_by == 'cell':
+        return cell_id
+    if group_by == 'dataset':
+        return cell_id.split('_')[0]
+    if cell is None:
+        return 'unknown'
+    if group_by == 'chemistry':
+        return str(getattr(cell, 'cathode_material', None) or 'unknown')
+    return json.dumps([
+        [protocol.to_dict() for protocol in cell.charge_protocol or []],
+        [protocol.to_dict() for protocol in cell.discharge_protocol or []]
+    ], sort_keys=True, default=str)
+
+
+class Evaluator:
+    """Score the predictions with a set of metrics in a single pass over
+    the labels, which are inverse-transformed once.
+
+    Args:
+        metrics (List[str]): see `compute_metrics`.
+        group_by (str): also score each group of cells, see `cell_group`.
+        bootstrap (int): number of bootstrap resamples of the examples for
+            the confidence intervals of the scores, none if `0`. The
+            resamples are scored in batches, see `compute_metrics`.
+        confidence (float): confidence level of the intervals.
+        seed (int): seed of the resampling.
+    """
+    def __init__(self,
+                 metrics: List[str],
+                 group_by: str = None,
+                 bootstrap: int = 0,
+                 confidence: float = 0.95,
+                 seed: int = 0):
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        for metric in metrics:
+            check_metric(metric)
+        assert group_by is None or group_by in GROUP_KEYS, \
+            f'Unknown group {group_by}'
+        assert 0 < confidence < 1, confidence
+        self.metrics = list(metrics)
+        self.group_by = group_by
+        self.bootstrap = bootstrap
+        self.confidence = confidence
+        self.seed = seed
+
+    @property
+    def needs_interval(self) -> bool:
+        return any(metric in INTERVAL_METRICS for metric in self.metrics)
+
+    @torch.no_grad()
+    def __call__(self,
+                 dataset,
+                 prediction: torch.Tensor,
+                 interval: list = None,
+                 cells: dict = None,
+                 data_type: str = 'test') -> dict:
+        """Score the predictions of the (transformed) labels of a
+        `DataBundle`.
+
+        Args:
+            interval (list): lower and upper bounds of the prediction
+                intervals, the interval metrics are NaN if not given.
+            cells (dict): `BatteryData` of the cells by id, used to group
+                them by chemistry or protocol.
+
+        Returns:
+            the `scores` of each metric, and the scores of each group in
+            `groups` and the confidence intervals in `ci` if required.
+        """
+        data = dataset.train_data if data_type == 'train' \
+            else dataset.test_data
+        target = dataset.inverse_transform_label(data.label)
+        prediction = dataset.inverse_transform_label(prediction)
+        bounds = None
+        if interval is not None:
+            bounds = [dataset.inverse_transform_label(x) for x in interval]
+        return self.evaluate(
+            target, prediction, bounds,
+            cell_ids=getattr(data, 'cell_ids', None), cells=cells)
+
+    @torch.no_grad()
+    def evaluate(self,
+                 target: torch.Tensor,
+                 prediction: torch.Tensor,
+                 interval: list = None,
+                 cell_ids: list = None,
+                 cells: dict = None) -> dict:
+        """Score the predictions of the labels in the original scale."""
+        # Examples along the first dim, the labels of multiple targets are
+        # scored together
+        num_examples = len(target)
+        tensors = [target, prediction]
+        if interval is not None:
+            tensors += list(interval)
+        tensors = [
+            x.reshape(num_examples, -1).to(target.device) for x in tensors]
+
+        report = {'scores': self._score(tensors)}
+        if self.group_by is not None and cell_ids is not None:
+            cells = cells or {}
+            groups = [
+                cell_group(cell_id, cells.get(cell_id), self.group_by)
+                for cell_id in cell_ids
+            ]
+            report['groups'] = {}
+            for group in sorted(set(groups)):
+                mask = torch.tensor(
+                    [g == group for g in groups], device=target.device)
+                report['groups'][group] = {
+                    'count': int(mask.sum()),
+                    **self._score([x[mask] for x in tensors])
+                }
+        if self.bootstrap > 0 and num_examples > 0:
+            report['ci'] = self._bootstrap(tensors)
+        return report
+
+    def _score(self, tensors: list) -> dict:
+        metrics = self.metrics
+        if len(tensors) == 2:
+            metrics = [m for m in metrics if m not in INTERVAL_METRICS]
+        target, prediction, *interval = [x.reshape(-1) for x in tensors]
+        scores = compute_metrics(
+            target, prediction, metrics, *interval)
+        return {
+            metric: float(scores[metric]) if metric in scores
+            else float('nan')
+            for metric in self.metrics
+        }
+
+    def _bootstrap(self, tensors: list) -> dict:
+        num_examples = len(tensors[0])
+        generator = torch.Generator().manual_seed(self.seed)
+        metrics = self.metrics
+        if len(tensors) == 2:
+            metrics = [m for m in metrics if m not in INTERVAL_METRICS]
+        # Resamples per batch, bounding the gathered labels
+        batch = max(1, CHUNK_ELEMENTS // max(1, tensors[0].numel()))
+        samples = {metric: [] for metric in metrics}
+        for start in range(0, self.bootstrap, batch):
+            size = min(batch, self.bootstrap - start)
+            index = torch.randint(
+                num_examples, (size, num_examples), generator=generator)
+            index = index.to(tensors[0].device)
+            target, prediction, *interval = [
+                x[index].reshape(size, -1) for x in tensors]
+            scores = compute_metrics(
+                target, prediction, metrics, *interval)
+            for metric in metrics:
+                samples[metric].append(scores[metric].double())
+
+        tail = (1 - self.confidence) / 2
+        ci = {}
+        for metric in self.metrics:
+            if metric not in samples:
+                ci[metric] = [float('nan'), float('nan')]
+                continue
+            values = torch.cat(samples[metric])
+            values = values[~torch.isnan(values)]
+            if len(values) == 0:
+                ci[metric] = [float('nan'), float('nan')]
+                continue
+            lower, upper = torch.quantile(
+                values, torch.tensor([tail, 1 - tail], dtype=values.dtype))
+            ci[metric] = [float(lower), float(upper)]
+        return ci
+
+
+def print_report(report: dict):
+    """Print the confidence intervals and the group scores of a report of
+    `Evaluator`."""
+    if 'ci' in report:
+        print('Confidence intervals: {}'.format({
+            metric: f'{report["scores"][metric]:.4f} '
+                    f'[{lower:.4f}, {upper:.4f}]'
+            for metric, (lower, upper) in report['ci'].items()
+        }))
+    for group, scores in report.get('groups', {}).items():
+        print(f'Group {group}: {scores}')
@@ -0,0 +1,157 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Export a trained model and its transformations as one inference graph."""
+
+from __future__ import annotations
+
+import json
+import torch
+import shutil
+import numpy as np
+import torch.nn as nn
+
+from pathlib import Path
+
+from batteryml import runtime
+from batteryml.builders import MODELS
+from batteryml.data import DataBundle
+from batteryml.models.base import BaseModel
+from batteryml.utils import import_config
+
+EXPORT_FORMATS = runtime.EXPORT_FORMATS
+MODEL_FILES = {'torchscript': 'model.pt', 'onnx': 'model.onnx'}
+
+
+class InferenceGraph(nn.Module):
+    """Raw features to the predictions in the original label scale, i.e.,
+    the feature transformation, the model and the inverse label
+    transformation in one module."""
+    def __init__(self,
+                 model: nn.Module,
+                 feature_transformation: nn.Module = None,
+                 label_transformation: nn.Module = None):
+        nn.Module.__init__(self)
+        self.feature_transformation = feature_transformation or nn.Identity()
+        self.model = model
+        self.label_transformation = label_transformation or nn.Identity()
+
+    def forward(self, feature: torch.Tensor) -> torch.Tensor:
+        feature = self.feature_transformation(feature)
+        prediction = self.model(feature).view(-1)
+        return self.label_transformation(prediction).to(torch.float32)
+
+
+def build_inference_graph(model: BaseModel,
+                          feature: torch.Tensor,
+                          feature_transformation=None,
+                          label_transformation=None) -> InferenceGraph:
+    """Build the inference graph of a trained model.
+
+    Args:
+        model (BaseModel): trained model.
+        feature (torch.Tensor): a batch of transformed features passed to
+            `model.export_module`.
+        feature_transformation: fitted feature transformation.
+        label_transformation: fitted label transformation.
+    """
+    return InferenceGraph(
+        model.export_module(feature),
+        None if feature_transformation is None
+        else feature_transformation.to_module(),
+        None if label_transformation is None
+        else label_transformation.to_module(inverse=True),
+    ).eval()
+
+
+def export_model(config_path: Path | str,
+                 workspace: Path | str,
+                 output: Path | str = None,
+                 ckpt_to_resume: str = None,
+                 format: str = 'torchscript') -> Path:
+    """Export the trained model of a workspace.
+
+    The export directory contains the model file, `metadata.json` and a
+    copy of `runtime.py` to run the model without batteryml. The exported
+    graph is checked against the predictions of the model on the test set.
+
+    Args:
+        config_path (str): path to the config of the model.
+        workspace (str): workspace of the trained model.
+        output (str): export directory, `<workspace>/export` by default.
+        ckpt_to_resume (str): checkpoint to export, `latest.ckpt` in the
+            workspace by default.
+        format (str): `torchscript` or `onnx`.
+
+    Returns:
+        the export directory.
+    """
+    from batteryml.pipeline import (
+        CONFIG_FIELDS, build_dataset, load_transformations
+    )
+
+    assert format in EXPORT_FORMATS, f'Unknown export format {format}'
+    workspace = Path(workspace)
+    output = Path(output) if output is not None else workspace / 'export'
+    output.mkdir(parents=True, exist_ok=True)
+
+    configs = import_config(Path(config_path), CONFIG_FIELDS)
+    dataset, _ = build_dataset(configs, 'cpu')
+    ckpt_to_resume = ckpt_to_resume or workspace / 'latest.ckpt'
+    model = MODELS.build(configs['model'])
+    model.workspace = None
+    model.load_checkpoint(ckpt_to_resume)
+    model = model.to('cpu')
+
+    transformations = load_transformations(workspace) or {
+        'feature_transformation': dataset.feature_transformation,
+        'label_transformation': dataset.label_transformation,
+    }
+    feature_transformation = transformations['feature_transformation']
+    feature = dataset.test_data.feature
+    raw_feature = feature if feature_transformation is None \
+        else feature_transformation.inverse_transform(feature)
+    graph = build_inference_graph(model, feature, **transformations)
+
+    model_file = output / MODEL_FILES[format]
+    example = raw_feature[:8].float()
+    if format == 'torchscript':
+        with torch.no_grad():
+            traced = torch.jit.trace(graph, example)
+        torch.jit.save(torch.jit.freeze(traced), str(model_file))
+    else:
+        torch.onnx.export(
+            graph, (example,), str(model_file),
+            input_names=['feature'],
+            output_names=['prediction'],
+            dynamic_axes={'feature': {0: 'batch'}, 'prediction': {0: 'batch'}},
+            dynamo=False)
+
+    metadata = {
+        'format': format,
+        'model_file': model_file.name,
+        'feature_shape': list(feature.shape[1:]),
+        'model': configs['model']['name'],
+        'config': str(config_path),
+        'checkpoint': str(ckpt_to_resume),
+    }
+    with open(output / runtime.METADATA_FILE, 'w') as f:
+        json.dump(metadata, f, indent=4)
+    shutil.copyfile(runtime.__file__, output / 'runtime.py')
+
+    # Compare with the predictions of the model in batteryml
+    expected = predict_label(model, dataset).numpy()
+    actual = runtime.ExportedModel(output).predict(raw_feature.numpy())
+    error = float(np.abs(actual - expected).max()) if len(expected) else 0.
+    metadata['max_abs_error'] = error
+    with open(output / runtime.METADATA_FILE, 'w') as f:
+        json.dump(metadata, f, indent=4)
+    print(f'Exported {metadata["model"]} to {model_file}, the max absolute '
+          f'error on the test set is {error:.3g}.')
+    return output
+
+
+@torch.no_grad()
+def predict_label(model: BaseModel, dataset: DataBundle) -> torch.Tensor:
+    prediction = model.predict(dataset)
+    return dataset.inverse_transform_label(prediction).float().cpu().view(-1)
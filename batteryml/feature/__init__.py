@@ -2,7 +2,18 @@
 # Copyright (c) Microsoft Corporation.
 
 """Extract the features from a list of `BatteryData` and output a PyTorch `Dataset` object."""  # noqa
-from .full_model import FullModelFeatureExtractor
-from .variance_model import VarianceModelFeatureExtractor
-from .discharge_model import DischargeModelFeatureExtractor
-from .voltage_capacity_matrix import VoltageCapacityMatrixFeatureExtractor
+from batteryml.builders import FEATURE_EXTRACTORS
+from batteryml.utils import lazy_exports
+
+_EXPORTS = {
+    'FullModelFeatureExtractor': '.full_model',
+    'VarianceModelFeatureExtractor': '.variance_model',
+    'DischargeModelFeatureExtractor': '.discharge_model',
+    'VoltageCapacityMatrixFeatureExtractor': '.voltage_capacity_matrix',
+    'TrajectoryWindowFeatureExtractor': '.trajectory',
+    'QdlinWindowFeatureExtractor': '.window',
+}
+for _name, _module in _EXPORTS.items():
+    FEATURE_EXTRACTORS.register_lazy(_name, _module, __name__)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
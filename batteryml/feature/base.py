@@ -2,10 +2,11 @@
 # Copyright (c) Microsoft Corporation.
 
 import abc
+import copy
 import torch
 
 from tqdm import tqdm
-from typing import List
+from typing import List, Optional
 
 from batteryml.data import BatteryData
 
@@ -30,3 +31,33 @@ class BaseFeatureExtractor(abc.ABC):
         Returns:
             torch.Tensor: the processed feature.
         """
+
+    # Online inference. A state is kept per cell and updated with each new
+    # cycle, see `batteryml.online`. By default the cycles are accumulated
+    # and the feature is recomputed from all of them, extractors override
+    # these methods to update their features incrementally.
+    required_cycles = None
+
+    def init_state(self, cell_data: BatteryData) -> dict:
+        """Create the online state of a cell, without its cycles."""
+        cell = copy.copy(cell_data)
+        cell.cycle_data = []
+        return {'cell': cell, 'num_cycles': 0}
+
+    def update_state(self, state: dict, cycle_data) -> None:
+        """Update the online state with the next cycle of the cell."""
+        state['cell'].cycle_data.append(cycle_data)
+        state['num_cycles'] += 1
+
+    def state_feature(self, state: dict) -> Optional[torch.Tensor]:
+        """Feature of the cycles seen so far, `None` if not available."""
+        try:
+            return self.process_cell(state['cell']).float()
+        except (IndexError, ValueError):
+            return None
+
+    def is_ready(self, state: dict) -> bool:
+        """Whether all the cycles used by the feature have arrived."""
+        if self.required_cycles is None:
+            return self.state_feature(state) is not None
+        return state['num_cycles'] >= self.required_cycles
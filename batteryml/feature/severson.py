@@ -4,13 +4,12 @@
 import torch
 import numpy as np
 
-from numba import njit
-from typing import List
+from typing import List, Optional
 from scipy.interpolate import interp1d
-from sklearn.linear_model import LinearRegression
 
 from batteryml.data.battery_data import BatteryData
 from batteryml.feature.base import BaseFeatureExtractor
+from batteryml.utils.kernels import get_charge_time, smooth
 
 
 def interpolate(x, y, interp_dims, xs=0, xe=1):
@@ -39,33 +38,16 @@ def get_Qdlin(cell_data, cycle_data, use_precalculated=False):
         cell_data.max_voltage_limit_in_V)
 
 
-@njit
-def smooth(x, window_size=10, sigma=3):
-    res = np.empty_like(x)
-    meds = np.empty_like(x)
-    for i in range(len(x)):
-        low = max(0, i-window_size)
-        high = min(len(x), i+window_size+1)
-        meds[i] = np.median(x[low: high])
-    base = np.std(np.abs(x - meds))
-    for i in range(len(x)):
-        if np.abs(meds[i] - x[i]) > base * sigma:
-            res[i] = meds[i]
-        else:
-            res[i] = x[i]
-    return meds
-
-
-@njit
-def get_charge_time(I, t):  # noqa
-    res = 0.
-    for i in range(1, len(I)):
-        if I[i] < 0:
-            res += t[i] - t[i-1]
-    return res
+class SeversonFeatureExtractor(BaseFeatureExtractor):
+    """Features of Severson et al. (2019) computed from the early cycles.
 
+    The per-cycle statistics the features rely on are accumulated cycle by
+    cycle into a state (see `init_state` and `update_state`), which is
+    shared by the batch extraction and the online inference. Subclasses
+    list the features to extract in `feature_names`.
+    """
+    feature_names: List[str] = []
 
-class SeversonFeatureExtractor(BaseFeatureExtractor):
     def __init__(self,
                  interp_dims: int = 1000,
                  critical_cycles: List[int] = None,
@@ -78,19 +60,99 @@ class SeversonFeatureExtractor(BaseFeatureExtractor):
         self.smooth_diff_qdlin = smooth_diff_qdlin
         self.use_precalculated_qdlin = use_precalculated_qdlin
 
+    def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
+        return self.get_features(cell_data, self.feature_names)
+
+    @property
+    def required_cycles(self) -> int:
+        # The first 4 cycles are used by the average early charge time
+        return max(self.critical_cycles[2], 3) + 1
+
     def get_features(self,
                      cell_data: BatteryData,
                      feature_lists: List[str]
                      ) -> torch.Tensor:
-        early_cycle = cell_data.cycle_data[self.critical_cycles[1]]
-        late_cycle = cell_data.cycle_data[self.critical_cycles[2]]
-
-        early_qdlin = get_Qdlin(
-            cell_data, early_cycle, self.use_precalculated_qdlin)
-        late_qdlin = get_Qdlin(
-            cell_data, late_cycle, self.use_precalculated_qdlin)
-
-        diff_qdlin = late_qdlin - early_qdlin
+        state = self.init_state(cell_data)
+        for cycle_data in cell_data.cycle_data[:self.required_cycles]:
+            self.update_state(state, cycle_data)
+        return self.features_from_state(state, feature_lists)
+
+    def init_state(self, cell_data: BatteryData) -> dict:
+        state = BaseFeatureExtractor.init_state(self, cell_data)
+        state.update(
+            qdlin={},
+            # Accumulators of the linear fit to the capacity curve, i.e.,
+            # the count, sum of x, sum of y, sum of x^2 and sum of xy
+            capacity_fit=np.zeros(5),
+            max_capacity=-np.inf,
+            early_capacity=None,
+            charge_time=[],
+            temperature_sum=0.,
+            temperature_count=0,
+            internal_resistance=[],
+            early_ir=None,
+            late_ir=None,
+        )
+        return state
+
+    def update_state(self, state: dict, cycle_data) -> None:
+        cycle = state['num_cycles']
+        state['num_cycles'] += 1
+        first, early, late = self.critical_cycles
+
+        if cycle in (early, late):
+            state['qdlin'][cycle] = get_Qdlin(
+                state['cell'], cycle_data, self.use_precalculated_qdlin)
+
+        # The capacity curve covers the cycles in [first, late), where the
+        # early discharge capacity is the `first`-th of the curve
+        if first <= cycle < late:
+            Qd = max(cycle_data.discharge_capacity_in_Ah)
+            x = cycle - first
+            state['capacity_fit'] += [1., x, Qd, x * x, x * Qd]
+            state['max_capacity'] = max(state['max_capacity'], Qd)
+            if x == first:
+                state['early_capacity'] = Qd
+
+        if cycle < 4 and cycle_data.time_in_s is not None:
+            state['charge_time'].append(get_charge_time(
+                np.array(cycle_data.current_in_A),
+                np.array(cycle_data.time_in_s)
+            ))
+
+        if first <= cycle <= late:
+            if cycle_data.temperature_in_C is not None:
+                T = [x for x in cycle_data.temperature_in_C if x == x]
+                if len(T):
+                    state['temperature_sum'] += np.nanmean(
+                        cycle_data.temperature_in_C)
+                    state['temperature_count'] += 1
+            ir = cycle_data.internal_resistance_in_ohm
+            if ir is not None:
+                state['internal_resistance'].append(ir)
+            if cycle == first:
+                state['early_ir'] = ir
+            if cycle == late:
+                state['late_ir'] = ir
+
+    def state_feature(self, state: dict) -> Optional[torch.Tensor]:
+        try:
+            return self.features_from_state(
+                state, self.feature_names).float()
+        except (IndexError, ValueError):
+            return None
+
+    def features_from_state(self,
+                            state: dict,
+                            feature_lists: List[str]
+                            ) -> torch.Tensor:
+        early, late = self.critical_cycles[1:]
+        if early not in state['qdlin'] or late not in state['qdlin']:
+            raise IndexError(
+                f'Cycles {early} and {late} are required, '
+                f'got {state["num_cycles"]} cycles.')
+
+        diff_qdlin = state['qdlin'][late] - state['qdlin'][early]
         if self.smooth_diff_qdlin:
             diff_qdlin = smooth(diff_qdlin)
         diff_qdlin = torch.from_numpy(diff_qdlin)
@@ -100,7 +162,7 @@ class SeversonFeatureExtractor(BaseFeatureExtractor):
 
         results = []
         for feature in feature_lists:
-            value = self.get_feature(cell_data, diff_qdlin, feature)
+            value = self.get_feature(state, diff_qdlin, feature)
             if value is not None:
                 results.append(value)
 
@@ -112,7 +174,7 @@ class SeversonFeatureExtractor(BaseFeatureExtractor):
         return results
 
     def get_feature(self,
-                    cell_data: BatteryData,
+                    state: dict,
                     diff_qdlin: torch.Tensor,
                     feature: str) -> float:
         eps = 1e-8
@@ -132,62 +194,45 @@ class SeversonFeatureExtractor(BaseFeatureExtractor):
             return result
 
         # Discharge capacity fade curve features
-        Qd = [max(x.discharge_capacity_in_Ah) for x in cell_data.cycle_data]
-        Qd = Qd[self.critical_cycles[0]: self.critical_cycles[2]]
         if feature == 'Early discharge capacity':
-            return Qd[self.critical_cycles[0]]
+            return self._early_capacity(state)
         if feature == 'Difference between max discharge capacity and early discharge capacity':  # noqa
-            return max(Qd) - Qd[self.critical_cycles[0]]
+            return state['max_capacity'] - self._early_capacity(state)
         if feature == 'Slope of linear fit to the capacity curve':
-            model = LinearRegression()
-            x, y = np.arange(len(Qd))[:, None], np.array(Qd)
-            model.fit(x, y)
-            return model.coef_[0]
+            return fit_line(state['capacity_fit'])[0]
         if feature == 'Intercept of linear fit to the capacity curve':
-            model = LinearRegression()
-            x, y = np.arange(len(Qd))[:, None], np.array(Qd)
-            model.fit(x, y)
-            return model.intercept_
+            return fit_line(state['capacity_fit'])[1]
 
         # Other features
         if feature == 'Average early charge time':
-            charge_time = []
-            for cycle in range(4):
-                cycle_data = cell_data.cycle_data[cycle]
-                if cycle_data.time_in_s is not None:
-                    charge_time.append(get_charge_time(
-                        np.array(cycle_data.current_in_A),
-                        np.array(cycle_data.time_in_s)
-                    ))
+            charge_time = state['charge_time']
             result = np.mean(charge_time) if len(charge_time) else 0.
             return np.log(result + eps)
         if feature == 'Integral of temperature over time':
-            res, counts = 0., 0
-            for cycle in range(self.critical_cycles[0],
-                               self.critical_cycles[2] + 1):
-                cycle_data = cell_data.cycle_data[cycle]
-                if cycle_data.temperature_in_C is not None:
-                    T = [x for x in cycle_data.temperature_in_C if x == x]
-                    if len(T):
-                        res += np.nanmean(cycle_data.temperature_in_C)
-                        counts += 1
+            res, counts = state['temperature_sum'], state['temperature_count']
             if counts > 0:
                 res /= counts
             result = np.log(res + eps)
             return result
         if feature == 'Minimum internal resistance':
-            ir = []
-            for cycle in range(self.critical_cycles[0],
-                               self.critical_cycles[2] + 1):
-                cycle_data = cell_data.cycle_data[cycle]
-                if cycle_data.internal_resistance_in_ohm is not None:
-                    ir.append(cycle_data.internal_resistance_in_ohm)
+            ir = state['internal_resistance']
             return np.min(ir) if len(ir) else 0.
         if feature == 'Internal resistance change':
-            early_ir = cell_data.cycle_data[self.critical_cycles[0]]\
-                .internal_resistance_in_ohm
-            late_ir = cell_data.cycle_data[self.critical_cycles[2]]\
-                .internal_resistance_in_ohm
+            early_ir, late_ir = state['early_ir'], state['late_ir']
             if early_ir is not None and late_ir is not None:
                 return late_ir - early_ir
             return 0.
+
+    @staticmethod
+    def _early_capacity(state: dict) -> float:
+        if state['early_capacity'] is None:
+            raise IndexError('Not enough cycles for the capacity curve.')
+        return state['early_capacity']
+
+
+def fit_line(accumulators: np.ndarray):
+    """Least-squares slope and intercept from the accumulated sums."""
+    n, sx, sy, sxx, sxy = accumulators
+    slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    intercept = (sy - slope * sx) / n
+    return slope, intercept
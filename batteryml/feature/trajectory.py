@@ -0,0 +1,147 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+import numpy as np
+
+from tqdm import tqdm
+from typing import List, Optional
+
+from batteryml.builders import FEATURE_EXTRACTORS
+from batteryml.data.battery_data import BatteryData, CycleData
+from batteryml.data.ragged import RaggedTensor
+from batteryml.feature.base import BaseFeatureExtractor
+from batteryml.utils.kernels import get_charge_time
+
+
+def _max(x) -> float:
+    return float(np.nanmax(x)) if x is not None and len(x) else np.nan
+
+
+def _mean(x) -> float:
+    return float(np.nanmean(x)) if x is not None and len(x) else np.nan
+
+
+def _discharge_time(cycle_data: CycleData) -> float:
+    if cycle_data.time_in_s is None or cycle_data.current_in_A is None:
+        return np.nan
+    # Hours with a negative current
+    return get_charge_time(
+        cycle_data.current_in_A, cycle_data.time_in_s) / 3600.
+
+
+CYCLE_FEATURES = {
+    'discharge_capacity': lambda c: _max(c.discharge_capacity_in_Ah),
+    'charge_capacity': lambda c: _max(c.charge_capacity_in_Ah),
+    'discharge_time': _discharge_time,
+    'mean_temperature': lambda c: _mean(c.temperature_in_C),
+    'max_temperature': lambda c: _max(c.temperature_in_C),
+    'internal_resistance': lambda c: np.nan
+    if c.internal_resistance_in_ohm is None
+    else float(c.internal_resistance_in_ohm),
+}
+CAPACITY_FEATURES = ['discharge_capacity', 'charge_capacity']
+
+
+@FEATURE_EXTRACTORS.register()
+class TrajectoryWindowFeatureExtractor(BaseFeatureExtractor):
+    """Summaries of the last `window` cycles before every `cycle_stride`-th
+    cycle of each cell, matching the labels of `TrajectoryLabelAnnotator`
+    with the same `min_cycle_index` and `cycle_stride`.
+
+    Each cycle is summarized once by the scalars in `features`, and the
+    feature of a cycle is the `[window, len(features)]` matrix of the
+    summaries of the cycle and its predecessors, where the cycles before
+    the first one repeat the first one. The features are returned as a
+    `RaggedTensor` with a row per cell.
+
+    Args:
+        window (int): number of cycles in a window.
+        features (List[str]): per-cycle summaries, see `CYCLE_FEATURES`.
+            The capacities are relative to the nominal capacity.
+        min_cycle_index (int): first cycle to extract.
+        cycle_stride (int): extract every `cycle_stride`-th cycle.
+    """
+    def __init__(self,
+                 window: int = 10,
+                 features: List[str] = None,
+                 min_cycle_index: int = 0,
+                 cycle_stride: int = 1):
+        features = features or list(CYCLE_FEATURES)
+        for feature in features:
+            assert feature in CYCLE_FEATURES, f'Unknown feature {feature}'
+        assert window > 0 and cycle_stride > 0, (window, cycle_stride)
+        self.window = window
+        self.features = features
+        self.min_cycle_index = min_cycle_index
+        self.cycle_stride = cycle_stride
+
+    def __call__(self, cells: List[BatteryData]) -> RaggedTensor:
+        pbar = tqdm(cells, desc='Extracting features')
+        return RaggedTensor.from_tensors([
+            self.process_cell(cell) for cell in pbar]).float()
+
+    def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
+        summaries = torch.stack([
+            self._summarize(cell_data, cycle_data)
+            for cycle_data in cell_data.cycle_data
+        ]) if cell_data.cycle_data else torch.zeros(0, len(self.features))
+        cycles = torch.arange(
+            self.min_cycle_index, len(summaries), self.cycle_stride)
+        return self._windows(summaries, cycles)
+
+    def _summarize(self,
+                   cell_data: BatteryData,
+                   cycle_data: CycleData) -> torch.Tensor:
+        nominal_capacity = cell_data.nominal_capacity_in_Ah or 1.
+        summary = []
+        for feature in self.features:
+            value = CYCLE_FEATURES[feature](cycle_data)
+            if feature in CAPACITY_FEATURES:
+                value /= nominal_capacity
+            summary.append(value)
+        return torch.tensor(summary, dtype=torch.float64)
+
+    def _windows(self,
+                 summaries: torch.Tensor,
+                 cycles: torch.Tensor) -> torch.Tensor:
+        if len(cycles) == 0:
+            return torch.zeros(0, self.window, len(self.features))
+        padded = torch.cat([
+            summaries[:1].expand(self.window - 1, -1), summaries])
+        # [cycles, features, window] -> [cycles, window, features]
+        windows = padded.unfold(0, self.window, 1)[cycles].transpose(1, 2)
+
+        # Fill NaN
+        windows = windows.nan_to_num(0., posinf=0., neginf=0.)
+
+        return windows
+
+    def cycle_index(self, position: torch.Tensor) -> torch.Tensor:
+        """Cycle index of the features at `position` in the row of a cell."""
+        return self.min_cycle_index + position * self.cycle_stride
+
+    # Online inference: each cycle is summarized on arrival and the feature
+    # is the window ending at the latest cycle.
+    @property
+    def required_cycles(self) -> int:
+        return self.min_cycle_index + 1
+
+    def init_state(self, cell_data: BatteryData) -> dict:
+        state = BaseFeatureExtractor.init_state(self, cell_data)
+        state.update(summaries=[])
+        return state
+
+    def update_state(self, state: dict, cycle_data) -> None:
+        state['num_cycles'] += 1
+        state['summaries'].append(
+            self._summarize(state['cell'], cycle_data))
+        # Only the cycles of the next window are kept
+        del state['summaries'][:-self.window]
+
+    def state_feature(self, state: dict) -> Optional[torch.Tensor]:
+        if state['num_cycles'] < self.required_cycles:
+            return None
+        summaries = torch.stack(state['summaries'])
+        cycles = torch.tensor([len(summaries) - 1])
+        return self._windows(summaries, cycles)[0].float()
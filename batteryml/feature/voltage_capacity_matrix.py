@@ -3,12 +3,13 @@
 
 import torch
 
-from typing import List
+from typing import List, Optional
 
 from batteryml.builders import FEATURE_EXTRACTORS
 from batteryml.data.battery_data import BatteryData
 from batteryml.feature.base import BaseFeatureExtractor
-from batteryml.feature.severson import get_Qdlin, smooth
+from batteryml.feature.severson import get_Qdlin
+from batteryml.utils.kernels import smooth
 
 
 @FEATURE_EXTRACTORS.register()
@@ -42,14 +43,8 @@ class VoltageCapacityMatrixFeatureExtractor(BaseFeatureExtractor):
 
     def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
         feature = []
-        diff_base_qdlin = get_Qdlin(
-            cell_data,
-            cell_data.cycle_data[self.diff_base],
-            self.use_precalculated_qdlin)
-        if self.smooth:
-            diff_base_qdlin = smooth(diff_base_qdlin)
-        if self.cycle_average is not None:
-            diff_base_qdlin = diff_base_qdlin[..., ::self.cycle_average]
+        diff_base_qdlin = self._process_qdlin(
+            cell_data, cell_data.cycle_data[self.diff_base])
 
         for cycle_index, cycle_data in enumerate(cell_data.cycle_data):
             if cycle_index < self.min_cycle_index:
@@ -61,21 +56,86 @@ class VoltageCapacityMatrixFeatureExtractor(BaseFeatureExtractor):
                     and cycle_index not in self.cycles_to_keep:
                 continue
 
-            qdlin = get_Qdlin(
-                cell_data, cycle_data, self.use_precalculated_qdlin)
-            if self.smooth:
-                qdlin = smooth(qdlin)
-            if self.cycle_average is not None:
-                qdlin = qdlin[..., ::self.cycle_average]
-
-            diff_qdlin = qdlin - diff_base_qdlin
-            if self.smooth:
-                diff_qdlin = smooth(diff_qdlin)
-
-            feature.append(torch.from_numpy(diff_qdlin))
+            qdlin = self._process_qdlin(cell_data, cycle_data)
+            feature.append(self._diff_qdlin(qdlin, diff_base_qdlin))
         feature = torch.stack(feature)
 
         # Fill NaN
         feature[torch.isnan(feature) | torch.isinf(feature)] = 0.
 
-        return feature
\ No newline at end of file
+        return feature
+
+    def _process_qdlin(self, cell_data, cycle_data):
+        qdlin = get_Qdlin(cell_data, cycle_data, self.use_precalculated_qdlin)
+        if self.smooth:
+            qdlin = smooth(qdlin)
+        if self.cycle_average is not None:
+            qdlin = qdlin[..., ::self.cycle_average]
+        return qdlin
+
+    def _diff_qdlin(self, qdlin, diff_base_qdlin) -> torch.Tensor:
+        diff_qdlin = qdlin - diff_base_qdlin
+        if self.smooth:
+            diff_qdlin = smooth(diff_qdlin)
+        return torch.from_numpy(diff_qdlin)
+
+    def _keep_cycle(self, cycle_index: int) -> bool:
+        if not self.min_cycle_index <= cycle_index <= self.max_cycle_index:
+            return False
+        return self.cycles_to_keep is None \
+            or cycle_index in self.cycles_to_keep
+
+    @property
+    def required_cycles(self) -> int:
+        kept = [
+            i for i in range(self.min_cycle_index, self.max_cycle_index + 1)
+            if self._keep_cycle(i)
+        ]
+        return max(kept + [self.diff_base]) + 1
+
+    # Online inference: the Qdlin of each kept cycle is processed once on
+    # arrival and its row of the matrix is fixed as soon as the diff-base
+    # cycle is available.
+    def init_state(self, cell_data: BatteryData) -> dict:
+        state = BaseFeatureExtractor.init_state(self, cell_data)
+        state.update(diff_base_qdlin=None, pending={}, rows={})
+        return state
+
+    def update_state(self, state: dict, cycle_data) -> None:
+        cycle_index = state['num_cycles']
+        state['num_cycles'] += 1
+        if cycle_index > self.max_cycle_index:
+            return
+
+        cell = state['cell']
+        qdlin = None
+        if cycle_index == self.diff_base:
+            qdlin = self._process_qdlin(cell, cycle_data)
+            state['diff_base_qdlin'] = qdlin
+            for index, pending in state['pending'].items():
+                state['rows'][index] = self._diff_qdlin(pending, qdlin)
+            state['pending'] = {}
+        if not self._keep_cycle(cycle_index):
+            return
+        if qdlin is None:
+            qdlin = self._process_qdlin(cell, cycle_data)
+        if state['diff_base_qdlin'] is None:
+            state['pending'][cycle_index] = qdlin
+        else:
+            state['rows'][cycle_index] = self._diff_qdlin(
+                qdlin, state['diff_base_qdlin'])
+
+    def state_feature(self, state: dict) -> Optional[torch.Tensor]:
+        if state['diff_base_qdlin'] is None:
+            return None
+        width = len(state['diff_base_qdlin'])
+        # Rows of the cycles that have not arrived yet are zeros
+        feature = torch.stack([
+            state['rows'].get(
+                index, torch.zeros(width, dtype=torch.float64))
+            for index in range(
+                self.min_cycle_index, self.max_cycle_index + 1)
+            if self._keep_cycle(index)
+        ])
+        feature[torch.isnan(feature) | torch.isinf(feature)] = 0.
+        return feature.float()
@@ -0,0 +1,151 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+import numpy as np
+
+from tqdm import tqdm
+from typing import List, Optional
+
+from batteryml.builders import FEATURE_EXTRACTORS
+from batteryml.data.battery_data import BatteryData
+from batteryml.data.ragged import RaggedTensor
+from batteryml.data.window import WindowDataset
+from batteryml.feature.base import BaseFeatureExtractor
+from batteryml.feature.severson import get_Qdlin
+from batteryml.utils.kernels import smooth
+
+
+@FEATURE_EXTRACTORS.register()
+class QdlinWindowFeatureExtractor(BaseFeatureExtractor):
+    """Sliding windows of the voltage-capacity matrix over the whole cycle
+    history of each cell.
+
+    Windows of each length in `window_lengths` start at every
+    `window_stride`-th cycle from `min_cycle_index`, and each window
+    predicts the label of the cycle `horizon` cycles after its last one,
+    e.g., the labels of `TrajectoryLabelAnnotator`. The Qdlin curve of
+    each cycle is computed once, and the features of the windows are
+    generated from the curves when loaded, see `WindowDataset`.
+
+    Args:
+        window_lengths (List[int]): numbers of cycles of the windows.
+        window_stride (int): cycles between the starts of the windows.
+        horizon (int): cycles between the last cycle of a window and the
+            cycle it predicts.
+        min_cycle_index (int): first cycle of the windows.
+        diff_base (int): cycle whose Qdlin is subtracted from the ones of
+            the window, the first cycle of the window if `None`.
+        smooth (bool): smooth the Qdlin curves.
+        use_precalculated_qdlin (bool): use the Qdlin of the cycle data if
+            available.
+    """
+    def __init__(self,
+                 window_lengths: List[int] = None,
+                 window_stride: int = 10,
+                 horizon: int = 0,
+                 min_cycle_index: int = 0,
+                 diff_base: int = None,
+                 smooth: bool = True,
+                 use_precalculated_qdlin: bool = False):
+        window_lengths = window_lengths or [100]
+        if isinstance(window_lengths, int):
+            window_lengths = [window_lengths]
+        assert min(window_lengths) > 0 and window_stride > 0, \
+            (window_lengths, window_stride)
+        self.window_lengths = window_lengths
+        self.window_stride = window_stride
+        self.horizon = horizon
+        self.min_cycle_index = min_cycle_index
+        self.diff_base = diff_base
+        self.smooth = smooth
+        self.use_precalculated_qdlin = use_precalculated_qdlin
+
+    def __call__(self, cells: List[BatteryData]) -> WindowDataset:
+        pbar = tqdm(cells, desc='Extracting features')
+        qdlin = RaggedTensor.from_tensors([
+            self.process_cell(cell) for cell in pbar])
+        windows = torch.cat([
+            self._windows(num_cycles, row)
+            for row, num_cycles in enumerate(qdlin.lengths.tolist())
+        ]) if len(cells) else torch.zeros(0, 3, dtype=torch.long)
+        return WindowDataset(
+            qdlin, windows,
+            cells=[cell.cell_id for cell in cells],
+            cycle_indices=self.cycle_index(windows),
+            max_length=max(self.window_lengths),
+            diff_base=self.diff_base)
+
+    def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
+        """Qdlin curves of all cycles of the cell."""
+        qdlin = []
+        for cycle_data in cell_data.cycle_data:
+            curve = get_Qdlin(
+                cell_data, cycle_data, self.use_precalculated_qdlin)
+            if self.smooth:
+                curve = smooth(curve)
+            qdlin.append(curve)
+        if not qdlin:
+            return torch.zeros(0, 1000)
+        return torch.from_numpy(np.stack(qdlin)).float()
+
+    def _windows(self, num_cycles: int, row: int) -> torch.Tensor:
+        if self.diff_base is not None and num_cycles <= self.diff_base:
+            return torch.zeros(0, 3, dtype=torch.long)
+        windows = []
+        for length in self.window_lengths:
+            starts = torch.arange(
+                self.min_cycle_index, num_cycles - length + 1,
+                self.window_stride)
+            windows.append(torch.stack([
+                torch.full_like(starts, row),
+                starts,
+                torch.full_like(starts, length)
+            ], 1))
+        return torch.cat(windows)
+
+    def cycle_index(self, windows: torch.Tensor) -> torch.Tensor:
+        """Cycle predicted by each window."""
+        return windows[:, 1] + windows[:, 2] - 1 + self.horizon
+
+    # Online inference: the feature is the longest window ending at the
+    # latest cycle, of which the Qdlin curves are kept.
+    @property
+    def required_cycles(self) -> int:
+        required = self.min_cycle_index + max(self.window_lengths)
+        if self.diff_base is not None:
+            required = max(required, self.diff_base + 1)
+        return required
+
+    def init_state(self, cell_data: BatteryData) -> dict:
+        state = BaseFeatureExtractor.init_state(self, cell_data)
+        state.update(qdlin=[], diff_base_qdlin=None)
+        return state
+
+    def update_state(self, state: dict, cycle_data) -> None:
+        cycle_index = state['num_cycles']
+        state['num_cycles'] += 1
+        curve = get_Qdlin(
+            state['cell'], cycle_data, self.use_precalculated_qdlin)
+        if self.smooth:
+            curve = smooth(curve)
+        curve = torch.from_numpy(np.ascontiguousarray(curve)).float()
+        if cycle_index == self.diff_base:
+            state['diff_base_qdlin'] = curve
+        state['qdlin'].append(curve)
+        del state['qdlin'][:-max(self.window_lengths)]
+
+    def state_feature(self, state: dict) -> Optional[torch.Tensor]:
+        if state['num_cycles'] < self.required_cycles:
+            return None
+        length = max(self.window_lengths)
+        curves = state['qdlin']
+        if state['diff_base_qdlin'] is not None:
+            curves = [state['diff_base_qdlin']] + curves
+        # A single window over the kept curves
+        dataset = WindowDataset(
+            RaggedTensor.from_tensors([torch.stack(curves)]),
+            [[0, len(curves) - length, length]],
+            max_length=length,
+            diff_base=None if state['diff_base_qdlin'] is None else 0)
+        return dataset.features(torch.tensor([0]))[0]
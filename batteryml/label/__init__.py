@@ -1,5 +1,15 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .rul import RULLabelAnnotator
-from .soh import SOHLabelAnnotator
\ No newline at end of file
+from batteryml.builders import LABEL_ANNOTATORS
+from batteryml.utils import lazy_exports
+
+_EXPORTS = {
+    'RULLabelAnnotator': '.rul',
+    'SOHLabelAnnotator': '.soh',
+    'TrajectoryLabelAnnotator': '.trajectory',
+}
+for _name, _module in _EXPORTS.items():
+    LABEL_ANNOTATORS.register_lazy(_name, _module, __name__)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -10,8 +10,12 @@ from batteryml.data.battery_data import BatteryData
 
 class BaseLabelAnnotator(abc.ABC):
     def __call__(self, cells: List[BatteryData]):
-        return torch.stack([
-            self.process_cell(cell) for cell in cells]).float().view(-1)
+        labels = torch.stack([
+            self.process_cell(cell) for cell in cells]).float()
+        # One label per cell, or a row of labels of multi-target annotators
+        if labels.ndim == 1:
+            return labels
+        return labels.view(len(cells), -1)
 
     @abc.abstractmethod
     def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
@@ -21,5 +25,6 @@ class BaseLabelAnnotator(abc.ABC):
             cell_data (BatteryData): data for single cell.
 
         Returns:
-            torch.Tensor: the processed label.
+            torch.Tensor: the processed label, a scalar, or a vector for
+                annotators with multiple targets.
         """
@@ -2,6 +2,9 @@
 # Copyright (c) Microsoft Corporation.
 
 import torch
+import numpy as np
+
+from typing import List, Union
 
 from batteryml.builders import LABEL_ANNOTATORS
 from batteryml.data.battery_data import BatteryData
@@ -11,8 +14,21 @@ from .base import BaseLabelAnnotator
 
 @LABEL_ANNOTATORS.register()
 class RULLabelAnnotator(BaseLabelAnnotator):
+    """Remaining useful life, the number of cycles until the discharge
+    capacity first drops to `eol_soh` of the nominal capacity.
+
+    Args:
+        eol_soh (float | List[float]): end-of-life state of health. A list
+            of thresholds gives one label per threshold, i.e., the labels
+            of a cell are a row of `len(eol_soh)` targets, which are all
+            computed from one pass over the cycles.
+        pad_eol (bool): label the cells that never reach the end of life
+            as if it was reached right after their last cycle, otherwise
+            their labels are NaN.
+        min_rul_limit (float): labels up to this limit are set to NaN.
+    """
     def __init__(self,
-                 eol_soh: float = 0.8,
+                 eol_soh: Union[float, List[float]] = 0.8,
                  pad_eol: bool = True,
                  min_rul_limit: float = 100.0):
         self.eol_soh = eol_soh
@@ -20,19 +36,25 @@ class RULLabelAnnotator(BaseLabelAnnotator):
         self.min_rul_limit = min_rul_limit
 
     def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
-        label, found_eol = 1, False
-        for cycle in cell_data.cycle_data:
-            label += 1
-            Qd = max(cycle.discharge_capacity_in_Ah)
-            if Qd <= cell_data.nominal_capacity_in_Ah * self.eol_soh:
-                found_eol = True
-                break
-
-        if not found_eol:
-            label = label + 1 if self.pad_eol else float('nan')
-
-        if label <= self.min_rul_limit:
-            label = float('nan')
-
-        label = torch.tensor(label)
+        Qd = np.array([
+            max(cycle.discharge_capacity_in_Ah)
+            for cycle in cell_data.cycle_data
+        ])
+        thresholds = cell_data.nominal_capacity_in_Ah * np.atleast_1d(
+            np.asarray(self.eol_soh, dtype=float))
+        # Index of the first cycle at the end of life per threshold, the
+        # appended column gives the number of cycles if it is never reached
+        reached = np.concatenate([
+            Qd[None, :] <= thresholds[:, None],
+            np.ones((len(thresholds), 1), dtype=bool)
+        ], axis=1)
+        eol = reached.argmax(axis=1)
+        label = (eol + 2).astype(float)
+        if not self.pad_eol:
+            label[eol == len(Qd)] = float('nan')
+        label[label <= self.min_rul_limit] = float('nan')
+
+        label = torch.from_numpy(label)
+        if np.ndim(self.eol_soh) == 0:
+            label = label[0]
         return label
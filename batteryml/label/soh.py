@@ -1,63 +1,81 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-import torch
 import os
-import json
-import pickle
+import torch
+import numpy as np
+
+from typing import List, Union
+
 from batteryml.builders import LABEL_ANNOTATORS
 from batteryml.data.battery_data import BatteryData
 
 from .base import BaseLabelAnnotator
+from .soh_index import load_soh_index
 
 
 @LABEL_ANNOTATORS.register()
 class SOHLabelAnnotator(BaseLabelAnnotator):
+    """State of health at `cycle_index`, the 1-based index of the cycle.
+
+    Args:
+        cycle_index (int | List[int]): cycle to label, or a list of cycles
+            of which all labels are looked up at once, giving one target
+            per cycle.
+        soh_filepath (str): JSON or pickle file of the SOH values as
+            `{cell_id: {cycle: {mode: value}}}`. It is converted once to a
+            columnar index, see `load_soh_index`. The values are computed
+            from the cycle data if not provided.
+        mode (str): `relative` to the nominal capacity, or the absolute
+            discharge capacity otherwise.
+    """
     def __init__(self,
-                 cycle_index: int = 100,
+                 cycle_index: Union[int, List[int]] = 100,
                  soh_filepath: str = None,  # we'd extract soh values based on your soh file if soh_filepath was provided
                  mode: str = 'relative'
-                ):
+                 ):
         self.cycle_index = cycle_index
         self.mode = mode
-        self.soh_dict = None
+        self.soh_index = None
 
         # read file
         if soh_filepath and os.path.exists(soh_filepath):
             print('read soh file')
-            root, extension = os.path.splitext(soh_filepath)
-            if extension == '.json':
-                self.cycle_index = str(self.cycle_index)
-                with open(soh_filepath, 'rb') as f:  
-                    self.soh_dict = json.load(f)
-            elif extension == '.pkl':
-                with open(soh_filepath, 'rb') as f:
-                    self.soh_dict = pickle.load(f)
+            self.soh_index = load_soh_index(soh_filepath)
 
     def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
-        cell_id = cell_data.cell_id
-        if self.soh_dict:
+        cycles = np.atleast_1d(np.asarray(self.cycle_index, dtype=np.int64))
+        if self.soh_index is not None:
             # if soh_filepath was provided, then use soh label in soh file
-            if (cell_id not in self.soh_dict) or (self.cycle_index not in self.soh_dict[cell_id]) or (self.mode not in self.soh_dict[cell_id][self.cycle_index]):
-                label = float('nan')
-            else:
-                label = self.soh_dict[cell_id][self.cycle_index][self.mode]
+            label = self.soh_index.lookup(
+                cell_data.cell_id, self.mode, cycles)
         else:
             #  if soh_filepath was not provided, the cycle data calculation is used as a fallback
-            if len(cell_data.cycle_data) >= self.cycle_index:
-                Qd = max(cell_data.cycle_data[self.cycle_index-1].discharge_capacity_in_Ah)
-                if self.mode == 'relative':
-                    nominal_capacity_in_Ah = 1
-                    if hasattr(cell_data, 'nominal_capacity_in_Ah') and cell_data.nominal_capacity_in_Ah:
-                        # use existed nominal_capacity_in_Ah
-                        nominal_capacity_in_Ah = cell_data.nominal_capacity_in_Ah
-                    else:
-                        # calcute nominal_capacity_in_Ah using first cycle TODO:maybe we need to use mean of first 5 cycles to enhance stable?
-                        nominal_capacity_in_Ah = max(cell_data.cycle_data[0].discharge_capacity_in_Ah)
-                    label = Qd / nominal_capacity_in_Ah
-                else:
-                    label = Qd
+            label = self._soh_from_cycles(cell_data, cycles)
+        label = torch.from_numpy(label)
+        if np.ndim(self.cycle_index) == 0:
+            label = label[0]
+        return label
+
+    def _soh_from_cycles(self,
+                         cell_data: BatteryData,
+                         cycles: np.ndarray) -> np.ndarray:
+        label = np.full(len(cycles), np.nan)
+        available = (cycles >= 1) & (cycles <= len(cell_data.cycle_data))
+        if not available.any():
+            return label
+        Qd = np.array([
+            max(cell_data.cycle_data[cycle - 1].discharge_capacity_in_Ah)
+            for cycle in cycles[available]
+        ])
+        if self.mode == 'relative':
+            if getattr(cell_data, 'nominal_capacity_in_Ah', None):
+                # use existed nominal_capacity_in_Ah
+                nominal_capacity_in_Ah = cell_data.nominal_capacity_in_Ah
             else:
-                label = float('nan')
-        label = torch.tensor(label)
-        return label
\ No newline at end of file
+                # calcute nominal_capacity_in_Ah using first cycle TODO:maybe we need to use mean of first 5 cycles to enhance stable?
+                nominal_capacity_in_Ah = max(
+                    cell_data.cycle_data[0].discharge_capacity_in_Ah)
+            Qd = Qd / nominal_capacity_in_Ah
+        label[available] = Qd
+        return label
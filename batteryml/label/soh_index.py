@@ -0,0 +1,141 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import os
+import json
+import pickle
+import numpy as np
+
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Indices loaded in this process, by the path and the modification time of
+# the SOH file
+_LOADED = {}
+
+
+class SOHIndex:
+    """Columnar index of the SOH values of (cell, cycle, mode).
+
+    The values are stored as flat arrays sorted by the cell, the mode and
+    the cycle, and a dict maps each (cell, mode) to its block of the
+    arrays, so that the values of many cycles of a cell are looked up at
+    once with a binary search.
+
+    Args:
+        blocks (dict): (cell id, mode) to the start and end of its block.
+        cycles (np.ndarray): cycle index of each value.
+        values (np.ndarray): SOH values.
+    """
+    def __init__(self,
+                 blocks: Dict[Tuple[str, str], Tuple[int, int]],
+                 cycles: np.ndarray,
+                 values: np.ndarray):
+        self.blocks = blocks
+        self.cycles = np.asarray(cycles, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.values)
+
+    def lookup(self, cell_id: str, mode: str, cycles) -> np.ndarray:
+        """SOH values of the cycles of a cell, NaN where not available."""
+        cycles = np.asarray(cycles, dtype=np.int64)
+        result = np.full(cycles.shape, np.nan)
+        if (cell_id, mode) not in self.blocks:
+            return result
+        start, end = self.blocks[(cell_id, mode)]
+        keys = self.cycles[start:end]
+        position = np.searchsorted(keys, cycles).clip(max=len(keys) - 1)
+        found = keys[position] == cycles
+        result[found] = self.values[start:end][position[found]]
+        return result
+
+    @classmethod
+    def from_dict(cls, soh_dict: dict) -> 'SOHIndex':
+        """Convert the nested `{cell_id: {cycle: {mode: value}}}` dict,
+        where the cycles are integers or the strings of them."""
+        columns = {}
+        for cell_id, cycles in soh_dict.items():
+            for cycle, modes in cycles.items():
+                for mode, value in modes.items():
+                    column = columns.setdefault((str(cell_id), mode), {})
+                    column[int(cycle)] = value
+        blocks, cycles, values, start = {}, [], [], 0
+        for key in sorted(columns):
+            column = sorted(columns[key].items())
+            blocks[key] = (start, start + len(column))
+            cycles.extend(cycle for cycle, _ in column)
+            values.extend(
+                np.nan if value is None else value for _, value in column)
+            start += len(column)
+        return cls(blocks, cycles, values)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'SOHIndex':
+        """Convert a SOH file in JSON or pickle."""
+        if Path(path).suffix == '.json':
+            with open(path, 'rb') as f:
+                return cls.from_dict(json.load(f))
+        with open(path, 'rb') as f:
+            return cls.from_dict(pickle.load(f))
+
+    def save(self, path: str):
+        """Write the index through a temporary file, so that a reader
+        never sees a partially written index."""
+        keys = sorted(self.blocks, key=self.blocks.get)
+        path = Path(path)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                cell_ids=np.array(
+                    [cell_id for cell_id, _ in keys], dtype=str),
+                modes=np.array([mode for _, mode in keys], dtype=str),
+                bounds=np.array([self.blocks[key] for key in keys],
+                                dtype=np.int64).reshape(-1, 2),
+                cycles=self.cycles,
+                values=self.values)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SOHIndex':
+        with np.load(path) as data:
+            blocks = {
+                (str(cell_id), str(mode)): (int(start), int(end))
+                for cell_id, mode, (start, end)
+                in zip(data['cell_ids'], data['modes'], data['bounds'])
+            }
+            return cls(blocks, data['cycles'], data['values'])
+
+
+def load_soh_index(soh_filepath: str) -> SOHIndex:
+    """Index of a SOH file, converted once and kept in the cache directory
+    as `soh_index_<hash of the path>.npz`, which is rebuilt when the SOH
+    file is newer or the index can not be read. Indices are shared within
+    the process."""
+    from batteryml.pipeline import CACHE_DIR, hash_string
+
+    mtime = os.path.getmtime(soh_filepath)
+    key = (os.path.abspath(soh_filepath), mtime)
+    if key in _LOADED:
+        return _LOADED[key]
+
+    index_path = CACHE_DIR / f'soh_index_{hash_string(key[0])}.npz'
+    index = None
+    if index_path.exists() and index_path.stat().st_mtime >= mtime:
+        try:
+            index = SOHIndex.load(index_path)
+        except Exception:
+            # E.g., a truncated file of an interrupted run
+            index = None
+    if index is None:
+        index = SOHIndex.from_file(soh_filepath)
+        try:
+            CACHE_DIR.mkdir(exist_ok=True)
+            index.save(index_path)
+        except OSError:
+            # E.g., the working directory is read-only
+            pass
+    _LOADED[key] = index
+    return index
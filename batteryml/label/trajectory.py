@@ -0,0 +1,94 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+import numpy as np
+
+from typing import List
+
+from batteryml.builders import LABEL_ANNOTATORS
+from batteryml.data.battery_data import BatteryData
+from batteryml.data.ragged import RaggedTensor
+
+from .base import BaseLabelAnnotator
+
+
+TRAJECTORY_TARGETS = ['soh', 'rul']
+
+
+@LABEL_ANNOTATORS.register()
+class TrajectoryLabelAnnotator(BaseLabelAnnotator):
+    """Labels of every `cycle_stride`-th cycle of each cell from
+    `min_cycle_index` until the end of life, so that each cell gives many
+    training examples instead of one.
+
+    The labels are returned as a `RaggedTensor` with a row per cell, which
+    `Task` flattens into one example per (cell, cycle). Pair it with
+    `TrajectoryWindowFeatureExtractor` of the same `min_cycle_index` and
+    `cycle_stride`.
+
+    Args:
+        targets (List[str]): `soh`, the discharge capacity of the cycle
+            relative to the nominal capacity, and/or `rul`, the number of
+            cycles left until the end of life. Defaults to `rul` only, a
+            single target gives a vector of labels as the NN models
+            require, while several give a column per target.
+        eol_soh (float): state of health at the end of life.
+        pad_eol (bool): take the cycle after the last one as the end of
+            life of the cells that never reach it, otherwise their `rul` is
+            NaN.
+        min_cycle_index (int): first cycle to label.
+        cycle_stride (int): label every `cycle_stride`-th cycle.
+    """
+    def __init__(self,
+                 targets: List[str] = None,
+                 eol_soh: float = 0.8,
+                 pad_eol: bool = True,
+                 min_cycle_index: int = 0,
+                 cycle_stride: int = 1):
+        targets = targets or ['rul']
+        if isinstance(targets, str):
+            targets = [targets]
+        for target in targets:
+            assert target in TRAJECTORY_TARGETS, f'Unknown target {target}'
+        assert cycle_stride > 0, cycle_stride
+        self.targets = targets
+        self.eol_soh = eol_soh
+        self.pad_eol = pad_eol
+        self.min_cycle_index = min_cycle_index
+        self.cycle_stride = cycle_stride
+
+    def __call__(self, cells: List[BatteryData]) -> RaggedTensor:
+        return RaggedTensor.from_tensors([
+            self.process_cell(cell) for cell in cells]).float()
+
+    def process_cell(self, cell_data: BatteryData) -> torch.Tensor:
+        Qd = np.array([
+            max(cycle.discharge_capacity_in_Ah)
+            for cycle in cell_data.cycle_data
+        ], dtype=float)
+        nominal_capacity = cell_data.nominal_capacity_in_Ah
+        if not nominal_capacity:
+            nominal_capacity = Qd[0] if len(Qd) else 1.
+        soh = Qd / nominal_capacity
+
+        # The end of life is the first cycle below `eol_soh`, or the cycle
+        # after the last one if it is never reached, and the cycles before
+        # it are labeled
+        reached = np.append(soh <= self.eol_soh, True)
+        eol = int(reached.argmax())
+        cycles = np.arange(self.min_cycle_index, eol, self.cycle_stride)
+        rul = (eol - cycles).astype(float)
+        if eol == len(Qd) and not self.pad_eol:
+            rul[:] = float('nan')
+
+        columns = {'soh': soh[cycles], 'rul': rul}
+        label = np.stack([columns[target] for target in self.targets], 1)
+        label = torch.from_numpy(label)
+        if len(self.targets) == 1:
+            label = label.view(-1)
+        return label
+
+    def cycle_index(self, position: torch.Tensor) -> torch.Tensor:
+        """Cycle index of the labels at `position` in the row of a cell."""
+        return self.min_cycle_index + position * self.cycle_stride
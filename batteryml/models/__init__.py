@@ -1,4 +1,10 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .rul_predictors import CNNRULPredictor
+from batteryml.utils import lazy_exports
+
+from . import rul_predictors
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'CNNRULPredictor': '.rul_predictors',
+})
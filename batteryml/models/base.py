@@ -1,9 +1,11 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
+import os
 import abc
 import torch
 import shutil
+import torch.nn as nn
 
 from batteryml.data.databundle import DataBundle
 
@@ -14,18 +16,47 @@ class BaseModel(abc.ABC):
         self.workspace = workspace
 
     @abc.abstractmethod
-    def fit(self, dataset: DataBundle, timestamp: str = None):
+    def fit(self, dataset: DataBundle, timestamp: str = None, seed: int = 0):
         """Fit the dataset in an in-place manner.
 
         Args:
             dataset (DataBundle): dataset for training.
             timestamp (str): current timestamp for saving checkpoints.
+            seed (int): random seed of the run, used to name the outputs.
         """
 
     @abc.abstractmethod
     def predict(self, dataset: DataBundle, data_type: str='test') -> torch.Tensor:
         """Predict the degradation labels."""
 
+    def predict_with_uncertainty(self,
+                                 dataset: DataBundle,
+                                 data_type: str = 'test',
+                                 alpha: float = 0.1):
+        """Predict the labels with `1 - alpha` prediction intervals.
+
+        Returns:
+            the point predictions and the lower and upper bounds of the
+            intervals, all in the (transformed) label space as `predict`.
+        """
+        raise NotImplementedError(
+            f'{type(self).__name__} does not support prediction intervals.')
+
+    def export_module(self, feature: torch.Tensor) -> nn.Module:
+        """Export the prediction of the model as a torch module.
+
+        Args:
+            feature (torch.Tensor): a batch of (transformed) features, used
+                to infer and check the exported computation.
+
+        Returns:
+            a module mapping a batch of transformed features to the
+            predictions of the transformed labels, shaped as `[B]`, that
+            can be traced into TorchScript or ONNX.
+        """
+        raise NotImplementedError(
+            f'{type(self).__name__} can not be exported.')
+
     @abc.abstractmethod
     def dump_checkpoint(self, path: str):
         """Dump checkpoint to disk."""
@@ -39,5 +70,21 @@ class BaseModel(abc.ABC):
         return self
 
     def link_latest_checkpoint(self, filename: str):
+        """Point `latest.ckpt` to the given checkpoint.
+
+        A relative symlink is preferred so that the workspace can be moved,
+        falling back to a hardlink and then to a copy on file systems that
+        support neither.
+        """
         to_dump = self.workspace / 'latest.ckpt'
-        shutil.copyfile(filename, to_dump)
+        if os.path.lexists(to_dump):
+            os.remove(to_dump)
+        try:
+            os.symlink(os.path.relpath(filename, self.workspace), to_dump)
+            return
+        except OSError:
+            pass
+        try:
+            os.link(filename, to_dump)
+        except OSError:
+            shutil.copyfile(filename, to_dump)
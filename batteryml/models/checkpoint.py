@@ -0,0 +1,87 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import os
+import copy
+import queue
+import torch
+import threading
+
+from pathlib import Path
+from collections import defaultdict
+
+
+class CheckpointWriter:
+    """Write model checkpoints from a background thread.
+
+    The state dict is snapshotted on the caller's thread, so the training
+    loop can keep updating the parameters while the snapshot is serialized.
+    At most `max_pending` snapshots wait in the queue, after which `submit`
+    blocks to bound the memory held by pending checkpoints.
+
+    Args:
+        keep_last (int): number of most recent checkpoints to keep per
+            group (e.g., per seed), older ones are deleted. `None` keeps all.
+        max_pending (int): maximum number of snapshots waiting to be written.
+        asynchronous (bool): write in a background thread. If `False`, the
+            checkpoints are written synchronously in `submit`.
+    """
+    def __init__(self,
+                 keep_last: int = None,
+                 max_pending: int = 2,
+                 asynchronous: bool = True):
+        self.keep_last = keep_last
+        self._written = defaultdict(list)
+        self._error = None
+        self._queue = queue.Queue(max_pending)
+        self._thread = None
+        if asynchronous:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def submit(self, state_dict: dict, path: str, group=None):
+        self._raise_if_failed()
+        snapshot = {
+            key: val.detach().to('cpu', copy=True)
+            if isinstance(val, torch.Tensor) else copy.deepcopy(val)
+            for key, val in state_dict.items()
+        }
+        if self._thread is None:
+            self._write(snapshot, path, group)
+        else:
+            self._queue.put((snapshot, path, group))
+
+    def close(self):
+        """Wait for the pending checkpoints and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_if_failed()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+
+    def _write(self, snapshot: dict, path: str, group=None):
+        path = Path(path)
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        torch.save(snapshot, tmp_path)
+        os.replace(tmp_path, path)
+
+        written = self._written[group]
+        written.append(path)
+        if self.keep_last is not None:
+            while len(written) > self.keep_last:
+                written.pop(0).unlink(missing_ok=True)
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Fail to write checkpoint.') from error
@@ -0,0 +1,63 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import os
+import torch
+import torch.nn as nn
+
+from pathlib import Path
+
+
+class CompiledForward:
+    """Forward pass compiled ahead of time by AOTInductor into a `.pt2`
+    package, which evaluation-only runs load in seconds instead of
+    compiling the model again.
+
+    The weights are not packaged but loaded from the module, and the
+    constants folded from them are recomputed on loading, so that one
+    package serves every checkpoint (e.g., every seed) of the same
+    architecture and input shape.
+
+    Args:
+        path (str): package file, compiled from `module` if it does not
+            exist.
+        module (nn.Module): module mapping a batch of features to the
+            predictions, e.g., of `NNModel.export_module`.
+        feature (torch.Tensor): a batch of features, on which the module is
+            exported with a dynamic batch size.
+    """
+    def __init__(self, path: str, module: nn.Module, feature: torch.Tensor):
+        path = Path(path)
+        if not path.exists():
+            print(f'Compile the model ahead of time into {str(path)}.')
+            compile_package(module, feature, path)
+        self.runner = torch._inductor.aoti_load_package(str(path))
+        self.load_weights(module)
+
+    def load_weights(self, module: nn.Module):
+        names = set(self.runner.get_constant_fqns())
+        weights = {
+            name: tensor for name, tensor in module.state_dict().items()
+            if name in names
+        }
+        self.runner.load_constants(weights, check_full_update=True)
+
+    def __call__(self, feature: torch.Tensor) -> torch.Tensor:
+        return self.runner(feature)
+
+
+def compile_package(module: nn.Module, feature: torch.Tensor, path: Path):
+    batch = torch.export.Dim('batch', min=1)
+    program = torch.export.export(
+        module.eval(), (feature,), dynamic_shapes=({0: batch},))
+    # Written through a temporary file, so that concurrent runs never load
+    # a partially written package
+    tmp_path = path.with_name(f'{path.stem}.{os.getpid()}.tmp.pt2')
+    torch._inductor.aoti_compile_and_package(
+        program,
+        package_path=str(tmp_path),
+        inductor_configs={
+            'aot_inductor.package_constants_in_so': False,
+            'aot_inductor.use_runtime_constant_folding': True,
+        })
+    os.replace(tmp_path, path)
@@ -0,0 +1,71 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+
+from typing import List
+
+from batteryml.data.databundle import DataBundle
+
+from .base import BaseModel
+
+
+class EnsembleModel(BaseModel):
+    """Ensemble of trained replicas of a model, e.g., the seeds of a
+    multi-seed run, whose spread gives the prediction intervals.
+
+    Args:
+        models (List[BaseModel]): trained members of the ensemble.
+        seeds (List[int]): seeds of the members, used to name the member
+            checkpoints.
+    """
+    def __init__(self,
+                 models: List[BaseModel],
+                 seeds: List[int] = None,
+                 workspace: str = None):
+        BaseModel.__init__(self, workspace)
+        assert len(models) > 0, 'The ensemble has no member.'
+        self.models = models
+        self.seeds = seeds or list(range(len(models)))
+
+    def fit(self, dataset: DataBundle, timestamp: str = None, seed: int = 0):
+        for member_seed, model in zip(self.seeds, self.models):
+            model.fit(dataset, timestamp=timestamp, seed=member_seed)
+
+    @torch.no_grad()
+    def member_predictions(self,
+                           dataset: DataBundle,
+                           data_type: str = 'test') -> torch.Tensor:
+        """Predictions of all members, of shape (num_members, num_cells)."""
+        return torch.stack([
+            model.predict(dataset, data_type).float().view(-1)
+            for model in self.models
+        ])
+
+    def predict(self,
+                dataset: DataBundle,
+                data_type: str = 'test') -> torch.Tensor:
+        return self.member_predictions(dataset, data_type).mean(0)
+
+    def predict_with_uncertainty(self,
+                                 dataset: DataBundle,
+                                 data_type: str = 'test',
+                                 alpha: float = 0.1):
+        """Empirical quantiles of the member predictions."""
+        predictions = self.member_predictions(dataset, data_type)
+        q = torch.tensor(
+            [alpha / 2, 1 - alpha / 2], device=predictions.device)
+        lower, upper = torch.quantile(predictions, q, dim=0)
+        return predictions.mean(0), lower, upper
+
+    def dump_checkpoint(self, path: str):
+        for seed, model in zip(self.seeds, self.models):
+            model.dump_checkpoint(f'{path}.seed_{seed}')
+
+    def load_checkpoint(self, path: str):
+        for seed, model in zip(self.seeds, self.models):
+            model.load_checkpoint(f'{path}.seed_{seed}')
+
+    def to(self, device: str):
+        self.models = [model.to(device) for model in self.models]
+        return self
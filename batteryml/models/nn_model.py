@@ -2,6 +2,9 @@
 # Copyright (c) Microsoft Corporation.
 
 import abc
+import copy
+import json
+import time
 import torch
 import random
 import numpy as np
@@ -9,11 +12,16 @@ import torch.nn as nn
 import torch.optim as optim
 
 from tqdm import tqdm
+from typing import List, Union
+from torch.func import stack_module_state, functional_call, vmap
+from torch.utils.data import Subset
 from torch.utils.data.dataloader import DataLoader
 
 from batteryml.data import DataBundle
 
 from .base import BaseModel
+from .checkpoint import CheckpointWriter
+from .compiled import CompiledForward
 
 
 def seed_worker(worker_id):
@@ -23,6 +31,12 @@ def seed_worker(worker_id):
 
 
 class NNModel(BaseModel, nn.Module, abc.ABC):
+    # Whether `forward` can be batched over stacked replicas with `vmap`.
+    vmap_compatible = True
+    # Predictions whose magnitude stays below this value are treated as a
+    # collapsed model whose parameters should be reset.
+    collapse_tolerance = None
+
     def __init__(self,
                  batch_size: int = 32,
                  epochs: int = 10000,
@@ -31,7 +45,49 @@ class NNModel(BaseModel, nn.Module, abc.ABC):
                  checkpoint_freq: int = 1000,
                  train_batch_size: int = None,
                  test_batch_size: int = None,
-                 lr: float = 1e-3):
+                 lr: float = 1e-3,
+                 valid_ratio: float = 0.,
+                 patience: int = None,
+                 min_delta: float = 0.,
+                 lr_scheduler: dict = None,
+                 precision: str = 'fp32',
+                 num_threads: int = None,
+                 num_interop_threads: int = None,
+                 compile: Union[bool, dict] = False,
+                 keep_last_checkpoints: int = None,
+                 async_checkpoint: bool = True,
+                 mc_samples: int = 32):
+        """
+        Args:
+            valid_ratio (float): fraction of the training set held out for
+                validation. When positive, the validation loss drives early
+                stopping and checkpoint selection.
+            patience (int): number of epochs without improvement of the
+                validation loss before the training stops. `None` disables
+                early stopping.
+            min_delta (float): minimum decrease of the validation loss to be
+                considered as an improvement.
+            lr_scheduler (dict): config of a scheduler in
+                `torch.optim.lr_scheduler`, e.g.,
+                `dict(name='ReduceLROnPlateau', factor=0.5, patience=50)`.
+            precision (str): `fp32`, or `bf16` to run the forward pass under
+                bfloat16 autocast.
+            num_threads (int): number of intra-op threads used by torch.
+            num_interop_threads (int): number of inter-op threads used by
+                torch. Only effective before any parallel work has started.
+            compile (bool | dict): whether to `torch.compile` the model, a
+                dict is passed to `torch.compile` as options, e.g.,
+                `dict(backend='inductor', mode='max-autotune-no-cudagraphs')`.
+                Evaluation-only runs predict with a package compiled ahead
+                of time instead, see `compile_ahead`.
+            keep_last_checkpoints (int): number of the most recent periodic
+                checkpoints to keep per seed, `None` keeps all of them. The
+                best checkpoint is always kept.
+            async_checkpoint (bool): write the periodic checkpoints from a
+                background thread instead of blocking the training loop.
+            mc_samples (int): number of dropout samples per input of the
+                MC dropout prediction intervals.
+        """
         nn.Module.__init__(self)
         BaseModel.__init__(self, workspace)
         self.train_epochs = epochs
@@ -43,39 +99,75 @@ class NNModel(BaseModel, nn.Module, abc.ABC):
         self.train_batch_size = train_batch_size or batch_size
         self.test_batch_size = test_batch_size or batch_size
         self.lr = lr
+        self.valid_ratio = valid_ratio
+        self.patience = patience
+        self.min_delta = min_delta
+        self.lr_scheduler = lr_scheduler
+        assert precision in ['fp32', 'bf16'], precision
+        self.precision = precision
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        if compile is True:
+            compile = {}
+        self.compile_options = None if compile is False else compile
+        self.compiled_forward = None
+        self.keep_last_checkpoints = keep_last_checkpoints
+        self.async_checkpoint = async_checkpoint
+        self.mc_samples = mc_samples
 
     def fit(self,
             dataset: DataBundle,
             timestamp: str = None,
             seed: int = 0):
+        assert dataset.train_data.label.ndim == 1, \
+            f'{type(self).__name__} only supports a single target'
         self.train()
-        train_data = dataset.train_data
+        set_num_threads(self.num_threads, self.num_interop_threads)
+        train_data, valid_data = split_validation(
+            dataset.train_data, self.valid_ratio, seed)
         loader = DataLoader(
             train_data, self.train_batch_size,
             shuffle=True, worker_init_fn=seed_worker)
         # TODO: support customization of optimizers
         optimizer = optim.Adam(self.parameters(), lr=self.lr)
+        scheduler = build_lr_scheduler(optimizer, self.lr_scheduler)
+        stopper = EarlyStopping(1, self.patience, self.min_delta)
+        writer = CheckpointWriter(
+            self.keep_last_checkpoints, asynchronous=self.async_checkpoint)
 
         timestamp = timestamp or 'UnknownTime'
 
-        latest = None
+        latest, best_state = None, None
+        start_time = time.perf_counter()
         for epoch in tqdm(range(self.train_epochs), desc='Traning'):
             self.train()
+            train_loss = []
             for batch in loader:
-                loss = self.forward(**batch, return_loss=True)
+                with self.autocast():
+                    loss = self(**batch, return_loss=True)
                 if loss == torch.inf:
                     reset_parameters(self)
                     optimizer = optim.Adam(self.parameters(), lr=self.lr)
+                    scheduler = build_lr_scheduler(
+                        optimizer, self.lr_scheduler)
                 else:
                     optimizer.zero_grad()
                     loss.backward()
                     optimizer.step()
+                    train_loss.append(loss.item())
+
+            monitor = float(np.mean(train_loss)) if train_loss else None
+            if valid_data is not None:
+                monitor = self.validate(valid_data)
+                if stopper.update(torch.tensor([monitor]), epoch).any():
+                    best_state = copy.deepcopy(self.state_dict())
+            step_lr_scheduler(scheduler, monitor)
 
             if self.checkpoint_freq is not None and \
                     (epoch + 1) % self.checkpoint_freq == 0:
                 filename = f'{timestamp}_seed_{seed}_epoch_{epoch+1}.ckpt'
                 if self.workspace is not None:
-                    self.dump_checkpoint(self.workspace / filename)
+                    writer.submit(self.state_dict(), self.workspace / filename)
                     latest = self.workspace / filename
 
             if (epoch + 1) % self.evaluate_freq == 0:
@@ -83,12 +175,44 @@ class NNModel(BaseModel, nn.Module, abc.ABC):
                 score = dataset.evaluate(pred, 'RMSE')
                 print(f'[{epoch+1}/{self.train_epochs}] RMSE {score:.2f}', flush=True)
 
+            if stopper.should_stop():
+                print(f'Early stop at epoch {epoch+1}, the best validation '
+                      f'loss is {stopper.best[0]:.4f} at epoch '
+                      f'{stopper.best_epoch[0]+1}.', flush=True)
+                break
+        wall_time = time.perf_counter() - start_time
+        writer.close()
+
+        if best_state is not None:
+            self.load_state_dict(best_state)
+            if self.workspace is not None:
+                latest = self.workspace / f'{timestamp}_seed_{seed}_best.ckpt'
+                self.dump_checkpoint(latest)
+
         if self.workspace is not None:
             self.link_latest_checkpoint(latest)
+            dump_training_summary(
+                self.workspace, timestamp, seed, epoch, wall_time,
+                stopper, 0)
+
+    @torch.no_grad()
+    def validate(self, valid_data) -> float:
+        """Mean squared error on the validation data."""
+        self.eval()
+        loader = DataLoader(
+            valid_data, self.test_batch_size,
+            shuffle=False, worker_init_fn=seed_worker)
+        with self.autocast():
+            errors = [
+                (self(**batch).float() - batch['label'].view(-1)) ** 2
+                for batch in loader
+            ]
+        return float(torch.cat(errors).mean())
 
     @torch.no_grad()
     def predict(self, dataset: DataBundle, data_type: str='test') -> torch.Tensor:
         self.eval()
+        set_num_threads(self.num_threads, self.num_interop_threads)
         # test_data = dataset.test_data
         if data_type == 'test':
             test_data = dataset.test_data
@@ -98,8 +222,235 @@ class NNModel(BaseModel, nn.Module, abc.ABC):
         loader = DataLoader(
             test_data, self.test_batch_size,
             shuffle=False, worker_init_fn=seed_worker)
-        predictions = torch.cat([self.forward(**batch) for batch in loader])
-        return predictions
+        if self.compiled_forward is not None:
+            predictions = torch.cat([
+                self.compiled_forward(batch['feature']) for batch in loader
+            ])
+            return predictions.float()
+        with self.autocast():
+            predictions = torch.cat([self(**batch) for batch in loader])
+        return predictions.float()
+
+    @torch.no_grad()
+    def predict_with_uncertainty(self,
+                                 dataset: DataBundle,
+                                 data_type: str = 'test',
+                                 alpha: float = 0.1):
+        """Intervals by Monte Carlo dropout.
+
+        Each batch is repeated `mc_samples` times and passed through the
+        model once with only the dropout layers in training mode, so the
+        samples of a batch share one forward pass. The point predictions
+        are the deterministic ones of `predict`.
+
+        Only the models applying a dropout with a positive rate in
+        `forward` have intervals, i.e., `MLPRULPredictor` and
+        `TransformerRULPredictor`, and `CNNRULPredictor` and
+        `LSTMRULPredictor` with `dropout > 0`. The others raise
+        `NotImplementedError` after the first batch at most.
+        """
+        dropouts = [
+            module for module in self.modules()
+            if isinstance(module, nn.modules.dropout._DropoutNd)
+            and module.p > 0
+        ]
+        if not dropouts:
+            return BaseModel.predict_with_uncertainty(
+                self, dataset, data_type, alpha)
+
+        data = dataset.test_data if data_type == 'test' \
+            else dataset.train_data
+        loader = DataLoader(
+            data, self.test_batch_size,
+            shuffle=False, worker_init_fn=seed_worker)
+        K = self.mc_samples
+        # Dropout layers may be defined but unused in `forward`, which is
+        # detected on the first batch instead of after all samples
+        applied = []
+        hooks = [
+            module.register_forward_hook(lambda *_: applied.append(True))
+            for module in dropouts
+        ]
+        for module in dropouts:
+            module.train()
+        samples = []
+        try:
+            with self.autocast():
+                for batch in loader:
+                    B = len(batch['label'])
+                    batch = {
+                        key: val.repeat(K, *[1] * (val.ndim - 1))
+                        for key, val in batch.items()
+                    }
+                    samples.append(self(**batch).float().view(K, B))
+                    if not applied:
+                        break
+        finally:
+            for hook in hooks:
+                hook.remove()
+            self.eval()
+        if not applied:
+            return BaseModel.predict_with_uncertainty(
+                self, dataset, data_type, alpha)
+
+        prediction = self.predict(dataset, data_type)
+        samples = torch.cat(samples, dim=1)
+        q = torch.tensor(
+            [alpha / 2, 1 - alpha / 2], device=samples.device)
+        lower, upper = torch.quantile(samples, q, dim=0)
+        return prediction, lower, upper
+
+    def export_module(self, feature: torch.Tensor) -> nn.Module:
+        """The model in evaluation mode behind a feature-only `forward`.
+        The forward pass is exported in fp32 regardless of `precision`."""
+        self.eval()
+        return _FeatureForward(self)
+
+    def compile_ahead(self, path: str, feature: torch.Tensor) -> bool:
+        """Predict with the forward pass of `export_module` compiled ahead
+        of time into the package `path`, which is compiled if it does not
+        exist, see `CompiledForward`. Models in `bf16` precision, or of
+        which the export fails, keep their forward pass.
+
+        Returns:
+            whether the compiled forward pass is used.
+        """
+        if self.precision != 'fp32':
+            return False
+        try:
+            self.compiled_forward = CompiledForward(
+                path, self.export_module(feature), feature)
+        except Exception as e:
+            print(f'{type(self).__name__} can not be compiled ahead of '
+                  f'time: {e}')
+            return False
+        return True
+
+    def autocast(self):
+        """Autocast context for the forward passes of the model."""
+        return autocast(self.precision, self.device.type)
+
+    @property
+    def device(self) -> torch.device:
+        for param in self.parameters():
+            return param.device
+        return torch.device('cpu')
+
+    @classmethod
+    def fit_ensemble(cls,
+                     models: List['NNModel'],
+                     dataset: DataBundle,
+                     timestamp: str = None,
+                     seeds: List[int] = None):
+        """Train independently initialized replicas of the same model jointly.
+
+        The parameters of all replicas are stacked and the replicas are run
+        in one batched forward pass, so the data loading, the optimizer
+        step and the python overhead are shared. Each replica still owns its
+        own initialization, dropout masks and Adam statistics, only the
+        shuffling order of the training batches is shared.
+
+        Args:
+            models (List[NNModel]): replicas with identical architecture and
+                hyper-parameters, typically built with different seeds.
+            dataset (DataBundle): dataset for training.
+            timestamp (str): current timestamp for saving checkpoints.
+            seeds (List[int]): seeds of the replicas, used to name the
+                per-seed checkpoints.
+        """
+        seeds = seeds if seeds is not None else list(range(len(models)))
+        assert len(seeds) == len(models), (len(seeds), len(models))
+        assert len(set(type(model) for model in models)) == 1, \
+            'All replicas should share the same model class.'
+        assert dataset.train_data.label.ndim == 1, \
+            f'{cls.__name__} only supports a single target'
+        ref = models[0]
+        timestamp = timestamp or 'UnknownTime'
+        set_num_threads(ref.num_threads, ref.num_interop_threads)
+        ensemble = _StackedReplicas(models)
+
+        # All replicas share the validation split of the first seed
+        train_data, valid_data = split_validation(
+            dataset.train_data, ref.valid_ratio, seeds[0])
+        loader = DataLoader(
+            train_data, ref.train_batch_size,
+            shuffle=True, worker_init_fn=seed_worker)
+        optimizer = optim.Adam(ensemble.params.values(), lr=ref.lr)
+        scheduler = build_lr_scheduler(optimizer, ref.lr_scheduler)
+        stopper = EarlyStopping(len(models), ref.patience, ref.min_delta)
+        writer = CheckpointWriter(
+            ref.keep_last_checkpoints, asynchronous=ref.async_checkpoint)
+
+        latest = [None] * len(models)
+        best_params = None
+        start_time = time.perf_counter()
+        for epoch in tqdm(range(ref.train_epochs), desc='Traning'):
+            ensemble.train()
+            train_loss = []
+            for batch in loader:
+                with ref.autocast():
+                    pred = ensemble(**batch).float()
+                collapsed = ensemble.collapsed(pred)
+                if collapsed.any():
+                    ensemble.reset_replicas(collapsed, optimizer)
+                    continue
+                label = batch['label'].view(1, -1)
+                loss = torch.mean((pred - label) ** 2, dim=1).sum()
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                train_loss.append(loss.item() / len(models))
+
+            monitor = float(np.mean(train_loss)) if train_loss else None
+            if valid_data is not None:
+                valid_loss = ensemble.validate(valid_data)
+                improved = stopper.update(valid_loss, epoch)
+                best_params = ensemble.snapshot(best_params, improved)
+                monitor = float(valid_loss.mean())
+            step_lr_scheduler(scheduler, monitor)
+
+            if ref.checkpoint_freq is not None and \
+                    (epoch + 1) % ref.checkpoint_freq == 0:
+                for i, (model, seed) in enumerate(zip(models, seeds)):
+                    filename = \
+                        f'{timestamp}_seed_{seed}_epoch_{epoch+1}.ckpt'
+                    if model.workspace is not None:
+                        writer.submit(
+                            ensemble.state_dict(i),
+                            model.workspace / filename,
+                            group=seed)
+                        latest[i] = model.workspace / filename
+
+            if (epoch + 1) % ref.evaluate_freq == 0:
+                scores = [
+                    dataset.evaluate(pred, 'RMSE')
+                    for pred in ensemble.predict(dataset)
+                ]
+                scores = ', '.join(f'{s:.2f}' for s in scores)
+                print(f'[{epoch+1}/{ref.train_epochs}] RMSE {scores}',
+                      flush=True)
+
+            if stopper.should_stop():
+                print(f'Early stop at epoch {epoch+1}.', flush=True)
+                break
+        wall_time = time.perf_counter() - start_time
+        writer.close()
+
+        if best_params is not None:
+            ensemble.restore(best_params)
+        ensemble.write_back()
+        if ref.workspace is None:
+            return
+        for i, (model, seed) in enumerate(zip(models, seeds)):
+            if best_params is not None:
+                latest[i] = model.workspace / \
+                    f'{timestamp}_seed_{seed}_best.ckpt'
+                model.dump_checkpoint(latest[i])
+            dump_training_summary(
+                model.workspace, timestamp, seed, epoch, wall_time,
+                stopper, i)
+        if latest[-1] is not None:
+            models[-1].link_latest_checkpoint(latest[-1])
 
     def to(self, device: str):
         return nn.Module.to(self, device)
@@ -111,6 +462,211 @@ class NNModel(BaseModel, nn.Module, abc.ABC):
         self.load_state_dict(torch.load(path))
 
 
+class _FeatureForward(nn.Module):
+    def __init__(self, model: NNModel):
+        nn.Module.__init__(self)
+        self.model = model
+
+    def forward(self, feature: torch.Tensor) -> torch.Tensor:
+        label = feature.new_zeros(feature.shape[0])
+        return self.model(feature, label).view(-1)
+
+
+class _StackedReplicas:
+    """Functional view over replicas whose parameters are stacked."""
+    def __init__(self, models: List[NNModel]):
+        self.models = models
+        self.params, self.buffers = stack_module_state(models)
+        # A stateless skeleton of the architecture for `functional_call`
+        self.base = copy.deepcopy(models[0]).to('meta')
+        self.batch_size = models[0].test_batch_size
+        self.tolerance = models[0].collapse_tolerance
+        self.autocast = models[0].autocast
+
+    def train(self, mode: bool = True):
+        self.base.train(mode)
+
+    def _forward_one(self, params, buffers, feature, label):
+        return functional_call(
+            self.base, (params, buffers), (feature, label))
+
+    def __call__(self, feature: torch.Tensor, label: torch.Tensor):
+        """Return the predictions of all replicas, shaped as [N, B]."""
+        if self.base.vmap_compatible:
+            return vmap(
+                self._forward_one,
+                in_dims=(0, 0, None, None),
+                randomness='different'
+            )(self.params, self.buffers, feature, label)
+        return torch.stack([
+            self._forward_one(
+                {k: v[i] for k, v in self.params.items()},
+                {k: v[i] for k, v in self.buffers.items()},
+                feature, label)
+            for i in range(len(self.models))
+        ])
+
+    @torch.no_grad()
+    def predict(self, dataset: DataBundle) -> torch.Tensor:
+        self.train(False)
+        loader = DataLoader(
+            dataset.test_data, self.batch_size,
+            shuffle=False, worker_init_fn=seed_worker)
+        with self.autocast():
+            predictions = torch.cat([self(**batch) for batch in loader], 1)
+        return predictions.float()
+
+    @torch.no_grad()
+    def validate(self, valid_data) -> torch.Tensor:
+        """Per-replica mean squared error on the validation data."""
+        self.train(False)
+        loader = DataLoader(
+            valid_data, self.batch_size,
+            shuffle=False, worker_init_fn=seed_worker)
+        with self.autocast():
+            errors = [
+                (self(**batch).float() - batch['label'].view(1, -1)) ** 2
+                for batch in loader
+            ]
+        return torch.cat(errors, dim=1).mean(dim=1).cpu()
+
+    @torch.no_grad()
+    def snapshot(self, best: dict, mask: torch.Tensor) -> dict:
+        """Keep a copy of the parameters of the replicas in `mask`."""
+        if best is None:
+            best = {k: v.detach().clone() for k, v in self.params.items()}
+        for k, v in self.params.items():
+            best[k][mask.to(v.device)] = v.detach()[mask.to(v.device)]
+        return best
+
+    @torch.no_grad()
+    def restore(self, best: dict):
+        for k, v in self.params.items():
+            v.copy_(best[k])
+
+    def collapsed(self, pred: torch.Tensor) -> torch.Tensor:
+        if self.tolerance is None:
+            return torch.zeros(
+                len(pred), dtype=torch.bool, device=pred.device)
+        return pred.detach().abs().amax(dim=1) < self.tolerance
+
+    @torch.no_grad()
+    def reset_replicas(self, mask: torch.Tensor, optimizer: optim.Optimizer):
+        for i in torch.nonzero(mask).view(-1).tolist():
+            fresh = copy.deepcopy(self.models[i])
+            reset_parameters(fresh)
+            for name, param in fresh.named_parameters():
+                self.params[name][i].copy_(param)
+                state = optimizer.state.get(self.params[name], {})
+                for key in ('exp_avg', 'exp_avg_sq'):
+                    if key in state:
+                        state[key][i].zero_()
+
+    def state_dict(self, index: int) -> dict:
+        """Parameters and buffers of a single replica."""
+        return {
+            **{k: v[index] for k, v in self.params.items()},
+            **{k: v[index] for k, v in self.buffers.items()},
+        }
+
+    @torch.no_grad()
+    def write_back(self):
+        """Copy the stacked parameters back into each replica."""
+        for i, model in enumerate(self.models):
+            model.load_state_dict(self.state_dict(i), strict=False)
+
+
+def autocast(precision: str, device_type: str = 'cpu'):
+    return torch.autocast(
+        device_type,
+        dtype=torch.bfloat16,
+        enabled=precision == 'bf16')
+
+
+def set_num_threads(num_threads: int = None,
+                    num_interop_threads: int = None):
+    if num_threads is not None and torch.get_num_threads() != num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads is not None \
+            and torch.get_num_interop_threads() != num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # Can only be set once and before any inter-op parallel work
+            print('Fail to set the number of inter-op threads to '
+                  f'{num_interop_threads}, keep '
+                  f'{torch.get_num_interop_threads()}.')
+
+
+class EarlyStopping:
+    """Track the best validation loss of `n` models trained side by side."""
+    def __init__(self, n: int, patience: int = None, min_delta: float = 0.):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = torch.full((n,), float('inf'))
+        self.best_epoch = torch.full((n,), -1, dtype=torch.long)
+        self.bad_epochs = torch.zeros(n, dtype=torch.long)
+
+    def update(self, loss: torch.Tensor, epoch: int) -> torch.Tensor:
+        """Record the losses of an epoch and return the improved models."""
+        improved = loss < self.best - self.min_delta
+        self.best[improved] = loss[improved]
+        self.best_epoch[improved] = epoch
+        self.bad_epochs[improved] = 0
+        self.bad_epochs[~improved] += 1
+        return improved
+
+    def should_stop(self) -> bool:
+        if self.patience is None:
+            return False
+        return bool((self.bad_epochs >= self.patience).all())
+
+
+def split_validation(data, valid_ratio: float, seed: int = 0):
+    """Carve a random validation subset out of the training data."""
+    num_valid = int(len(data) * valid_ratio)
+    if num_valid <= 0:
+        return data, None
+    generator = torch.Generator().manual_seed(seed)
+    indices = torch.randperm(len(data), generator=generator).tolist()
+    return Subset(data, indices[num_valid:]), Subset(data, indices[:num_valid])
+
+
+def build_lr_scheduler(optimizer: optim.Optimizer, config: dict = None):
+    if config is None:
+        return None
+    config = dict(config)
+    scheduler_cls = getattr(optim.lr_scheduler, config.pop('name'))
+    return scheduler_cls(optimizer, **config)
+
+
+def step_lr_scheduler(scheduler, monitor: float = None):
+    if scheduler is None:
+        return
+    if isinstance(scheduler, optim.lr_scheduler.ReduceLROnPlateau):
+        if monitor is not None:
+            scheduler.step(monitor)
+    else:
+        scheduler.step()
+
+
+def dump_training_summary(workspace, timestamp: str, seed: int, epoch: int,
+                          wall_time: float, stopper: EarlyStopping,
+                          index: int = 0):
+    """Record when and how the training stopped in the workspace."""
+    summary = {
+        'seed': seed,
+        'stop_epoch': epoch + 1,
+        'wall_time_in_s': wall_time,
+    }
+    if stopper.best_epoch[index] >= 0:
+        summary['best_epoch'] = int(stopper.best_epoch[index]) + 1
+        summary['best_valid_loss'] = float(stopper.best[index])
+    filename = workspace / f'train_summary_seed_{seed}_{timestamp}.json'
+    with open(filename, 'w') as f:
+        json.dump(summary, f, indent=4)
+
+
 def reset_parameters(model):
     @torch.no_grad()
     def weight_reset(m):
@@ -1,17 +1,29 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .cnn import CNNRULPredictor
-from .mlp import MLPRULPredictor
-from .pcr import PCRRULPredictor
-from .svm import SVMRULPredictor
-from .lstm import LSTMRULPredictor
-from .plsr import PLSRRULPredictor
-from .elastic_net import ElasticNetRULPredictor
-from .random_forest import RandomForestRULPredictor
-from .linear_regression import LinearRegressionRULPredictor
-from .dummy import DummyRULPredictor
-from .ridge import RidgeRULPredictor
-from .gaussian_process import GaussianProcessRULPredictor
-from .transformer import TransformerRULPredictor
-from .xgb import XGBoostRULPredictor
\ No newline at end of file
+from batteryml.builders import MODELS
+from batteryml.utils import lazy_exports
+
+# The predictors are only imported, with torch, sklearn or xgboost, when
+# they are first built or accessed
+_EXPORTS = {
+    'CNNRULPredictor': '.cnn',
+    'MLPRULPredictor': '.mlp',
+    'PCRRULPredictor': '.pcr',
+    'SVMRULPredictor': '.svm',
+    'LSTMRULPredictor': '.lstm',
+    'PLSRRULPredictor': '.plsr',
+    'ElasticNetRULPredictor': '.elastic_net',
+    'RandomForestRULPredictor': '.random_forest',
+    'LinearRegressionRULPredictor': '.linear_regression',
+    'DummyRULPredictor': '.dummy',
+    'RidgeRULPredictor': '.ridge',
+    'GaussianProcessRULPredictor': '.gaussian_process',
+    'SparseGaussianProcessRULPredictor': '.gaussian_process',
+    'TransformerRULPredictor': '.transformer',
+    'XGBoostRULPredictor': '.xgb',
+}
+for _name, _module in _EXPORTS.items():
+    MODELS.register_lazy(_name, _module, __name__)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
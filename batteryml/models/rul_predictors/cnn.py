@@ -50,15 +50,25 @@ class ConvModule(nn.Module):
         x = self.conv1(x)
         x = self.act_fn(x)
         x = self.pool1(x)
+        x = self.dropout(x)
         x = self.conv2(x)
         x = self.act_fn(x)
         x = self.pool2(x)
+        x = self.dropout(x)
 
         return x
 
 
 @MODELS.register()
 class CNNRULPredictor(NNModel):
+    """Two convolution blocks over the cycle-by-sample feature map.
+
+    The feature maps are dropped out with `dropout`, which also enables
+    the MC dropout prediction intervals. It is disabled by default to keep
+    the benchmark results.
+    """
+    collapse_tolerance = 1e-5
+
     def __init__(self,
                  in_channels: int,
                  channels: int,
@@ -66,6 +76,8 @@ class CNNRULPredictor(NNModel):
                  input_width: int,
                  kernel_size=3,
                  act_fn: str = 'relu',
+                 dropout: float = 0.,
+                 channels_last: bool = False,
                  **kwargs):
         NNModel.__init__(self, **kwargs)
         self.channels = channels
@@ -75,10 +87,14 @@ class CNNRULPredictor(NNModel):
             kernel_size = (input_height, kernel_size[1])
         if input_width < kernel_size[1]:
             kernel_size = (kernel_size[0], input_width)
-        self.encoder = ConvModule(in_channels, channels, kernel_size, act_fn)
+        self.encoder = ConvModule(
+            in_channels, channels, kernel_size, act_fn, dropout)
         H, W = self.encoder.output_shape(input_height, input_width)
         self.proj = nn.Conv2d(channels, channels, (H, W))
         self.fc = nn.Linear(channels, 1)
+        self.channels_last = channels_last
+        if channels_last:
+            nn.Module.to(self, memory_format=torch.channels_last)
 
     def forward(self,
                 feature: torch.Tensor,
@@ -86,6 +102,8 @@ class CNNRULPredictor(NNModel):
                 return_loss: bool = False):
         if feature.ndim == 3:
             feature = feature.unsqueeze(1)
+        if self.channels_last:
+            feature = feature.contiguous(memory_format=torch.channels_last)
         x = self.encoder(feature)
         x = self.proj(x)
         x = x.view(-1, self.channels)
@@ -93,7 +111,7 @@ class CNNRULPredictor(NNModel):
         x = self.fc(x).view(-1)
 
         if return_loss:
-            if (x.abs().max() < 1e-5):
+            if (x.abs().max() < self.collapse_tolerance):
                 return torch.inf
             return torch.mean((x - label.view(-1)) ** 2)  # L2 loss
 
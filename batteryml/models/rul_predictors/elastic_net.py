@@ -9,6 +9,10 @@ from batteryml.models.sklearn_model import SklearnModel
 
 @MODELS.register()
 class ElasticNetRULPredictor(SklearnModel):
-    def __init__(self, *args, workspace: str = None, **kwargs):
-        SklearnModel.__init__(self, workspace)
+    def __init__(self,
+                 *args,
+                 workspace: str = None,
+                 search: dict = None,
+                 **kwargs):
+        SklearnModel.__init__(self, workspace, search)
         self.model = ElasticNetCV(**kwargs)
@@ -1,8 +1,15 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
+import numpy as np
+
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.decomposition import PCA
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import RBF, DotProduct
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import BayesianRidge
+from sklearn.utils import check_random_state
 
 from batteryml.builders import MODELS
 from batteryml.models.sklearn_model import SklearnModel
@@ -10,7 +17,121 @@ from batteryml.models.sklearn_model import SklearnModel
 
 @MODELS.register()
 class GaussianProcessRULPredictor(SklearnModel):
-    def __init__(self, *args, workspace: str = None, **kwargs):
-        SklearnModel.__init__(self, workspace)
+    def __init__(self,
+                 *args,
+                 workspace: str = None,
+                 search: dict = None,
+                 **kwargs):
+        SklearnModel.__init__(self, workspace, search)
         kernel = DotProduct() + RBF()
         self.model = GaussianProcessRegressor(kernel)
+
+
+@MODELS.register()
+class SparseGaussianProcessRULPredictor(SklearnModel):
+    """Approximate GP with the `DotProduct() + RBF()` kernel of
+    `GaussianProcessRULPredictor`, which scales linearly with the number
+    of cells. See `SparseGaussianProcessRegressor` for the arguments."""
+    def __init__(self,
+                 *args,
+                 workspace: str = None,
+                 search: dict = None,
+                 **kwargs):
+        SklearnModel.__init__(self, workspace, search)
+        self.model = SparseGaussianProcessRegressor(*args, **kwargs)
+
+
+class SparseGaussianProcessRegressor(RegressorMixin, BaseEstimator):
+    """GP regression on an explicit low-rank feature map of the kernel.
+
+    The inputs are optionally projected by PCA, then mapped to the linear
+    features of the dot-product kernel concatenated with a low-rank map of
+    the RBF kernel, either Nystroem features on `n_inducing` inducing points
+    or random Fourier features. A Bayesian ridge regression on this map is
+    the GP posterior under the approximated kernel, whose noise and prior
+    precisions are fitted by maximizing the evidence as in an exact GP.
+    Fitting costs O(n m^2) for n cells and m features instead of O(n^3).
+
+    Args:
+        n_components (int): number of PCA components. `None` skips PCA.
+        n_inducing (int): number of inducing points or Fourier features.
+        approximation (str): `nystroem` or `rff`.
+        gamma (float or str): RBF kernel coefficient, `median` sets it
+            with the median heuristic on the training inputs.
+        linear (bool): include the dot-product kernel.
+        max_iter (int): maximum iterations of the evidence maximization.
+        random_state (int): seed of the PCA and the feature map.
+    """
+    def __init__(self,
+                 n_components: int = None,
+                 n_inducing: int = 256,
+                 approximation: str = 'nystroem',
+                 gamma='median',
+                 linear: bool = True,
+                 max_iter: int = 300,
+                 random_state: int = 0):
+        self.n_components = n_components
+        self.n_inducing = n_inducing
+        self.approximation = approximation
+        self.gamma = gamma
+        self.linear = linear
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(-1)
+        assert self.approximation in ['nystroem', 'rff'], self.approximation
+
+        self.pca_ = None
+        if self.n_components is not None:
+            n_components = min(self.n_components, *X.shape)
+            self.pca_ = PCA(n_components, svd_solver='randomized',
+                            random_state=self.random_state)
+            X = self.pca_.fit_transform(X)
+
+        gamma = self.gamma
+        if gamma == 'median':
+            gamma = median_heuristic_gamma(X, self.random_state)
+        if self.approximation == 'nystroem':
+            self.kernel_map_ = Nystroem(
+                gamma=gamma, n_components=min(self.n_inducing, len(X)),
+                random_state=self.random_state)
+        else:
+            self.kernel_map_ = RBFSampler(
+                gamma=gamma, n_components=self.n_inducing,
+                random_state=self.random_state)
+        self.kernel_map_.fit(X)
+
+        # Scale the linear features so that the dot-product kernel is of
+        # the same magnitude as the RBF kernel, which is 1 on the diagonal
+        self.linear_scale_ = 1. / max(
+            np.sqrt(np.mean(np.sum(X ** 2, axis=1))), 1e-12)
+
+        self.regressor_ = BayesianRidge(max_iter=self.max_iter)
+        self.regressor_.fit(self._feature_map(X, projected=True), y)
+        return self
+
+    def predict(self, X, return_std: bool = False):
+        phi = self._feature_map(np.asarray(X, dtype=np.float64))
+        return self.regressor_.predict(phi, return_std=return_std)
+
+    def _feature_map(self, X, projected: bool = False):
+        if self.pca_ is not None and not projected:
+            X = self.pca_.transform(X)
+        features = [self.kernel_map_.transform(X)]
+        if self.linear:
+            features.append(X * self.linear_scale_)
+        return np.concatenate(features, axis=1)
+
+
+def median_heuristic_gamma(X, random_state=None, max_samples: int = 1000):
+    """RBF coefficient from the median pairwise squared distance."""
+    rng = check_random_state(random_state)
+    if len(X) > max_samples:
+        X = X[rng.choice(len(X), max_samples, replace=False)]
+    sq_norm = np.sum(X ** 2, axis=1)
+    dist = sq_norm[:, None] + sq_norm[None, :] - 2 * X @ X.T
+    dist = dist[np.triu_indices(len(X), k=1)]
+    median = np.median(dist[dist > 0]) if np.any(dist > 0) else 1.
+    return 1. / median
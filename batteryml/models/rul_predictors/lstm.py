@@ -10,15 +10,27 @@ from batteryml.models.nn_model import NNModel
 
 @MODELS.register()
 class LSTMRULPredictor(NNModel):
+    """Two-layer LSTM over the cycles, predicting from the last state.
+
+    The last state is dropped out with `dropout`, which also enables the MC
+    dropout prediction intervals. It is disabled by default to keep the
+    benchmark results.
+    """
+    # There is no batching rule for `aten::lstm`, so the replicas of an
+    # ensemble are evaluated one after another.
+    vmap_compatible = False
+
     def __init__(self,
                  in_channels: int,
                  channels: int,
                  input_height: int,
                  input_width: int,
+                 dropout: float = 0.,
                  **kwargs):
         NNModel.__init__(self, **kwargs)
         self.lstm = nn.LSTM(
             in_channels * input_width, channels, 2, batch_first=True)
+        self.dropout = nn.Dropout(dropout)
         self.fc = nn.Linear(channels, 1)
 
     def forward(self,
@@ -31,6 +43,7 @@ class LSTMRULPredictor(NNModel):
         x = feature.permute(0, 2, 1, 3).contiguous().view(B, H, -1)
         x, _ = self.lstm(x)
         x = x[:, -1].contiguous().view(B, -1)
+        x = self.dropout(x)
         x = self.fc(x).view(-1)
 
         if return_loss:
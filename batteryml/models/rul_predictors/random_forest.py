@@ -1,14 +1,103 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
+import torch
+import numpy as np
+
+from scipy import sparse
 from sklearn.ensemble import RandomForestRegressor
 
 from batteryml.builders import MODELS
+from batteryml.data.databundle import DataBundle
 from batteryml.models.sklearn_model import SklearnModel
 
 
 @MODELS.register()
 class RandomForestRULPredictor(SklearnModel):
-    def __init__(self, *args, workspace: str = None, **kwargs):
-        SklearnModel.__init__(self, workspace)
+    def __init__(self,
+                 *args,
+                 workspace: str = None,
+                 search: dict = None,
+                 **kwargs):
+        SklearnModel.__init__(self, workspace, search)
         self.model = RandomForestRegressor(*args, **kwargs)
+
+    def after_fit(self, feature: np.ndarray, label: np.ndarray):
+        # Keep the leaves of the training cells in the fitted estimator, so
+        # that the quantiles are available after loading the checkpoint
+        self.model.train_leaves_ = self.model.apply(feature)
+        self.model.train_label_ = np.asarray(label).reshape(-1)
+
+    def predict_with_uncertainty(self,
+                                 dataset: DataBundle,
+                                 data_type: str = 'test',
+                                 alpha: float = 0.1):
+        """Intervals of a quantile regression forest (Meinshausen, 2006).
+
+        The conditional distribution of a label is the training labels
+        weighted by how often they share a leaf with the input, which is
+        obtained from the fitted trees without refitting.
+        """
+        if dataset.train_data.label.ndim > 1:
+            raise NotImplementedError(
+                'Quantile intervals of multiple targets are not supported.')
+        device = dataset.device
+        data = dataset.test_data if data_type == 'test' \
+            else dataset.train_data
+        feature = data.feature.cpu()
+        feature = feature.view(len(feature), -1).numpy()
+
+        prediction = torch.from_numpy(
+            np.asarray(self.model.predict(feature))).view(-1)
+        weights = self.leaf_weights(feature)
+        lower, upper = weighted_quantiles(
+            self.model.train_label_, weights, [alpha / 2, 1 - alpha / 2])
+        lower = torch.from_numpy(lower).to(prediction.dtype)
+        upper = torch.from_numpy(upper).to(prediction.dtype)
+        return prediction.to(device), lower.to(device), upper.to(device)
+
+    def leaf_weights(self, feature: np.ndarray) -> np.ndarray:
+        """Weights of the training labels for each input, of shape
+        (num_inputs, num_train)."""
+        assert hasattr(self.model, 'train_leaves_'), \
+            'Refit the model to predict quantiles.'
+        train_leaves = self.model.train_leaves_
+        leaves = self.model.apply(feature)
+        num_trees = train_leaves.shape[1]
+
+        # One-hot leaf indicators of all the trees side by side, so that the
+        # weights of all trees are accumulated in one sparse product
+        node_counts = [
+            tree.tree_.node_count for tree in self.model.estimators_]
+        offsets = np.cumsum([0] + node_counts[:-1])
+        num_nodes = sum(node_counts)
+        train_onehot = one_hot(train_leaves + offsets, num_nodes)
+        leaf_sizes = np.asarray(train_onehot.sum(axis=0)).reshape(-1)
+        leaves = leaves + offsets
+        onehot = one_hot(leaves, num_nodes)
+        onehot.data = 1. / (num_trees * np.maximum(
+            leaf_sizes[leaves.reshape(-1)], 1))
+        return (onehot @ train_onehot.T).toarray()
+
+
+def one_hot(leaves: np.ndarray, num_nodes: int) -> sparse.csr_matrix:
+    rows, cols = leaves.shape
+    return sparse.csr_matrix(
+        (np.ones(rows * cols), leaves.reshape(-1),
+         np.arange(0, rows * cols + 1, cols)),
+        shape=(rows, num_nodes))
+
+
+def weighted_quantiles(values: np.ndarray,
+                       weights: np.ndarray,
+                       quantiles: list) -> list:
+    """Quantiles of `values` under each row of `weights`."""
+    order = np.argsort(values)
+    values = values[order]
+    cdf = np.cumsum(weights[:, order], axis=1)
+    cdf /= cdf[:, -1:]
+    results = []
+    for q in quantiles:
+        index = np.minimum((cdf < q).sum(axis=1), len(values) - 1)
+        results.append(values[index])
+    return results
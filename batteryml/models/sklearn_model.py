@@ -2,24 +2,78 @@
 # Copyright (c) Microsoft Corporation.
 
 import abc
+import inspect
+import time
 import torch
 import pickle
+import numpy as np
+import pandas as pd
+import torch.nn as nn
+
+from scipy import stats
+from sklearn.decomposition import PCA
+from sklearn.model_selection import (
+    GridSearchCV, KFold, ParameterGrid, RandomizedSearchCV
+)
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
 
 from batteryml.data.databundle import DataBundle
+from batteryml.data.transformation.base import CHUNK_ELEMENTS
 
 from .base import BaseModel
 
 
 class SklearnModel(BaseModel, abc.ABC):
-    def fit(self, dataset: DataBundle, timestamp: str = None) -> None:
+    """Base class of the models backed by a scikit-learn estimator.
+
+    Args:
+        workspace (str): directory to save the checkpoints.
+        search (dict): optional hyperparameter search of `self.model`.
+            The best candidate found by cross validation on the training
+            data is refit on all of it. The keys are
+              - method: `grid`, `random`, `halving` or `halving_random`.
+              - params: candidates of each parameter of the estimator,
+                a list of values, or a distribution for the random
+                methods, e.g., `{dist: loguniform, low: 1e-3, high: 10}`.
+                Parameters of pipeline steps are prefixed with the step
+                name, e.g., `pca__n_components`.
+              - cv: number of folds, 5 by default.
+              - scoring: sklearn scorer, `neg_root_mean_squared_error` by
+                default. Note that the scores are computed on the
+                transformed labels.
+              - n_iter: number of candidates of `random`, 10 by default.
+              - n_jobs: number of parallel fits, all the CPUs by default.
+              - factor, min_resources, resource: budget of the successive
+                halving methods.
+    """
+    def __init__(self, workspace: str = None, search: dict = None):
+        BaseModel.__init__(self, workspace)
+        if search is not None:
+            assert search.get('method', 'grid') in SEARCH_METHODS, \
+                f'Unknown search method {search.get("method")}'
+        self.search = search
+
+    def fit(self,
+            dataset: DataBundle,
+            timestamp: str = None,
+            seed: int = 0) -> None:
         device = dataset.device
         dataset = dataset.to('cpu')
         feature = dataset.train_data.feature
-        feature = feature.view(len(feature), -1)
-        self.model.fit(feature, dataset.train_data.label.to('cpu'))
+        # sklearn used to upcast the tensors to float64, keep fitting in
+        # float64 with numpy arrays that joblib can memory-map
+        feature = feature.view(len(feature), -1).double().numpy()
+        label = dataset.train_data.label.to('cpu').double().numpy()
 
         timestamp = timestamp or 'UnknownTime'
 
+        if self.search is None:
+            self.model.fit(feature, label)
+        else:
+            self.model = self.search_fit(feature, label, seed, timestamp)
+        self.after_fit(feature, label)
+
         # Dump models
         if self.workspace is not None:
             filename = self.workspace / f'{timestamp}.ckpt'
@@ -28,6 +82,37 @@ class SklearnModel(BaseModel, abc.ABC):
 
         dataset = dataset.to(device)
 
+    def after_fit(self, feature: np.ndarray, label: np.ndarray):
+        """Hook to keep extra training states before dumping the model."""
+
+    def search_fit(self, feature, label, seed: int = 0, timestamp: str = None):
+        """Search the hyperparameters with cross validation.
+
+        The candidate fits run in joblib's worker processes, which share
+        the numpy feature matrix through joblib's default memory mapping of
+        large arrays instead of copying it to each worker. The fit/score time and the scores of every candidate are
+        saved to `search_results_seed_{seed}_{timestamp}.csv`.
+
+        Returns:
+            the best estimator refit on the whole training data.
+        """
+        search = build_search(self.model, self.search, seed)
+        start = time.perf_counter()
+        search.fit(feature, label)
+        elapsed = time.perf_counter() - start
+
+        results = pd.DataFrame(search.cv_results_)
+        n_candidates = len(results)
+        print(f'Searched {n_candidates} candidates in {elapsed:.1f}s, '
+              f'best {search.best_params_} with score '
+              f'{search.best_score_:.4f}')
+        if self.workspace is not None:
+            results['params'] = results['params'].map(str)
+            results.to_csv(
+                self.workspace / f'search_results_seed_{seed}_{timestamp}.csv',
+                index=False)
+        return search.best_estimator_
+
     def predict(self, dataset: DataBundle, data_type: str='test') -> torch.Tensor:
         device = dataset.device
         dataset = dataset.to('cpu')
@@ -38,10 +123,100 @@ class SklearnModel(BaseModel, abc.ABC):
         feature = feature.view(len(feature), -1)
         scores = self.model.predict(feature.numpy())
 
-        scores = torch.from_numpy(scores).to(device).view(-1)
+        scores = torch.from_numpy(np.asarray(scores)).to(device)
+        scores = self._as_label_shape(scores, dataset)
         dataset = dataset.to(device)
         return scores
 
+    def predict_with_std(self,
+                         dataset: DataBundle,
+                         data_type: str = 'test'):
+        """Predictive mean and standard deviation of the (transformed)
+        labels, for estimators supporting `predict(X, return_std=True)`
+        such as the Gaussian processes."""
+        device = dataset.device
+        data = dataset.test_data if data_type == 'test' \
+            else dataset.train_data
+        feature = data.feature.cpu()
+        feature = feature.view(len(feature), -1).numpy()
+        mean, std = self.model.predict(feature, return_std=True)
+        mean = torch.from_numpy(np.asarray(mean)).to(device)
+        std = torch.from_numpy(np.asarray(std)).to(device)
+        return (self._as_label_shape(mean, dataset),
+                self._as_label_shape(std, dataset))
+
+    @staticmethod
+    def _as_label_shape(scores: torch.Tensor,
+                        dataset: DataBundle) -> torch.Tensor:
+        # A vector for single-target labels, otherwise a row per cell
+        if dataset.train_data.label.ndim == 1:
+            return scores.view(-1)
+        return scores.view(len(scores), -1)
+
+    def predict_with_uncertainty(self,
+                                 dataset: DataBundle,
+                                 data_type: str = 'test',
+                                 alpha: float = 0.1):
+        """Gaussian intervals from the predictive standard deviation."""
+        if 'return_std' not in inspect.signature(
+                self.model.predict).parameters:
+            return BaseModel.predict_with_uncertainty(
+                self, dataset, data_type, alpha)
+        mean, std = self.predict_with_std(dataset, data_type)
+        z = float(stats.norm.ppf(1 - alpha / 2))
+        return mean, mean - z * std, mean + z * std
+
+    def export_module(self, feature: torch.Tensor) -> nn.Module:
+        """Export linear estimators, such as the linear regression, ridge,
+        elastic net, PCR and PLSR, as one affine map.
+
+        The weights are read from the fitted coefficients (see
+        `linear_parameters`), or else from the predictions of the estimator
+        on the origin and the unit vectors, probed in chunks of bounded
+        size. The map is checked against the predictions on `feature`,
+        other estimators raise `NotImplementedError`.
+        """
+        feature = feature.cpu()
+        feature = feature.view(len(feature), -1).double().numpy()
+        expected = np.asarray(self.model.predict(feature)).reshape(-1)
+        tolerance = 1e-6 * max(1., float(np.abs(expected).max()))
+
+        def matches(params) -> bool:
+            weight, bias = params
+            return len(weight) == feature.shape[1] and np.allclose(
+                feature @ weight + bias, expected,
+                rtol=1e-5, atol=tolerance)
+
+        params = linear_parameters(self.model)
+        if params is None or not matches(params):
+            params = self._probe_linear(feature.shape[1])
+            if not matches(params):
+                raise NotImplementedError(
+                    f'{type(self).__name__} is not linear in the features '
+                    'and can not be exported.')
+        weight, bias = params
+        return AffineModule(torch.from_numpy(weight), float(bias))
+
+    def _probe_linear(self, num_features: int) -> tuple:
+        """Weight and bias of the estimator if it is affine, from its
+        predictions on the origin and the unit vectors."""
+        def predict(probes):
+            outputs = np.asarray(self.model.predict(probes))
+            if outputs.ndim > 1 and outputs.shape[1] > 1:
+                raise NotImplementedError(
+                    'Exporting models of multiple targets is not supported.')
+            return outputs.reshape(-1)
+
+        bias = predict(np.zeros((1, num_features)))[0]
+        weight = np.empty(num_features)
+        rows = max(1, CHUNK_ELEMENTS // num_features)
+        for start in range(0, num_features, rows):
+            end = min(start + rows, num_features)
+            probes = np.zeros((end - start, num_features))
+            probes[np.arange(end - start), np.arange(start, end)] = 1.
+            weight[start:end] = predict(probes) - bias
+        return weight, bias
+
     def dump_checkpoint(self, path: str):
         with open(path, 'wb') as fout:
             pickle.dump(self.model, fout)
@@ -49,3 +224,104 @@ class SklearnModel(BaseModel, abc.ABC):
     def load_checkpoint(self, path: str):
         with open(path, 'rb') as fin:
             self.model = pickle.load(fin)
+
+
+def linear_parameters(estimator) -> tuple:
+    """Weight and bias of a single-target estimator with fitted `coef_`
+    and `intercept_`, optionally behind `StandardScaler` and `PCA` steps of
+    a pipeline, without probing the estimator. `None` if the estimator is
+    not of this form."""
+    steps = estimator.steps if isinstance(estimator, Pipeline) \
+        else [(None, estimator)]
+    *transforms, (_, final) = steps
+    coef = getattr(final, 'coef_', None)
+    intercept = getattr(final, 'intercept_', None)
+    if coef is None or intercept is None or np.size(intercept) != 1:
+        return None
+    weight = np.asarray(coef, dtype=float).reshape(-1)
+    bias = float(np.reshape(intercept, -1)[0])
+    for _, step in reversed(transforms):
+        if step is None or step == 'passthrough':
+            continue
+        if isinstance(step, StandardScaler):
+            if step.scale_ is not None:
+                weight = weight / step.scale_
+            if step.mean_ is not None:
+                bias -= float(step.mean_ @ weight)
+        elif isinstance(step, PCA):
+            if step.whiten:
+                weight = weight / np.sqrt(step.explained_variance_)
+            weight = step.components_.T @ weight
+            bias -= float(step.mean_ @ weight)
+        else:
+            return None
+    return weight, bias
+
+
+class AffineModule(nn.Module):
+    """Affine map of the flattened features, computed in float64 as the
+    fitted estimators."""
+    def __init__(self, weight: torch.Tensor, bias: float):
+        nn.Module.__init__(self)
+        self.register_buffer('weight', weight.double())
+        self.bias = bias
+
+    def forward(self, feature: torch.Tensor) -> torch.Tensor:
+        feature = feature.reshape(feature.shape[0], -1).double()
+        return (feature @ self.weight + self.bias).to(torch.float32)
+
+
+SEARCH_METHODS = ['grid', 'random', 'halving', 'halving_random']
+
+
+def build_search(estimator, search: dict, seed: int = 0):
+    search = dict(search)
+    method = search.pop('method', 'grid')
+    params = search.pop('params')
+    cv = search.pop('cv', 5)
+    if isinstance(cv, int):
+        cv = KFold(cv, shuffle=True, random_state=seed)
+    kwargs = dict(
+        cv=cv,
+        scoring=search.pop('scoring', 'neg_root_mean_squared_error'),
+        n_jobs=search.pop('n_jobs', -1),
+        refit=True,
+    )
+    if method in ['random', 'halving_random']:
+        params = {
+            key: build_distribution(val) for key, val in params.items()
+        }
+        kwargs['random_state'] = seed
+    else:
+        # Validate the grid early for a readable error
+        ParameterGrid(params)
+
+    if method == 'grid':
+        return GridSearchCV(estimator, params, **kwargs, **search)
+    if method == 'random':
+        return RandomizedSearchCV(estimator, params, **kwargs, **search)
+
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import (
+        HalvingGridSearchCV, HalvingRandomSearchCV
+    )
+    if method == 'halving':
+        return HalvingGridSearchCV(estimator, params, **kwargs, **search)
+    return HalvingRandomSearchCV(estimator, params, **kwargs, **search)
+
+
+def build_distribution(config):
+    """Build a scipy distribution from the config, lists are kept as is
+    and sampled uniformly."""
+    if not isinstance(config, dict):
+        return config
+    config = dict(config)
+    dist = config.pop('dist')
+    if dist in ['uniform', 'loguniform'] and 'high' in config:
+        low, high = config.pop('low'), config.pop('high')
+        if dist == 'uniform':
+            return stats.uniform(low, high - low)
+        return stats.loguniform(low, high)
+    if dist == 'randint':
+        return stats.randint(config.pop('low'), config.pop('high'))
+    return getattr(stats, dist)(**config)
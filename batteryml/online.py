@@ -0,0 +1,168 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Online inference on cells whose cycles arrive one at a time."""
+
+from __future__ import annotations
+
+import torch
+import threading
+
+from pathlib import Path
+from typing import Dict, List
+
+from batteryml.builders import FEATURE_EXTRACTORS, MODELS
+from batteryml.data import BatteryData, CycleData, DataBundle
+from batteryml.feature.base import BaseFeatureExtractor
+from batteryml.models.base import BaseModel
+from batteryml.utils import import_config
+
+
+class OnlineInferenceEngine:
+    """Keep per-cell feature states and re-score cells as cycles arrive.
+
+    Each new cycle only updates the state of its cell through the
+    incremental interface of the feature extractor (`init_state`,
+    `update_state` and `state_feature`), so the features are never
+    recomputed from the first cycle. Only the cells updated since their
+    last prediction are re-scored, in one batch.
+
+    Args:
+        feature_extractor (BaseFeatureExtractor): extractor of the model.
+        model (BaseModel): trained model.
+        feature_transformation: fitted feature transformation.
+        label_transformation: fitted label transformation.
+        device (str): device to run the model on.
+    """
+    def __init__(self,
+                 feature_extractor: BaseFeatureExtractor,
+                 model: BaseModel,
+                 feature_transformation=None,
+                 label_transformation=None,
+                 device: str = 'cpu'):
+        self.feature_extractor = feature_extractor
+        self.model = model
+        self.feature_transformation = feature_transformation
+        self.label_transformation = label_transformation
+        self.device = device
+        self.states = {}
+        self.predictions = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_workspace(cls,
+                       config_path: str,
+                       workspace: str,
+                       ckpt_to_resume: str = None,
+                       device: str = 'cpu') -> OnlineInferenceEngine:
+        """Load the engine from the config and workspace of a trained run.
+
+        The fitted transformations are read from `transformations.pkl` in
+        the workspace, which is written by `Pipeline.train`. For older
+        workspaces they are fitted again from the training data.
+        """
+        from batteryml.pipeline import (
+            CONFIG_FIELDS, build_dataset, load_transformations
+        )
+
+        configs = import_config(Path(config_path), CONFIG_FIELDS)
+        feature_extractor = FEATURE_EXTRACTORS.build(configs['feature'])
+        model = MODELS.build(configs['model'])
+        model.workspace = None
+        model.load_checkpoint(
+            ckpt_to_resume or Path(workspace) / 'latest.ckpt')
+        model = model.to(device)
+
+        transformations = load_transformations(workspace)
+        if transformations is None:
+            print(f'No transformations found in {workspace}, '
+                  'fit them on the training data.')
+            dataset, _ = build_dataset(configs, 'cpu')
+            transformations = {
+                'feature_transformation': dataset.feature_transformation,
+                'label_transformation': dataset.label_transformation,
+            }
+        return cls(feature_extractor, model, device=device, **{
+            key: val if val is None else val.to(device)
+            for key, val in transformations.items()
+        })
+
+    def add_cell(self, cell_data: BatteryData):
+        """Register a cell and consume the cycles it already has."""
+        with self._lock:
+            state = self.feature_extractor.init_state(cell_data)
+            self.states[cell_data.cell_id] = state
+            self._dirty.add(cell_data.cell_id)
+            for cycle_data in cell_data.cycle_data or []:
+                self.feature_extractor.update_state(state, cycle_data)
+
+    def add_cycle(self, cell_id: str, cycle_data: CycleData):
+        """Append the next cycle of a registered cell."""
+        with self._lock:
+            assert cell_id in self.states, f'Unknown cell {cell_id}'
+            self.feature_extractor.update_state(
+                self.states[cell_id], cycle_data)
+            self._dirty.add(cell_id)
+
+    def remove_cell(self, cell_id: str):
+        with self._lock:
+            self.states.pop(cell_id, None)
+            self.predictions.pop(cell_id, None)
+            self._dirty.discard(cell_id)
+
+    def update(self, cell_id: str, cycle_data: CycleData) -> dict:
+        """Append a cycle and return the updated prediction of the cell."""
+        with self._lock:
+            self.add_cycle(cell_id, cycle_data)
+            return self.predict([cell_id])[cell_id]
+
+    def predict(self, cell_ids: List[str] = None) -> Dict[str, dict]:
+        """Predictions of the cells, re-scoring the updated ones.
+
+        Returns:
+            a dict from cell id to the `prediction` (in the label scale,
+            `None` before the feature is available), the number of cycles
+            seen `num_cycles`, and `ready`, whether all the cycles used by
+            the feature have arrived.
+        """
+        with self._lock:
+            cell_ids = list(self.states) if cell_ids is None else cell_ids
+            to_score, features = [], []
+            for cell_id in cell_ids:
+                if cell_id not in self._dirty:
+                    continue
+                self._dirty.discard(cell_id)
+                feature = self.feature_extractor.state_feature(
+                    self.states[cell_id])
+                if feature is None:
+                    self.predictions[cell_id] = None
+                else:
+                    to_score.append(cell_id)
+                    features.append(feature)
+            if features:
+                scores = self.score(torch.stack(features))
+                for cell_id, score in zip(to_score, scores.tolist()):
+                    self.predictions[cell_id] = score
+
+            return {
+                cell_id: {
+                    'prediction': self.predictions[cell_id],
+                    'num_cycles': self.states[cell_id]['num_cycles'],
+                    'ready': self.feature_extractor.is_ready(
+                        self.states[cell_id]),
+                } for cell_id in cell_ids
+            }
+
+    @torch.no_grad()
+    def score(self, feature: torch.Tensor) -> torch.Tensor:
+        """Predict the labels of a batch of raw features."""
+        feature = feature.float().to(self.device)
+        label = torch.zeros(len(feature), device=self.device)
+        dataset = DataBundle(
+            feature[:0], label[:0], feature, label,
+            feature_transformation=self.feature_transformation,
+            label_transformation=self.label_transformation,
+            fit_transformations=False)
+        prediction = self.model.predict(dataset)
+        return dataset.inverse_transform_label(prediction).float().cpu()
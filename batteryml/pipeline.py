@@ -4,28 +4,46 @@
 from __future__ import annotations
 
 import os
+import copy
+import json
 import torch
 import pickle
 import random
 import shutil
 import hashlib
+import multiprocessing
 import numpy as np
 
+from tqdm import tqdm
+from torch.utils.data import DataLoader
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-from batteryml.task import Task
-from batteryml.data import DataBundle
+from batteryml.task import Task, build_transformation
+from batteryml.data import BatteryData, DataBundle
+from batteryml.evaluation import Evaluator, print_report
+from batteryml.data.window import WindowDataset
+from batteryml.results import RESULTS_DB, ResultsStore
 from batteryml.builders import MODELS
 from batteryml.utils import import_config
 from batteryml.models.base import BaseModel
+from batteryml.models.nn_model import NNModel
+from batteryml.models.ensemble import EnsembleModel
+
+
+CACHE_DIR = Path('cache')
 
 
 class Pipeline:
-    def __init__(self, config_path: Path | str, workspace: Path | str):
+    def __init__(self,
+                 config_path: Path | str,
+                 workspace: Path | str,
+                 results_db: Path | str | None = RESULTS_DB):
 
         self.config_path = config_path
         self.config = load_config(config_path, workspace)
+        self.results_db = results_db
 
     def train(self,
               seed: int = 0,
@@ -65,7 +83,9 @@ class Pipeline:
                 self.config_path,
                 model.workspace / f'config_{ts}.yaml')
 
-        model.fit(dataset, timestamp=ts)
+        model.fit(dataset, timestamp=ts, seed=seed)
+        if model.workspace is not None:
+            dump_transformations(dataset, model.workspace)
 
         # Restore the origianl epochs in config
         if epochs is not None:
@@ -74,6 +94,78 @@ class Pipeline:
 
         return model, dataset
 
+    def train_ensemble(self,
+                       seeds: list,
+                       epochs: int | None = None,
+                       device: torch.device | str = 'cpu',
+                       skip_if_executed: bool = True,
+                       dataset: DataBundle | None = None):
+        """Train one replica per seed in a single process.
+
+        Neural network replicas are trained jointly with batched parameters
+        (see `NNModel.fit_ensemble`), other models fall back to sequential
+        training. Checkpoints are written per seed in the same layout as
+        `train`.
+
+        Returns:
+            the trained models (ordered as the remaining seeds), the seeds
+            that were actually trained and the dataset.
+        """
+        if skip_if_executed and self.config['workspace'] is not None:
+            executed = [
+                seed for seed in seeds
+                if any(Path(self.config['workspace'])
+                       .glob(f'*seed_{seed}_*.ckpt'))
+            ]
+            if executed:
+                print(f'Skip training seeds {executed} for '
+                      f'{self.config["workspace"]} as the checkpoints '
+                      'already exist.')
+            seeds = [seed for seed in seeds if seed not in executed]
+        if not seeds:
+            return [], [], dataset
+
+        if dataset is None:
+            dataset, raw_data = build_dataset(self.config, device)
+            self.raw_data = raw_data
+
+        model_cls = MODELS.get(self.config['model']['name'])
+        if not issubclass(model_cls, NNModel):
+            models = [
+                self.train(seed, epochs, device,
+                           skip_if_executed=False, dataset=dataset)[0]
+                for seed in seeds
+            ]
+            return models, seeds, dataset
+
+        if epochs is not None:
+            original_epochs = self.config['model'].get('epochs')
+            self.config['model']['epochs'] = epochs
+
+        models = []
+        for seed in seeds:
+            # Replicas are initialized exactly as in a single-seed run
+            set_seed(seed)
+            model = MODELS.build(self.config['model'])
+            if model.workspace is None:
+                model.workspace = self.config['workspace']
+            models.append(model.to(device))
+        ts = timestamp()
+
+        if models[0].workspace is not None:
+            shutil.copyfile(
+                self.config_path,
+                models[0].workspace / f'config_{ts}.yaml')
+
+        NNModel.fit_ensemble(models, dataset, timestamp=ts, seeds=seeds)
+        if models[0].workspace is not None:
+            dump_transformations(dataset, models[0].workspace)
+
+        if epochs is not None:
+            self.config['model']['epochs'] = original_epochs
+
+        return models, seeds, dataset
+
     def evaluate(self,
                  seed: int = 0,
                  device: torch.device | str = 'cpu',
@@ -81,7 +173,23 @@ class Pipeline:
                  model: BaseModel | None = None,
                  dataset: DataBundle | None = None,
                  ckpt_to_resume: str | None = None,
-                 skip_if_executed: bool = True):
+                 skip_if_executed: bool = True,
+                 alpha: float = 0.1,
+                 group_by: str | None = None,
+                 bootstrap: int = 0,
+                 confidence: float = 0.95):
+        """Evaluate the model on the test data.
+
+        Interval metrics (see `INTERVAL_METRICS`) score the `1 - alpha`
+        prediction intervals of `model.predict_with_uncertainty`, and are
+        NaN for the models that do not support intervals.
+
+        With `group_by` (`dataset`, `chemistry`, `protocol` or `cell`) the
+        scores of each group of test cells, and with `bootstrap` resamples
+        the `confidence` intervals of the scores, are also printed and
+        saved to `evaluation_seed_{seed}_{timestamp}.json`, see
+        `Evaluator`.
+        """
         set_seed(seed)
 
         if skip_if_executed and (
@@ -97,44 +205,224 @@ class Pipeline:
             dataset, raw_data = build_dataset(self.config, device)
             self.raw_data = raw_data
         if model is None:
-            model = self._prepare_model(ckpt_to_resume, device)
-
-        prediction = model.predict(dataset)
+            model = self._prepare_model(
+                ckpt_to_resume, device, test_data=dataset.test_data)
 
         if isinstance(metric, str):
             metric = [metric]
 
-        scores = {
-            m: dataset.evaluate(prediction, m) for m in metric
-        }
+        evaluator = Evaluator(
+            metric, group_by=group_by, bootstrap=bootstrap,
+            confidence=confidence, seed=seed)
+        prediction, interval, report = self._predict_and_score(
+            model, dataset, metric, alpha, evaluator, self._test_cells())
+        scores = report['scores']
         print(scores)
+        print_report(report)
         ts = timestamp()
 
-        if self.config['workspace'] is not None:
-            obj = {
-                'prediction': prediction,
-                'scores': scores,
-                'data': dataset.to('cpu'),
-                'seed': seed,
+        self._dump_predictions(
+            f'predictions_seed_{seed}_{ts}.pkl',
+            prediction, interval, scores, dataset, seed=seed)
+        if len(report) > 1 and self.config['workspace'] is not None:
+            path = Path(self.config['workspace']) / \
+                f'evaluation_seed_{seed}_{ts}.json'
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=4)
+
+        if self.results_db is not None:
+            ResultsStore(self.results_db).add_run(
+                config=self.config_path,
+                seed=seed,
+                scores=scores,
+                timestamp=ts,
+                workspace=self.config['workspace'],
+                model=self.config['model']['name'],
+                dataset_hash=dataset_hash(self.config),
+                cell_ids=dataset.test_data.example_ids,
+                prediction=dataset.inverse_transform_label(prediction).cpu(),
+                target=dataset.inverse_transform_label(
+                    dataset.test_data.label).cpu())
+
+        return scores
+
+    def evaluate_ensemble(self,
+                          models: list,
+                          seeds: list,
+                          dataset: DataBundle,
+                          metric: list | str = 'RMSE',
+                          alpha: float = 0.1):
+        """Evaluate the mean of the models trained with different seeds,
+        with prediction intervals from the spread of their predictions."""
+        if isinstance(metric, str):
+            metric = [metric]
+        model = EnsembleModel(models, seeds)
+        prediction, interval, report = self._predict_and_score(
+            model, dataset, metric, alpha)
+        scores = report['scores']
+        print(f'Ensemble of seeds {seeds}: {scores}')
+        self._dump_predictions(
+            f'predictions_ensemble_{timestamp()}.pkl',
+            prediction, interval, scores, dataset, seeds=seeds)
+        return scores
+
+    def cross_validate(self,
+                       seed: int = 0,
+                       device: torch.device | str = 'cpu',
+                       metric: list | str = 'RMSE',
+                       workers: int = 1,
+                       alpha: float = 0.1) -> dict:
+        """Train and evaluate the model on every fold of a cross validation
+        splitter, e.g., `GroupKFoldTrainTestSplitter`.
+
+        The features and labels of all cells are extracted once, see
+        `build_cv_dataset`, and each fold selects its train and test
+        examples by indices. The folds run in `workers` processes, which
+        share the extracted tensors instead of copying them, and each fold
+        is trained in `<workspace>/fold_<k>`. The scores of the folds and
+        their mean and std are saved to `cv_results_seed_{seed}.json`.
+        """
+        if isinstance(metric, str):
+            metric = [metric]
+        data, folds = build_cv_dataset(self.config)
+        config = copy.deepcopy(self.config)
+        jobs = [
+            (fold, train_index, test_index, seed, device, metric, alpha)
+            for fold, (train_index, test_index) in enumerate(folds)
+        ]
+
+        workers = max(1, min(workers, len(jobs)))
+        if workers == 1:
+            init_fold_worker(config, data)
+            results = [run_fold(*job) for job in jobs]
+        else:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # The tensors are moved to shared memory when sent to workers
+            data = {
+                key: val.share_memory_() if torch.is_tensor(val) else val
+                for key, val in data.items()
             }
-            filename = f'predictions_seed_{seed}_{ts}.pkl'
-            with open(Path(self.config['workspace']) / filename, 'wb') as f:
-                pickle.dump(obj, f)
+            executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_fold_worker,
+                initargs=(config, data, threads))
+            with executor:
+                results = list(executor.map(run_fold, *zip(*jobs)))
+
+        summary = {}
+        for m in metric:
+            values = np.array([scores[m] for scores in results], dtype=float)
+            summary[m] = {
+                'mean': float(values.mean()), 'std': float(values.std())}
+        for fold, scores in enumerate(results):
+            print(f'Fold {fold}: {scores}')
+        print('Cross validation over {} folds: {}'.format(len(results), {
+            m: f'{s["mean"]:.4f} ± {s["std"]:.4f}' for m, s in summary.items()
+        }))
+
+        output = {'folds': results, 'summary': summary}
+        if self.config['workspace'] is not None:
+            path = Path(self.config['workspace']) / \
+                f'cv_results_seed_{seed}.json'
+            with open(path, 'w') as f:
+                json.dump(output, f, indent=4)
+        return output
+
+    @staticmethod
+    def _predict_and_score(model: BaseModel,
+                           dataset: DataBundle,
+                           metric: list,
+                           alpha: float = 0.1,
+                           evaluator: Evaluator | None = None,
+                           cells: dict | None = None):
+        """Predict the test data and score the predictions.
+
+        Returns:
+            the predictions, the prediction intervals if required by the
+            metrics, and the report of `Evaluator`, whose `scores` are the
+            score of each metric.
+        """
+        evaluator = evaluator or Evaluator(metric)
+        interval = None
+        if evaluator.needs_interval:
+            try:
+                prediction, *interval = model.predict_with_uncertainty(
+                    dataset, alpha=alpha)
+            except NotImplementedError as e:
+                print(f'{e} Interval metrics are set to NaN.')
+        if interval is None:
+            prediction = model.predict(dataset)
+
+        report = evaluator(dataset, prediction, interval, cells=cells)
+        return prediction, interval, report
+
+    def _test_cells(self) -> dict:
+        """`BatteryData` of the test cells by id, if loaded."""
+        raw_data = getattr(self, 'raw_data', None) or {}
+        return {
+            cell.cell_id: cell for cell in raw_data.get('test_cells') or []}
+
+    def _dump_predictions(self,
+                          filename: str,
+                          prediction: torch.Tensor,
+                          interval: list | None,
+                          scores: dict,
+                          dataset: DataBundle,
+                          **kwargs):
+        if self.config['workspace'] is None:
+            return
+        label_transformation = dataset.label_transformation
+        if label_transformation is not None:
+            label_transformation = copy.deepcopy(label_transformation)
+            label_transformation = label_transformation.to('cpu')
+        # Keep the labels and the label transformation only, a copy of the
+        # whole dataset is not needed to interpret the predictions
+        obj = {
+            'prediction': prediction.cpu(),
+            'label': dataset.test_data.label.cpu(),
+            'label_transformation': label_transformation,
+            'cell_ids': getattr(dataset.test_data, 'cell_ids', None),
+            'cycle_indices': getattr(dataset.test_data, 'cycle_indices', None),
+            'scores': scores,
+            **kwargs,
+        }
+        if interval is not None:
+            obj['lower'], obj['upper'] = [x.cpu() for x in interval]
+        with open(Path(self.config['workspace']) / filename, 'wb') as f:
+            pickle.dump(obj, f)
 
     def _prepare_model(self,
                        ckpt_to_resume: str | None = None,
-                       device: torch.device | None = 'cpu'
-                       ) -> BaseModel:
+                       device: torch.device | None = 'cpu',
+                       test_data=None) -> BaseModel:
+        """Build the model of the config.
+
+        Args:
+            test_data: data to predict in an evaluation-only run, for which
+                a compiled model is compiled ahead of time into a package in
+                the workspace, see `NNModel.compile_ahead`.
+        """
         model = MODELS.build(self.config['model'])
         if model.workspace is None:
             model.workspace = self.config['workspace']
         if ckpt_to_resume is not None:
             model.load_checkpoint(ckpt_to_resume)
-
-        if torch.__version__ >= '2' and isinstance(model, torch.nn.Module):
-            model = torch.compile(model)
-
         model = model.to(device)
+
+        compile_options = getattr(model, 'compile_options', None)
+        if compile_options is not None and isinstance(model, torch.nn.Module):
+            feature = None
+            if test_data is not None and len(test_data) > 0 \
+                    and model.workspace is not None:
+                feature = next(iter(DataLoader(
+                    test_data, model.test_batch_size)))['feature']
+            if feature is None or not model.compile_ahead(
+                    compiled_package_path(
+                        model.workspace, self.config['model'], feature),
+                    feature):
+                # Compile in place to keep the model interface and the
+                # checkpoint keys unchanged
+                model.compile(**compile_options)
         return model
 
 
@@ -179,18 +467,154 @@ def load_config(config_path: str,
     return configs
 
 
-def build_dataset(configs: dict,
-                  device: str,
-                  config_fields: list | None = None):
+# Extracted data of the cross validation in a fold worker
+_FOLD_DATA = {}
+
+
+def build_cv_dataset(configs: dict):
+    """Extract the features and labels of all cells of the folds once.
+
+    Returns:
+        the features, labels, cell ids and cycle indices of the examples,
+        and the indices of the train and test examples of each fold.
+    """
+    # The transformations are fitted per fold
+    filename = dataset_hash(configs, ['train_test_split', 'feature', 'label'])
+    if not CACHE_DIR.exists():
+        CACHE_DIR.mkdir()
+    cache_file = Path(CACHE_DIR / f'cv_cache_{filename}.pkl')
+    if cache_file.exists():
+        print(f'Load cross validation data from cache {str(cache_file)}.')
+        with open(cache_file, 'rb') as f:
+            cache = pickle.load(f)
+        return cache['data'], cache['folds']
+
+    task = Task(
+        label_annotator=configs['label'],
+        feature_extractor=configs['feature'],
+        train_test_splitter=configs['train_test_split'])
+    splitter = task.train_test_splitter
+    if hasattr(splitter, 'folds'):
+        file_folds = splitter.folds()
+    else:
+        file_folds = [splitter.split()]
+    paths = list(dict.fromkeys(
+        str(path) for fold in file_folds for part in fold for path in part))
+    cells = [
+        BatteryData.load(path) for path in tqdm(paths, desc='Reading data')]
+
+    extracted = task.extract(cells)
+    assert not isinstance(extracted, WindowDataset), \
+        'Cross validation of lazily generated windows is not supported'
+    features, labels, cell_ids, cycles = extracted
+    data = {
+        'features': features.float(),
+        'labels': labels.float(),
+        'cell_ids': cell_ids,
+        'cycle_indices': cycles,
+    }
+
+    # Folds select the examples of their cells
+    cell_index = {cell.cell_id: i for i, cell in enumerate(cells)}
+    path_index = {path: i for i, path in enumerate(paths)}
+    example_cells = torch.tensor(
+        [cell_index[cell_id] for cell_id in cell_ids], dtype=torch.long)
+    folds = []
+    for fold in file_folds:
+        folds.append(tuple(
+            torch.nonzero(torch.isin(example_cells, torch.tensor(
+                [path_index[str(path)] for path in part],
+                dtype=torch.long))).view(-1)
+            for part in fold
+        ))
+
+    with open(cache_file, 'wb') as f:
+        pickle.dump({'data': data, 'folds': folds}, f)
+    return data, folds
+
+
+def init_fold_worker(config: dict, data: dict, threads: int | None = None):
+    if threads is not None:
+        torch.set_num_threads(threads)
+    _FOLD_DATA.update(config=config, data=data)
+
+
+def row_views(data: torch.Tensor, index: torch.Tensor) -> list:
+    """Views of the runs of consecutive rows of `data` at `index`, e.g.,
+    the examples of the cells of a fold, instead of a copy of the rows."""
+    if len(index) == 0:
+        return [data[:0]]
+    breaks = torch.nonzero(index[1:] != index[:-1] + 1).view(-1) + 1
+    starts = torch.cat([index[:1], index[breaks]])
+    ends = torch.cat([index[breaks - 1], index[-1:]]) + 1
+    return [data[start:end]
+            for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+def run_fold(fold: int,
+             train_index: torch.Tensor,
+             test_index: torch.Tensor,
+             seed: int,
+             device: str,
+             metric: list,
+             alpha: float = 0.1) -> dict:
+    """Train and evaluate a fold of the cross validation, return the
+    scores."""
+    config, data = _FOLD_DATA['config'], _FOLD_DATA['data']
+    set_seed(seed)
+    feature_transformation, lazy = build_transformation(
+        config['feature_transformation'])
+    label_transformation, _ = build_transformation(
+        config['label_transformation'])
+    features, labels = data['features'], data['labels']
+    cell_ids, cycles = data['cell_ids'], data['cycle_indices']
+    # The features of the folds are views of the shared features, which
+    # are transformed into new chunks or per batch when lazy
+    dataset = DataBundle(
+        row_views(features, train_index), labels[train_index],
+        row_views(features, test_index), labels[test_index],
+        feature_transformation=feature_transformation,
+        label_transformation=label_transformation,
+        train_cell_ids=[cell_ids[i] for i in train_index.tolist()],
+        test_cell_ids=[cell_ids[i] for i in test_index.tolist()],
+        train_cycle_indices=None if cycles is None else cycles[train_index],
+        test_cycle_indices=None if cycles is None else cycles[test_index],
+        lazy_feature_transformation=lazy
+    ).to(device)
+
+    model = MODELS.build(config['model'])
+    if config['workspace'] is not None:
+        model.workspace = Path(config['workspace']) / f'fold_{fold}'
+        model.workspace.mkdir(parents=True, exist_ok=True)
+        dump_transformations(dataset, model.workspace)
+    model = model.to(device)
+    model.fit(dataset, timestamp=timestamp(), seed=seed)
+    _, _, report = Pipeline._predict_and_score(model, dataset, metric, alpha)
+    return report['scores']
+
+
+def dataset_hash(configs: dict, config_fields: list | None = None) -> str:
+    """Hash of the config fields that determine the built dataset."""
     strings = []
     config_fields = config_fields or CONFIG_FIELDS[1:]
     for field in config_fields:
         strings.append(recursive_dump_string(configs[field]))
-    filename = hash_string('+'.join(strings))
-    cache_dir = Path('cache')
-    if not cache_dir.exists():
-        cache_dir.mkdir()
-    cache_file = Path(cache_dir / f'battery_cache_{filename}.pkl')
+    return hash_string('+'.join(strings))
+
+
+def dataset_cache_file(configs: dict,
+                       config_fields: list | None = None) -> Path:
+    """Cache file of the dataset built by `build_dataset`."""
+    filename = dataset_hash(configs, config_fields)
+    return Path(CACHE_DIR / f'battery_cache_{filename}.pkl')
+
+
+def build_dataset(configs: dict,
+                  device: str,
+                  config_fields: list | None = None):
+    if not CACHE_DIR.exists():
+        CACHE_DIR.mkdir()
+    cache_file = dataset_cache_file(configs, config_fields)
 
     if cache_file.exists():
         print(f'Load datasets from cache {str(cache_file)}.')
@@ -198,6 +622,7 @@ def build_dataset(configs: dict,
             data = pickle.load(f)
             dataset = data['dataset']
             raw_data = data['raw_data']
+        fill_cell_ids(dataset, raw_data)
     else:
         task = Task(
             label_annotator=configs['label'],
@@ -221,6 +646,64 @@ def build_dataset(configs: dict,
     return dataset.to(device), raw_data
 
 
+TRANSFORMATIONS_FILE = 'transformations.pkl'
+
+
+def dump_transformations(dataset: DataBundle, workspace: Path | str):
+    """Save the fitted transformations for inference without the
+    training data."""
+    transformations = {}
+    for key in ['feature_transformation', 'label_transformation']:
+        transformation = getattr(dataset, key)
+        if transformation is not None:
+            transformation = copy.deepcopy(transformation).to('cpu')
+        transformations[key] = transformation
+    with open(Path(workspace) / TRANSFORMATIONS_FILE, 'wb') as f:
+        pickle.dump(transformations, f)
+
+
+def load_transformations(workspace: Path | str) -> dict | None:
+    path = Path(workspace) / TRANSFORMATIONS_FILE
+    if not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def fill_cell_ids(dataset: DataBundle, raw_data: dict):
+    """Recover the cell ids of datasets cached before they were tracked."""
+    for split in ['train', 'test']:
+        data = getattr(dataset, f'{split}_data')
+        cells = raw_data[f'{split}_cells']
+        if getattr(data, 'cell_ids', None) is None and \
+                len(cells) == len(data):
+            data.cell_ids = [cell.cell_id for cell in cells]
+
+
+def compiled_package_path(workspace: Path | str,
+                          model_config: dict,
+                          feature: torch.Tensor) -> Path:
+    """Package of a model compiled ahead of time for the shape of `feature`.
+
+    The weights and the fields that do not change the compiled graph, such
+    as the number of epochs, are left out of the key, so that all seeds and
+    checkpoints of a config share the same package.
+    """
+    fields = {
+        key: val for key, val in model_config.items()
+        if key not in ['workspace', 'epochs', 'evaluate_freq',
+                       'checkpoint_freq']
+    }
+    key = hash_string('+'.join([
+        recursive_dump_string(fields),
+        str(tuple(feature.shape[1:])),
+        str(feature.dtype),
+        str(feature.device),
+        torch.__version__
+    ]))
+    return Path(workspace) / f'compiled_{key}.pt2'
+
+
 def set_seed(seed: int):
     print(f'Seed is set to {seed}.')
     random.seed(seed)
@@ -1,18 +1,26 @@
-import logging
-from .download import DOWNLOAD_LINKS, download_file
-from .preprocess_CALCE import CALCEPreprocessor
-from .preprocess_HNEI import HNEIPreprocessor
-from .preprocess_HUST import HUSTPreprocessor
-from .preprocess_MATR import MATRPreprocessor
-from .preprocess_OX import OXPreprocessor
-from .preprocess_RWTH import RWTHPreprocessor
-from .preprocess_SNL import SNLPreprocessor
-from .preprocess_UL_PUR import UL_PURPreprocessor
-from .preprocess_arbin import ARBINPreprocessor
-from .preprocess_neware import NEWAREPreprocessor
+from batteryml.builders import PREPROCESSORS
+from batteryml.utils import lazy_exports
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+_PREPROCESSORS = {
+    'CALCEPreprocessor': '.preprocess_CALCE',
+    'HNEIPreprocessor': '.preprocess_HNEI',
+    'HUSTPreprocessor': '.preprocess_HUST',
+    'MATRPreprocessor': '.preprocess_MATR',
+    'OXPreprocessor': '.preprocess_OX',
+    'RWTHPreprocessor': '.preprocess_RWTH',
+    'SNLPreprocessor': '.preprocess_SNL',
+    'UL_PURPreprocessor': '.preprocess_UL_PUR',
+    'ARBINPreprocessor': '.preprocess_arbin',
+    'NEWAREPreprocessor': '.preprocess_neware',
+}
+for _name, _module in _PREPROCESSORS.items():
+    PREPROCESSORS.register_lazy(_name, _module, __name__)
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'DOWNLOAD_LINKS': '.download',
+    'download_file': '.download',
+    **_PREPROCESSORS,
+})
 
 SUPPORTED_SOURCES = {
     'DATASETS': ['CALCE', 'HNEI', 'HUST', 'MATR', 'OX', 'RWTH', 'SNL', 'UL_PUR'],
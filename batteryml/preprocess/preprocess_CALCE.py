@@ -9,7 +9,6 @@ import numpy as np
 import pandas as pd
 
 from tqdm import tqdm
-from numba import njit
 from typing import List
 from pathlib import Path
 from scipy.signal import medfilt
@@ -17,6 +16,7 @@ from scipy.signal import medfilt
 from batteryml import BatteryData, CycleData
 from batteryml.builders import PREPROCESSORS
 from batteryml.preprocess.base import BasePreprocessor
+from batteryml.utils.kernels import calc_Q, organize_cycle_index
 
 
 @PREPROCESSORS.register()
@@ -125,30 +125,6 @@ class CALCEPreprocessor(BasePreprocessor):
         return process_batteries_num, skip_batteries_num
 
 
-@njit
-def calc_Q(I, t, is_charge):  # noqa
-    Q = np.zeros_like(I)
-    for i in range(1, len(I)):
-        if is_charge and I[i] > 0:
-            Q[i] = Q[i-1] + I[i] * (t[i] - t[i-1]) / 3600
-        elif not is_charge and I[i] < 0:
-            Q[i] = Q[i-1] - I[i] * (t[i] - t[i-1]) / 3600
-        else:
-            Q[i] = Q[i-1]
-    return Q
-
-
-@njit
-def organize_cycle_index(cycle_index):
-    current_cycle, prev_value = cycle_index[0], cycle_index[0]
-    for i in range(1, len(cycle_index)):
-        if cycle_index[i] != prev_value:
-            current_cycle += 1
-            prev_value = cycle_index[i]
-        cycle_index[i] = current_cycle
-    return cycle_index
-
-
 def extract_date_from_filename(filename):
     filename = filename.upper()
     pat = r'C[XS]2?_\d+_(\d+)_(\d+)B?_(\d+)'
@@ -4,16 +4,15 @@
 import shutil
 import pickle
 import zipfile
-import numpy as np
 
 from tqdm import tqdm
-from numba import njit
 from typing import List
 from pathlib import Path
 
 from batteryml import CycleData, BatteryData, CyclingProtocol
 from batteryml.builders import PREPROCESSORS
 from batteryml.preprocess.base import BasePreprocessor
+from batteryml.utils.kernels import calc_Q
 
 
 @PREPROCESSORS.register()
@@ -205,16 +204,3 @@ DISCHARGE_RATES = {
     '10-7': [2, 2, 4],
     '10-8': [2, 1, 5],
 }
-
-
-@njit
-def calc_Q(I, t, is_charge):  # noqa
-    Q = np.zeros_like(I)
-    for i in range(1, len(I)):
-        if is_charge and I[i] > 0:
-            Q[i] = Q[i-1] + I[i] * (t[i] - t[i-1]) / 3600
-        elif not is_charge and I[i] < 0:
-            Q[i] = Q[i-1] - I[i] * (t[i] - t[i-1]) / 3600
-        else:
-            Q[i] = Q[i-1]
-    return Q
@@ -8,12 +8,14 @@ import numpy as np
 import pandas as pd
 
 from tqdm import tqdm
-from numba import njit
 from pathlib import Path
 
 from batteryml import CycleData, BatteryData, CyclingProtocol
 from batteryml.builders import PREPROCESSORS
 from batteryml.preprocess.base import BasePreprocessor
+from batteryml.utils.kernels import (
+    calc_Q, find_cycle_ends, find_time_anomalies, remove_abnormal_cycle
+)
 
 
 @PREPROCESSORS.register()
@@ -86,8 +88,8 @@ class RWTHPreprocessor(BasePreprocessor):
                 V = cycle_data['Spannung'].values
                 I = cycle_data['Strom'].values  # noqa
                 t = cycle_data['Programmdauer'].values
-                Qc = calc_Q(I, t, is_charge=True)
-                Qd = calc_Q(I, t, is_charge=False)
+                Qc = calc_Q(I, t, is_charge=True, time_unit=36e5)
+                Qd = calc_Q(I, t, is_charge=False, time_unit=36e5)
                 cycles.append(CycleData(
                     cycle_number=i,
                     voltage_in_V=V.tolist(),
@@ -148,64 +150,3 @@ class RWTHPreprocessor(BasePreprocessor):
         shutil.rmtree(subdir)
 
         return process_batteries_num, skip_batteries_num
-
-
-@njit
-def find_cycle_ends(current, lag=10, tolerance=0.1):
-    is_cycle_end = np.zeros_like(current, dtype=np.bool8)
-    enter_discharge_steps = 0
-    for i in range(len(current)):
-        I = current[i]  # noqa
-        if i > 0 and i < len(current):
-            # Process the non-smoothness
-            if np.abs(current[i] - current[i-1]) > tolerance \
-                    and np.abs(current[i] - current[i+1]) > tolerance:
-                I = current[i+1]  # noqa
-        if I < 0:  # discharge
-            enter_discharge_steps += 1
-        else:
-            enter_discharge_steps = 0
-        nms_size = 500
-        if enter_discharge_steps == lag:
-            t = i - lag + 1
-            if t > nms_size and np.max(is_cycle_end[t-nms_size:t]) > 0:
-                continue
-            is_cycle_end[t] = True
-
-    return is_cycle_end
-
-
-@njit
-def find_time_anomalies(time, tolerance=1e5):
-    prev = time[0]
-    result = np.ones_like(time, dtype=np.bool8)
-    for i in range(1, len(time)):
-        if time[i] - prev > tolerance:
-            result[i] = False
-        else:
-            prev = time[i]
-    return result
-
-
-@njit
-def remove_abnormal_cycle(Qd, eps=0.05, window=5):
-    to_remove = np.zeros_like(Qd, dtype=np.bool8)
-    for i in range(window, len(Qd)-window):
-        prev = max(0, i - window)
-        if np.abs(Qd[i] - np.median(Qd[prev:i])) > eps \
-                and np.abs(Qd[i] - np.median(Qd[i:i+window])) > eps:
-            to_remove[i] = True
-    return to_remove
-
-
-@njit
-def calc_Q(I, t, is_charge):  # noqa
-    Q = np.zeros_like(I)
-    for i in range(1, len(I)):
-        if is_charge and I[i] > 0:
-            Q[i] = Q[i-1] + I[i] * (t[i] - t[i-1]) / 36e5
-        elif not is_charge and I[i] < 0:
-            Q[i] = Q[i-1] - I[i] * (t[i] - t[i-1]) / 36e5
-        else:
-            Q[i] = Q[i-1]
-    return Q
@@ -0,0 +1,358 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Render QA figures of the processed cells with a local process pool.
+
+Each cell is rendered from its per-cycle summary (see `load_cycle_summary`)
+and the traces of a few sampled cycles (see `load_sampled_curves`), both
+cached next to the cell file, and each dataset from the summaries of its
+cells, so that the raw traces of a cell are read once and never drawn in
+full. The figures are gathered in an HTML index with the QA flags of the
+cells."""
+
+from __future__ import annotations
+
+import html
+import glob
+import pickle
+import traceback
+import multiprocessing
+import numpy as np
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+CELL_DIR = 'cells'
+DATASET_DIR = 'datasets'
+# Tolerances of the QA flags of the cells
+COULOMBIC_EFFICIENCY_RANGE = (0.9, 1.05)
+CAPACITY_JUMP = 0.1
+
+
+def find_cells(patterns: list) -> list:
+    """Processed cell files given by files, directories or glob patterns."""
+    cells = []
+    for pattern in patterns:
+        if Path(pattern).is_dir():
+            cells += sorted(str(x) for x in Path(pattern).glob('*.pkl'))
+        else:
+            cells += sorted(glob.glob(pattern, recursive=True))
+    return sorted(set(cells), key=cells.index)
+
+
+def qa_flags(summary: dict) -> list:
+    """Problems of a cell that are visible in its per-cycle summary."""
+    flags = []
+    capacity = summary['discharge_capacity']
+    if len(capacity) == 0:
+        return ['no cycles']
+    cycle_number = summary['cycle_number']
+    if np.any(np.diff(cycle_number) <= 0):
+        flags.append('unordered cycle numbers')
+    if np.isnan(capacity).any():
+        flags.append('missing capacity')
+    finite = capacity[np.isfinite(capacity)]
+    if len(finite) > 1:
+        jump = np.abs(np.diff(finite)) / np.abs(finite).max()
+        if jump.max(initial=0) > CAPACITY_JUMP:
+            flags.append('capacity jumps')
+    efficiency = coulombic_efficiency(summary)
+    low, high = COULOMBIC_EFFICIENCY_RANGE
+    efficiency = efficiency[np.isfinite(efficiency)]
+    if len(efficiency) and (
+            efficiency.min() < low or efficiency.max() > high):
+        flags.append('coulombic efficiency out of range')
+    if np.isnan(summary['internal_resistance']).all():
+        flags.append('no internal resistance')
+    if np.isnan(summary['nominal_capacity_in_Ah']):
+        flags.append('no nominal capacity')
+    return flags
+
+
+def coulombic_efficiency(summary: dict) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return summary['discharge_capacity'] / summary['charge_capacity']
+
+
+def cell_row(path: str, summary: dict) -> dict:
+    """QA statistics of a cell shown in the index."""
+    capacity = summary['discharge_capacity']
+    finite = capacity[np.isfinite(capacity)]
+    retention = np.nan
+    if len(finite) and finite[0] != 0:
+        retention = finite[-1] / finite[0]
+    return {
+        'path': str(path),
+        'cell_id': str(summary['cell_id']),
+        'cycles': len(capacity),
+        'nominal_capacity': float(summary['nominal_capacity_in_Ah']),
+        'retention': float(retention),
+        'flags': qa_flags(summary),
+    }
+
+
+def init_worker(threads: int):
+    import torch
+    import matplotlib
+    matplotlib.use('Agg')
+    torch.set_num_threads(threads)
+
+
+def render_cell(path: str,
+                output: str,
+                num_cycles: int = 8,
+                dpi: int = 100) -> dict:
+    """Render the QA figure of a cell, i.e., the capacity fade, the V-Q
+    curves of `num_cycles` sampled cycles, the internal resistance and the
+    coulombic efficiency, to `output/cells/<cell_id>.png`.
+
+    The summary and the sampled curves are read from their caches next to
+    the cell file, which is only loaded, once, if any of them is stale."""
+    import matplotlib.pyplot as plt
+    from batteryml.visualization.decimation import decimate
+    from batteryml.visualization.summary import (
+        SUMMARY_SUFFIX, is_cached, load_cycle_summary, load_sampled_curves
+    )
+
+    cell_dict = None
+    if not is_cached(path, SUMMARY_SUFFIX):
+        with open(path, 'rb') as f:
+            cell_dict = pickle.load(f)
+    summary = load_cycle_summary(path, cell_dict)
+    curves = load_sampled_curves(path, num_cycles, cell_dict)
+    del cell_dict
+
+    figsize = (12, 8)
+    n_columns = int(figsize[0] * dpi / 2)
+    fig, axes = plt.subplots(2, 2, figsize=figsize)
+    cycle_number = summary['cycle_number']
+    (ax_fade, ax_vq), (ax_ir, ax_ce) = axes
+
+    capacity = summary['discharge_capacity']
+    ax_fade.plot(*decimate(cycle_number, capacity, n_columns))
+    nominal = float(summary['nominal_capacity_in_Ah'])
+    if np.isfinite(nominal):
+        ax_fade.axhline(nominal, color='grey', linestyle='--',
+                        label='Nominal capacity')
+        ax_fade.axhline(0.8 * nominal, color='grey', linestyle=':',
+                        label='80% of nominal')
+        ax_fade.legend()
+    ax_fade.set(title='Capacity fade', xlabel='Cycle',
+                ylabel='Discharge capacity (Ah)')
+
+    offsets = curves['offsets']
+    colors = plt.cm.jet(np.linspace(0, 1, max(1, len(offsets) - 1)))
+    for i, color in enumerate(colors[:len(offsets) - 1]):
+        start, end = offsets[i], offsets[i + 1]
+        ax_vq.plot(*decimate(curves['discharge_capacity'][start:end],
+                             curves['voltage'][start:end], n_columns),
+                   color=color,
+                   label=f'Cycle {int(curves["cycle_number"][i])}')
+    if len(offsets) > 1:
+        ax_vq.legend(fontsize='small', ncol=2)
+    ax_vq.set(title='V-Q curves of sampled cycles',
+              xlabel='Discharge capacity (Ah)', ylabel='Voltage (V)')
+
+    resistance = summary['internal_resistance']
+    if np.isfinite(resistance).any():
+        ax_ir.plot(*decimate(cycle_number, resistance, n_columns))
+    else:
+        ax_ir.text(0.5, 0.5, 'Not available', ha='center', va='center',
+                   transform=ax_ir.transAxes)
+    ax_ir.set(title='Internal resistance', xlabel='Cycle',
+              ylabel='Internal resistance (Ohm)')
+
+    efficiency = coulombic_efficiency(summary)
+    ax_ce.plot(*decimate(cycle_number, efficiency, n_columns))
+    for bound in COULOMBIC_EFFICIENCY_RANGE:
+        ax_ce.axhline(bound, color='grey', linestyle=':')
+    ax_ce.set(title='Coulombic efficiency', xlabel='Cycle',
+              ylabel='Discharge / charge capacity')
+
+    for ax in axes.flat:
+        ax.grid()
+    row = cell_row(path, summary)
+    fig.suptitle(row['cell_id'])
+    fig.tight_layout()
+    image = Path(output) / CELL_DIR / f'{row["cell_id"]}.png'
+    fig.savefig(image, dpi=dpi)
+    plt.close(fig)
+    row['image'] = str(image.relative_to(output))
+    return row
+
+
+def render_dataset(name: str,
+                   paths: list,
+                   output: str,
+                   dpi: int = 100) -> str:
+    """Render the overview of the cells of a dataset from their cached
+    summaries, i.e., the relative capacity fade, the internal resistance
+    and the coulombic efficiency of all cells, and the distribution of
+    their cycle numbers, to `output/datasets/<name>.png`."""
+    import matplotlib.pyplot as plt
+    from batteryml.visualization.plot_helper import (
+        plot_capacity_fade, plot_summary_trend
+    )
+    from batteryml.visualization.summary import load_cycle_summary
+
+    summaries = [load_cycle_summary(path) for path in paths]
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8), dpi=dpi)
+    (ax_fade, ax_cycles), (ax_ir, ax_ce) = axes
+    plot_capacity_fade(
+        summaries, title='Capacity fade', max_legend_entries=0, ax=ax_fade)
+    ax_fade.set_ylabel('Capacity / nominal capacity')
+    plot_summary_trend(
+        summaries, lambda x: x['internal_resistance'],
+        title='Internal resistance', ylabel='Internal resistance (Ohm)',
+        max_legend_entries=0, ax=ax_ir)
+    plot_summary_trend(
+        summaries, coulombic_efficiency, title='Coulombic efficiency',
+        ylabel='Discharge / charge capacity', max_legend_entries=0,
+        ax=ax_ce)
+    ax_cycles.hist([len(x['cycle_number']) for x in summaries], bins=20)
+    ax_cycles.set(title='Cycles per cell', xlabel='Cycles', ylabel='Cells')
+    ax_cycles.grid()
+
+    fig.suptitle(f'{name} ({len(summaries)} cells)')
+    fig.tight_layout()
+    image = Path(output) / DATASET_DIR / f'{name}.png'
+    fig.savefig(image, dpi=dpi)
+    plt.close(fig)
+    return str(image.relative_to(output))
+
+
+def write_index(output: str, datasets: dict, rows: list, failed: list):
+    """Write `output/index.html` with the figures and the QA table of each
+    dataset."""
+    rows_by_dataset = {}
+    for row in rows:
+        rows_by_dataset.setdefault(
+            row['cell_id'].split('_')[0], []).append(row)
+    lines = [
+        '<!DOCTYPE html>',
+        '<html><head><meta charset="utf-8"><title>BatteryML report</title>',
+        '<style>body{font-family:sans-serif}table{border-collapse:collapse}'
+        'td,th{border:1px solid #ccc;padding:2px 6px}'
+        '.flag{color:#c00}</style>',
+        '</head><body>',
+        f'<h1>BatteryML report of {len(rows)} cells</h1>',
+    ]
+    for name, image in sorted(datasets.items()):
+        escaped = html.escape(name)
+        lines += [
+            f'<h2 id="{escaped}">{escaped}</h2>',
+            f'<img src="{html.escape(image)}" width="900">',
+            '<table><tr><th>Cell</th><th>Cycles</th>'
+            '<th>Nominal capacity (Ah)</th><th>Retention</th>'
+            '<th>Flags</th></tr>',
+        ]
+        for row in sorted(rows_by_dataset.get(name, []),
+                          key=lambda x: x['cell_id']):
+            lines.append(
+                '<tr><td><a href="{}">{}</a></td><td>{}</td><td>{:.3f}</td>'
+                '<td>{:.3f}</td><td class="flag">{}</td></tr>'.format(
+                    html.escape(row['image']),
+                    html.escape(row['cell_id']),
+                    row['cycles'],
+                    row['nominal_capacity'],
+                    row['retention'],
+                    html.escape(', '.join(row['flags']))))
+        lines.append('</table>')
+    if failed:
+        lines.append('<h2>Failed cells</h2><ul>')
+        lines += [f'<li>{html.escape(path)}</li>' for path in failed]
+        lines.append('</ul>')
+    lines.append('</body></html>')
+    with open(Path(output) / 'index.html', 'w') as f:
+        f.write('\n'.join(lines))
+
+
+class Report:
+    """Render the QA report of processed cells over a local process pool.
+
+    The cells are rendered first, which also caches their summaries, and
+    then the datasets, given by the prefix of the cell ids, from these
+    summaries. The workers use the non-interactive Agg backend.
+
+    Args:
+        cells (list): processed cell files.
+        output (str): directory of the report.
+        workers (int): number of worker processes.
+        num_cycles (int): cycles sampled for the V-Q curves of each cell.
+        dpi (int): resolution of the figures.
+    """
+    def __init__(self,
+                 cells: list,
+                 output: str = 'reports',
+                 workers: int = 1,
+                 num_cycles: int = 8,
+                 dpi: int = 100):
+        self.cells = list(cells)
+        self.output = Path(output)
+        self.workers = max(1, workers)
+        self.num_cycles = num_cycles
+        self.dpi = dpi
+
+    def run(self) -> list:
+        from tqdm import tqdm
+
+        (self.output / CELL_DIR).mkdir(parents=True, exist_ok=True)
+        (self.output / DATASET_DIR).mkdir(parents=True, exist_ok=True)
+        context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(
+            self.workers, mp_context=context,
+            initializer=init_worker, initargs=(1,))
+        rows, failed, datasets = [], [], {}
+        try:
+            futures = {
+                executor.submit(
+                    _try, render_cell, path, str(self.output),
+                    self.num_cycles, self.dpi): path
+                for path in self.cells
+            }
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               desc='Rendering cells'):
+                row, error = future.result()
+                if error:
+                    print(f'[failed] {futures[future]}\n{error}')
+                    failed.append(futures[future])
+                else:
+                    rows.append(row)
+
+            groups = {}
+            for row in rows:
+                groups.setdefault(
+                    row['cell_id'].split('_')[0], []).append(row['path'])
+            futures = {
+                executor.submit(
+                    _try, render_dataset, name, paths,
+                    str(self.output), self.dpi): name
+                for name, paths in groups.items()
+            }
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               desc='Rendering datasets'):
+                image, error = future.result()
+                if error:
+                    print(f'[failed] {futures[future]}\n{error}')
+                else:
+                    datasets[futures[future]] = image
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        write_index(self.output, datasets, rows, failed)
+        flagged = sum(1 for row in rows if row['flags'])
+        print(f'Report of {len(rows)} cells ({flagged} flagged, '
+              f'{len(failed)} failed) is written to '
+              f'{str(self.output / "index.html")}.')
+        return rows
+
+
+def _try(func, *args) -> tuple:
+    """Run a job in a worker, return `(result, error)`."""
+    try:
+        return func(*args), None
+    except Exception:
+        return None, traceback.format_exc()
@@ -0,0 +1,177 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""A local SQLite store of the evaluation results across runs."""
+
+from __future__ import annotations
+
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from contextlib import contextmanager
+
+
+RESULTS_DB = Path('workspaces') / 'results.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    config TEXT NOT NULL,
+    workspace TEXT,
+    model TEXT,
+    seed INTEGER NOT NULL,
+    dataset_hash TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, metric)
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    cell_id TEXT NOT NULL,
+    prediction BLOB NOT NULL,
+    target BLOB,
+    PRIMARY KEY (run_id, cell_id)
+);
+CREATE INDEX IF NOT EXISTS runs_config_seed ON runs(config, seed);
+'''
+
+
+class ResultsStore:
+    """Scores and predictions of the evaluated runs in one SQLite file.
+
+    Every evaluation adds a run, i.e., a (config, seed) pair, with one row
+    per metric and the predictions of each test cell stored as a float32
+    array. Tables of the scores can then be built without loading any
+    dataset or checkpoint. Only the latest run of a (config, seed) pair is
+    used in the queries.
+
+    Args:
+        path (str): path of the SQLite database file.
+    """
+    def __init__(self, path: str | Path = 'results.db'):
+        self.path = Path(path)
+        if self.path.parent != Path(''):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Sweep workers may write to the same database concurrently
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add_run(self,
+                config: str,
+                seed: int,
+                scores: dict,
+                timestamp: str,
+                workspace: str = None,
+                model: str = None,
+                dataset_hash: str = None,
+                cell_ids: list = None,
+                prediction: np.ndarray = None,
+                target: np.ndarray = None) -> int:
+        """Insert the results of one evaluation and return its run id."""
+        with self._connect() as conn:
+            run_id = conn.execute(
+                'INSERT INTO runs (config, workspace, model, seed, '
+                'dataset_hash, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                (str(config), None if workspace is None else str(workspace),
+                 model, int(seed), dataset_hash, timestamp)
+            ).lastrowid
+            conn.executemany(
+                'INSERT INTO scores (run_id, metric, value) VALUES (?, ?, ?)',
+                [(run_id, m, float(v)) for m, v in scores.items()])
+            if prediction is not None:
+                prediction = np.asarray(prediction, dtype=np.float32)
+                if cell_ids is None:
+                    cell_ids = [str(i) for i in range(len(prediction))]
+                if target is not None:
+                    target = np.asarray(target, dtype=np.float32)
+                conn.executemany(
+                    'INSERT INTO predictions (run_id, cell_id, prediction, '
+                    'target) VALUES (?, ?, ?, ?)',
+                    [(run_id, str(cell_id), prediction[i].tobytes(),
+                      None if target is None else target[i].tobytes())
+                     for i, cell_id in enumerate(cell_ids)])
+        return run_id
+
+    def runs(self, config: str = None, latest: bool = True) -> pd.DataFrame:
+        """List the runs, optionally filtered by a SQL LIKE config pattern.
+        """
+        query = 'SELECT * FROM runs'
+        if latest:
+            query += (' WHERE run_id IN (SELECT MAX(run_id) FROM runs '
+                      'GROUP BY config, seed)')
+        params = []
+        if config is not None:
+            query += ' AND' if latest else ' WHERE'
+            query += ' config LIKE ?'
+            params.append(config)
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                query + ' ORDER BY config, seed', conn, params=params)
+
+    def scores(self, config: str = None, latest: bool = True) -> pd.DataFrame:
+        """Scores in long format, one row per (config, seed, metric)."""
+        runs = self.runs(config, latest)
+        with self._connect() as conn:
+            scores = pd.read_sql_query('SELECT * FROM scores', conn)
+        return runs.merge(scores, on='run_id')[
+            ['run_id', 'config', 'model', 'seed', 'metric', 'value']]
+
+    def predictions(self, run_id: int) -> pd.DataFrame:
+        """Predictions and targets of a run indexed by cell id."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT cell_id, prediction, target FROM predictions '
+                'WHERE run_id = ? ORDER BY rowid', (run_id, )).fetchall()
+        return pd.DataFrame({
+            'prediction': [_decode(p) for _, p, _ in rows],
+            'target': [_decode(t) for _, _, t in rows],
+        }, index=pd.Index([c for c, _, _ in rows], name='cell_id'))
+
+    def leaderboard(self,
+                    metric: str = 'RMSE',
+                    config: str = None,
+                    fmt: str = '{mean:.0f}±{std:.0f}') -> pd.DataFrame:
+        """Table of `metric` over seeds, one row per method and one column
+        per dataset.
+
+        Configs are laid out as `.../<method>/<dataset>.yaml`, as in
+        `configs/baselines`, so the method is the name of the parent
+        directory and the dataset is the stem of the config file.
+        """
+        scores = self.scores(config)
+        scores = scores[scores.metric == metric]
+        if len(scores) == 0:
+            return pd.DataFrame()
+        paths = scores.config.map(Path)
+        scores = scores.assign(
+            method=paths.map(lambda p: p.parent.name),
+            dataset=paths.map(lambda p: p.stem))
+        stats = scores.groupby(['method', 'dataset']).value.agg(
+            mean='mean', std=lambda x: np.std(x), count='count')
+        cells = stats.apply(
+            lambda row: fmt.format(**row.to_dict()), axis=1)
+        return cells.unstack('dataset')
+
+
+def _decode(blob):
+    if blob is None:
+        return None
+    array = np.frombuffer(blob, dtype=np.float32)
+    return float(array[0]) if len(array) == 1 else array
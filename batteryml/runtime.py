@@ -0,0 +1,82 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Standalone runtime of the models exported by `batteryml export`.
+
+This file is copied next to the exported model and only depends on numpy
+and torch for TorchScript, or onnxruntime for ONNX, so that the exported
+models run without batteryml, scikit-learn or xgboost:
+
+    from runtime import ExportedModel
+
+    model = ExportedModel('path/to/export')
+    prediction = model.predict(feature)
+
+The inputs are the raw features of the feature extractor of the config,
+and the predictions are in the original label scale.
+"""
+
+import json
+import numpy as np
+
+from pathlib import Path
+
+METADATA_FILE = 'metadata.json'
+EXPORT_FORMATS = ['torchscript', 'onnx']
+
+
+class ExportedModel:
+    """Load an exported model.
+
+    Args:
+        path (str): export directory, or the model file in it.
+        num_threads (int): number of intra-op threads of the runtime.
+    """
+    def __init__(self, path: str, num_threads: int = None):
+        path = Path(path)
+        directory = path.parent if path.is_file() else path
+        with open(directory / METADATA_FILE) as f:
+            self.metadata = json.load(f)
+        self.format = self.metadata['format']
+        self.feature_shape = tuple(self.metadata['feature_shape'])
+        model_file = str(directory / self.metadata['model_file'])
+
+        if self.format == 'torchscript':
+            import torch
+            if num_threads is not None:
+                torch.set_num_threads(num_threads)
+            self._torch = torch
+            self._module = torch.jit.load(model_file, map_location='cpu')
+            self._module.eval()
+        elif self.format == 'onnx':
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if num_threads is not None:
+                options.intra_op_num_threads = num_threads
+            self._session = onnxruntime.InferenceSession(
+                model_file, options, providers=['CPUExecutionProvider'])
+        else:
+            raise ValueError(f'Unknown export format {self.format}')
+
+    def predict(self, feature, batch_size: int = None) -> np.ndarray:
+        """Predict the labels of a batch of raw features, or of a single
+        one without the batch dimension."""
+        feature = np.ascontiguousarray(feature, dtype=np.float32)
+        if feature.shape == self.feature_shape:
+            return self.predict(feature[None], batch_size)[0]
+        assert feature.shape[1:] == self.feature_shape, \
+            f'Expect features of shape {self.feature_shape}, ' \
+            f'got {feature.shape[1:]}'
+        if len(feature) == 0:
+            return np.zeros(0, dtype=np.float32)
+        batch_size = batch_size or len(feature)
+        return np.concatenate([
+            self._run(feature[i:i + batch_size])
+            for i in range(0, len(feature), batch_size)
+        ])
+
+    def _run(self, feature: np.ndarray) -> np.ndarray:
+        if self.format == 'torchscript':
+            with self._torch.inference_mode():
+                return self._module(self._torch.from_numpy(feature)).numpy()
+        return self._session.run(None, {'feature': feature})[0]
@@ -0,0 +1,398 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""A long-lived local prediction server with micro-batching.
+
+The server exposes a JSON API over HTTP on a local port or a Unix socket:
+
+    POST   /predict          {"cells": [...]} -> {"predictions": {...}}
+    GET    /cells            predictions of all the tracked cells
+    DELETE /cells/<cell_id>  stop tracking a cell
+    GET    /metrics          latency, throughput and batching statistics
+    GET    /health
+
+Each item of `cells` is one of
+    {"cell": {<BatteryData.to_dict() of the cell>}}
+    {"path": "<BatteryData pickle under the data directory>"}
+    {"cell_id": "<id>", "cycles": [{<CycleData.to_dict()>}, ...]}
+where the first two (re)load a whole cell and the last appends new cycles
+to a tracked cell. Concurrent requests are grouped by a micro-batcher, so
+the cells of all the requests in a batch are scored in one `predict` call.
+
+The clients are trusted with the JSON content of the cells only. Loading a
+pickle executes code, so the `path` items are rejected unless the server
+is started with a `data_dir`, and are then restricted to the files under
+it, which should only be writable by trusted users. The server binds to
+the local host by default and has no authentication.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import queue
+import socket
+import threading
+import http.client
+import numpy as np
+
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batteryml.data import BatteryData, CycleData
+from batteryml.online import OnlineInferenceEngine
+
+
+class ServerMetrics:
+    """Rolling statistics of the served requests and batches."""
+    def __init__(self, window: int = 1000):
+        self.start_time = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_request(self, latency: float, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.latencies.append(latency)
+
+    def record_batch(self, size: int):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += size
+            self.batch_sizes.append(size)
+
+    def summary(self) -> dict:
+        with self._lock:
+            uptime = time.time() - self.start_time
+            latencies = np.array(self.latencies) * 1000
+            result = {
+                'uptime_in_s': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'throughput_in_rps': self.requests / max(uptime, 1e-9),
+                'batches': self.batches,
+                'mean_batch_size':
+                    self.batched_requests / max(self.batches, 1),
+                'max_batch_size':
+                    max(self.batch_sizes) if self.batch_sizes else 0,
+            }
+            for q in [50, 95, 99]:
+                result[f'latency_p{q}_in_ms'] = \
+                    float(np.percentile(latencies, q)) if len(latencies) \
+                    else None
+            return result
+
+
+class MicroBatcher:
+    """Group the concurrent requests into batches scored together.
+
+    A batch is closed when it has `max_batch_size` requests or when
+    `max_wait_ms` has passed since its first request.
+    """
+    def __init__(self,
+                 engine: OnlineInferenceEngine,
+                 metrics: ServerMetrics,
+                 max_batch_size: int = 64,
+                 max_wait_ms: float = 5.):
+        self.engine = engine
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, updates: list) -> dict:
+        """Apply the parsed updates (see `parse_cells`) and return the
+        predictions of their cells, blocking until the batch of the request
+        is scored."""
+        future = Future()
+        self._queue.put((updates, future))
+        return future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: list):
+        self.metrics.record_batch(len(batch))
+        requests = []
+        for updates, future in batch:
+            try:
+                requests.append((apply_updates(self.engine, updates), future))
+            except Exception as e:
+                future.set_exception(e)
+        if not requests:
+            return
+        cell_ids = list(dict.fromkeys(
+            cell_id for ids, _ in requests for cell_id in ids))
+        try:
+            predictions = self.engine.predict(cell_ids)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        for ids, future in requests:
+            future.set_result({
+                cell_id: predictions[cell_id] for cell_id in ids})
+
+
+def parse_cells(cells: list, data_dir: str = None) -> list:
+    """Parse the cell items of a request into updates of the engine.
+
+    Loading and parsing run in the request threads, leaving only the
+    feature updates and the scoring to the batcher thread.
+
+    Args:
+        data_dir (str): directory of the cell files the `path` items may
+            load, relative to it. The `path` items are rejected if `None`.
+    """
+    updates = []
+    for item in cells:
+        if 'path' in item:
+            path = resolve_cell_path(item['path'], data_dir)
+            updates.append(('cell', BatteryData.load(path)))
+        elif 'cell' in item:
+            updates.append(('cell', BatteryData.from_dict(item['cell'])))
+        elif 'cell_id' in item:
+            updates.append(('cycles', item['cell_id'], [
+                CycleData(**cycle) for cycle in item.get('cycles', [])
+            ]))
+        else:
+            raise ValueError(f'Invalid cell item with keys {list(item)}')
+    return updates
+
+
+def resolve_cell_path(path: str, data_dir: str = None) -> str:
+    """Real path of a requested cell file, which must be under
+    `data_dir`."""
+    if data_dir is None:
+        raise ValueError('Loading cells from server paths is disabled, '
+                         'start the server with a data directory.')
+    root = os.path.realpath(data_dir)
+    path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f'{path} is outside of the data directory.')
+    return path
+
+
+def apply_updates(engine: OnlineInferenceEngine, updates: list) -> list:
+    """Apply the parsed updates of a request, return the cell ids."""
+    cell_ids = []
+    for kind, *args in updates:
+        if kind == 'cell':
+            engine.add_cell(args[0])
+            cell_ids.append(args[0].cell_id)
+            continue
+        cell_id, cycles = args
+        if cell_id not in engine.states:
+            raise KeyError(f'Unknown cell {cell_id}, upload the cell '
+                           'before appending cycles.')
+        for cycle_data in cycles:
+            engine.add_cycle(cell_id, cycle_data)
+        cell_ids.append(cell_id)
+    return cell_ids
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'BatteryML'
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self._reply(200, {'status': 'ok'})
+        if self.path == '/metrics':
+            summary = self.server.metrics.summary()
+            summary['cells'] = len(self.server.engine.states)
+            return self._reply(200, summary)
+        if self.path == '/cells':
+            return self._timed(lambda: {
+                'predictions': self.server.batcher.submit([
+                    ('cycles', cell_id, [])
+                    for cell_id in list(self.server.engine.states)
+                ])
+            })
+        self._reply(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._reply(404, {'error': f'Unknown path {self.path}'})
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            cells = body['cells']
+        except (ValueError, KeyError):
+            return self._reply(400, {'error': 'Expect {"cells": [...]}'})
+        self._timed(lambda: {
+            'predictions': self.server.batcher.submit(
+                parse_cells(cells, self.server.data_dir))
+        })
+
+    def do_DELETE(self):
+        prefix = '/cells/'
+        if not self.path.startswith(prefix):
+            return self._reply(404, {'error': f'Unknown path {self.path}'})
+        self.server.engine.remove_cell(self.path[len(prefix):])
+        self._reply(200, {'status': 'ok'})
+
+    def _timed(self, handle):
+        start = time.perf_counter()
+        error = False
+        try:
+            code, result = 200, handle()
+        except (KeyError, ValueError, FileNotFoundError) as e:
+            code, result, error = 400, {'error': str(e)}, True
+        except Exception as e:
+            code, result, error = 500, {'error': repr(e)}, True
+        self.server.metrics.record_request(
+            time.perf_counter() - start, error)
+        self._reply(code, result)
+
+    def _reply(self, code: int, result: dict):
+        data = json.dumps(result).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # The client address of a Unix socket is an empty string
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering from an `OnlineInferenceEngine`.
+
+    Args:
+        engine (OnlineInferenceEngine): engine of the served model.
+        host (str): host to bind, local only by default.
+        port (int): port to bind.
+        unix_socket (str): path of a Unix socket to bind instead of a port.
+        max_batch_size (int): maximum number of requests in a batch.
+        max_wait_ms (float): maximum time a request waits for its batch to
+            fill up.
+        quiet (bool): do not log the requests.
+        data_dir (str): directory of the cell files that the requests may
+            load by `path`, which is disabled by default, see the module
+            docstring.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self,
+                 engine: OnlineInferenceEngine,
+                 host: str = '127.0.0.1',
+                 port: int = 8000,
+                 unix_socket: str = None,
+                 max_batch_size: int = 64,
+                 max_wait_ms: float = 5.,
+                 quiet: bool = False,
+                 data_dir: str = None):
+        self.unix_socket = unix_socket
+        if unix_socket is not None:
+            self.address_family = socket.AF_UNIX
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            address = unix_socket
+        else:
+            address = (host, port)
+        self.engine = engine
+        self.metrics = ServerMetrics()
+        self.batcher = MicroBatcher(
+            engine, self.metrics, max_batch_size, max_wait_ms)
+        self.quiet = quiet
+        self.data_dir = data_dir
+        ThreadingHTTPServer.__init__(self, address, PredictionRequestHandler)
+
+    def server_bind(self):
+        if self.unix_socket is not None:
+            # Skip the host name lookup of HTTPServer for Unix sockets
+            self.socket.bind(self.server_address)
+            self.server_address = self.socket.getsockname()
+            self.server_name, self.server_port = 'localhost', 0
+        else:
+            ThreadingHTTPServer.server_bind(self)
+
+    def server_close(self):
+        ThreadingHTTPServer.server_close(self)
+        self.batcher.close()
+        if self.unix_socket is not None and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+
+
+class PredictionClient:
+    """Minimal client of `PredictionServer` on a local port or socket."""
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 8000,
+                 unix_socket: str = None,
+                 timeout: float = 60.):
+        self.host, self.port = host, port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    def predict(self, cells: list) -> dict:
+        return self.request('POST', '/predict', {'cells': cells})
+
+    def metrics(self) -> dict:
+        return self.request('GET', '/metrics')
+
+    def request(self, method: str, path: str, body: dict = None) -> dict:
+        conn = self._connect()
+        try:
+            data = None if body is None else json.dumps(body).encode()
+            conn.request(method, path, body=data,
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            result = json.loads(response.read())
+            if response.status != 200:
+                raise RuntimeError(f'{response.status}: {result}')
+            return result
+        finally:
+            conn.close()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout)
+        if self.unix_socket is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.unix_socket)
+            conn.sock = sock
+        return conn
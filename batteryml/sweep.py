@@ -0,0 +1,281 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Run many (config, seed) experiments with a local process pool."""
+
+from __future__ import annotations
+
+import os
+import csv
+import glob
+import json
+import traceback
+import multiprocessing
+import numpy as np
+
+from pathlib import Path
+from contextlib import redirect_stderr, redirect_stdout
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from batteryml.utils import import_config
+
+
+RESULT_FILE = 'sweep_result_seed_{seed}.json'
+
+
+def parse_seeds(seeds: str) -> list:
+    """Parse seed specs such as `0-9` or `0,1,5-7`."""
+    result = []
+    for part in str(seeds).split(','):
+        part = part.strip()
+        if '-' in part:
+            start, end = part.split('-')
+            result += list(range(int(start), int(end) + 1))
+        elif part:
+            result.append(int(part))
+    return result
+
+
+def find_configs(patterns: list) -> list:
+    configs = []
+    for pattern in patterns:
+        configs += sorted(glob.glob(pattern, recursive=True))
+    return sorted(set(configs), key=configs.index)
+
+
+def config_workspace(config_path: str,
+                     workspace_root: str,
+                     config_root: str = 'configs') -> Path:
+    """Workspace of a config, mirroring its path under `config_root`."""
+    config_path = Path(config_path)
+    try:
+        relpath = config_path.relative_to(config_root)
+    except ValueError:
+        relpath = Path(config_path.name)
+    return Path(workspace_root) / relpath.with_suffix('')
+
+
+class Sweep:
+    """Schedule (config, seed) jobs over a local process pool.
+
+    Jobs whose configs build the same dataset are grouped, so that the
+    dataset is built once per group. A group whose dataset is not cached
+    yet first runs its first job alone, which builds the cache, and then
+    its other jobs are split across the workers, each loading the cached
+    dataset once. Each finished job leaves a result file in its workspace,
+    which is used to skip the job when the sweep is resumed.
+
+    Args:
+        configs (list): config files to run.
+        seeds (list): seeds to run for every config.
+        workspace_root (str): root of the job workspaces, a config at
+            `configs/a/b.yaml` is run in `workspace_root/a/b`.
+        workers (int): number of worker processes.
+        cpu_budget (int): total number of CPU threads shared by the
+            workers. Defaults to all the CPUs.
+        device (str): device to run the jobs on.
+        metric (list): metrics for evaluation.
+        rerun (bool): rerun the jobs that already have results.
+        results_db (str): results store the evaluations are added to.
+            Defaults to `results.db` under `workspace_root`.
+    """
+    def __init__(self,
+                 configs: list,
+                 seeds: list,
+                 workspace_root: str = 'workspaces',
+                 workers: int = 1,
+                 cpu_budget: int = None,
+                 device: str = 'cpu',
+                 metric: list = None,
+                 rerun: bool = False,
+                 results_db: str = None):
+        self.configs = configs
+        self.seeds = seeds
+        self.workspace_root = Path(workspace_root)
+        self.workers = max(1, workers)
+        self.cpu_budget = cpu_budget or os.cpu_count()
+        self.device = device
+        self.metric = metric or ['RMSE', 'MAE', 'MAPE']
+        self.rerun = rerun
+        self.results_db = str(
+            results_db or self.workspace_root / 'results.db')
+
+    def jobs(self) -> list:
+        return [
+            {
+                'config': str(config),
+                'seed': seed,
+                'workspace': str(config_workspace(
+                    config, self.workspace_root)),
+            }
+            for config in self.configs for seed in self.seeds
+        ]
+
+    def groups(self) -> list:
+        """Group the unfinished jobs by the hash of their datasets."""
+        from batteryml.pipeline import CONFIG_FIELDS, dataset_hash
+
+        groups = defaultdict(list)
+        for job in self.jobs():
+            if not self.rerun and result_path(job).exists():
+                continue
+            configs = import_config(Path(job['config']), CONFIG_FIELDS)
+            groups[dataset_hash(configs)].append(job)
+        return list(groups.values())
+
+    def run(self):
+        groups = self.groups()
+        num_jobs = sum(len(group) for group in groups)
+        print(f'{num_jobs} jobs in {len(groups)} dataset groups to run.')
+
+        threads = max(1, self.cpu_budget // self.workers)
+        context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(
+            self.workers, mp_context=context,
+            initializer=init_worker, initargs=(threads,))
+        pending, waiting = set(), {}
+
+        def submit(jobs: list):
+            future = executor.submit(
+                run_group, jobs, self.device, self.metric, self.results_db)
+            pending.add(future)
+            return future
+
+        try:
+            for group in groups:
+                if dataset_cached(group[0]):
+                    for chunk in self.split(group):
+                        submit(chunk)
+                else:
+                    waiting[submit(group[:1])] = group[1:]
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    for job, error in future.result():
+                        status = 'failed' if error else 'done'
+                        print(f'[{status}] {job["config"]} '
+                              f'seed {job["seed"]}')
+                        if error:
+                            print(error)
+                    rest = waiting.pop(future, None)
+                    if not rest:
+                        continue
+                    if dataset_cached(rest[0]):
+                        for chunk in self.split(rest):
+                            submit(chunk)
+                    else:
+                        # The dataset failed to build, keep the group in one
+                        # worker rather than building it concurrently
+                        submit(rest)
+        except KeyboardInterrupt:
+            print('Interrupted, finished jobs will be skipped on resume.')
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        return self.collect()
+
+    def split(self, jobs: list) -> list:
+        """Split the jobs of a group with a cached dataset into up to one
+        chunk per worker."""
+        size = -(-len(jobs) // self.workers)
+        return [jobs[i:i + size] for i in range(0, len(jobs), size)]
+
+    def collect(self, output: str = None) -> list:
+        """Gather the results of all jobs into a CSV table."""
+        rows = []
+        for job in self.jobs():
+            path = result_path(job)
+            if path.exists():
+                with open(path, 'r') as f:
+                    rows.append(json.load(f))
+        output = Path(output or self.workspace_root / 'sweep_results.csv')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=['config', 'seed', *self.metric])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({
+                    'config': row['config'],
+                    'seed': row['seed'],
+                    **{m: row['scores'].get(m) for m in self.metric}
+                })
+        print(f'Results of {len(rows)} jobs are written to {str(output)}.')
+        print_summary(rows, self.metric)
+        return rows
+
+
+def print_summary(rows: list, metric: list):
+    """Print the mean and std of each metric over seeds per config."""
+    scores = defaultdict(lambda: defaultdict(list))
+    for row in rows:
+        for m in metric:
+            if row['scores'].get(m) is not None:
+                scores[row['config']][m].append(row['scores'][m])
+    print('| Config | Seeds | ' + ' | '.join(metric) + ' |')
+    print('|---|---|' + '---|' * len(metric))
+    for config, values in scores.items():
+        cells = []
+        for m in metric:
+            x = np.array(values[m], dtype=float)
+            cells.append(f'{x.mean():.2f} ± {x.std():.2f}' if len(x) else '')
+        seeds = max(len(v) for v in values.values())
+        print(f'| {config} | {seeds} | ' + ' | '.join(cells) + ' |')
+
+
+def result_path(job: dict) -> Path:
+    return Path(job['workspace']) / RESULT_FILE.format(seed=job['seed'])
+
+
+def dataset_cached(job: dict) -> bool:
+    from batteryml.pipeline import CONFIG_FIELDS, dataset_cache_file
+
+    configs = import_config(Path(job['config']), CONFIG_FIELDS)
+    return dataset_cache_file(configs).exists()
+
+
+def init_worker(threads: int):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def run_group(jobs: list,
+              device: str,
+              metric: list,
+              results_db: str = None) -> list:
+    """Run the jobs sharing one dataset, return `(job, error)` pairs."""
+    from batteryml.pipeline import Pipeline, build_dataset
+
+    dataset, outputs = None, []
+    for job in jobs:
+        workspace = Path(job['workspace'])
+        workspace.mkdir(parents=True, exist_ok=True)
+        seed = job['seed']
+        try:
+            # Same per-seed log as `batteryml run ... | tee log.{seed}`,
+            # progress bars are kept out of the console of the sweep
+            with open(workspace / f'log.{seed}', 'w') as log, \
+                    redirect_stdout(log), redirect_stderr(log):
+                pipeline = Pipeline(
+                    job['config'], str(workspace), results_db=results_db)
+                if dataset is None:
+                    dataset, _ = build_dataset(pipeline.config, device)
+                model, dataset = pipeline.train(
+                    seed=seed, device=device,
+                    skip_if_executed=False, dataset=dataset)
+                scores = pipeline.evaluate(
+                    seed=seed, device=device, metric=metric,
+                    model=model, dataset=dataset, skip_if_executed=False)
+            with open(result_path(job), 'w') as f:
+                json.dump({**job, 'scores': scores}, f, indent=4)
+            outputs.append((job, None))
+        except Exception:
+            outputs.append((job, traceback.format_exc()))
+    # The idle processes of joblib, e.g., of the hyperparameter searches,
+    # would otherwise keep the worker from exiting until they time out
+    from joblib.externals.loky import get_reusable_executor
+    get_reusable_executor().shutdown(wait=True)
+    return outputs
@@ -4,6 +4,7 @@
 import torch
 
 from tqdm import tqdm
+from typing import List, Tuple
 
 from batteryml.builders import (
     FEATURE_EXTRACTORS,
@@ -12,16 +13,35 @@ from batteryml.builders import (
     DATA_TRANSFORMATIONS
 )
 from batteryml.data import BatteryData, DataBundle
+from batteryml.data.ragged import RaggedTensor
+from batteryml.data.window import WindowDataset
 from batteryml.data.transformation.base import BaseDataTransformation
 
 
+def build_transformation(config: dict
+                         ) -> Tuple[BaseDataTransformation, bool]:
+    """Build a data transformation from its config, which may set
+    `lazy: true` to keep the features untransformed and transform them per
+    batch when loaded, see `DataBundle`.
+
+    Returns:
+        the transformation and whether it is lazy.
+    """
+    if config is None:
+        return None, False
+    config = dict(config)
+    lazy = bool(config.pop('lazy', False))
+    return DATA_TRANSFORMATIONS.build(config), lazy
+
+
 class Task:
     def __init__(self,
                  train_test_splitter: dict,
                  feature_extractor: dict,
                  label_annotator: dict,
                  feature_transformation: BaseDataTransformation = None,
-                 label_transformation: BaseDataTransformation = None):
+                 label_transformation: BaseDataTransformation = None,
+                 lazy_feature_transformation: bool = False):
         if isinstance(train_test_splitter, dict):
             train_test_splitter = \
                 TRAIN_TEST_SPLITTERS.build(train_test_splitter, 'raise')
@@ -30,10 +50,11 @@ class Task:
         if isinstance(label_annotator, dict):
             label_annotator = LABEL_ANNOTATORS.build(label_annotator)
         if isinstance(feature_transformation, dict):
-            feature_transformation = DATA_TRANSFORMATIONS.build(
+            feature_transformation, lazy = build_transformation(
                 feature_transformation)
+            lazy_feature_transformation = lazy_feature_transformation or lazy
         if isinstance(label_transformation, dict):
-            label_transformation = DATA_TRANSFORMATIONS.build(
+            label_transformation, _ = build_transformation(
                 label_transformation)
 
         self.train_test_splitter = train_test_splitter
@@ -41,6 +62,7 @@ class Task:
         self.label_annotator = label_annotator
         self.feature_transformation = feature_transformation
         self.label_transformation = label_transformation
+        self.lazy_feature_transformation = lazy_feature_transformation
 
     def build(self) -> DataBundle:
         # Loading data
@@ -54,26 +76,158 @@ class Task:
         self.test_cells = test_cells
 
         # Extracting features
-        train_features = self.feature_extractor(train_cells)
-        test_features = self.feature_extractor(test_cells)
-        train_labels = self.label_annotator(train_cells)
-        test_labels = self.label_annotator(test_cells)
-
-        # Omit NaN label cells
-        train_mask = ~torch.isnan(train_labels)
-        test_mask = ~torch.isnan(test_labels)
-        train_features = train_features[train_mask]
-        test_features = test_features[test_mask]
-        train_labels = train_labels[train_mask]
-        test_labels = test_labels[test_mask]
+        train_data = self.extract(train_cells)
+        test_data = self.extract(test_cells)
+
+        # Windows with lazily generated features
+        if isinstance(train_data, WindowDataset):
+            return DataBundle.from_datasets(
+                train_data, test_data,
+                feature_transformation=self.feature_transformation,
+                label_transformation=self.label_transformation)
 
+        train_features, train_labels, train_cell_ids, train_cycles = \
+            train_data
+        test_features, test_labels, test_cell_ids, test_cycles = test_data
         dataset = DataBundle(
             train_features, train_labels, test_features, test_labels,
             feature_transformation=self.feature_transformation,
-            label_transformation=self.label_transformation
+            label_transformation=self.label_transformation,
+            train_cell_ids=train_cell_ids,
+            test_cell_ids=test_cell_ids,
+            train_cycle_indices=train_cycles,
+            test_cycle_indices=test_cycles,
+            # The extracted tensors are owned by the bundle
+            inplace=True,
+            lazy_feature_transformation=self.lazy_feature_transformation
         )
 
         return dataset
 
+    def extract(self, cells: List[BatteryData]):
+        """Extract the features and labels of the cells.
+
+        Returns:
+            the labeled `WindowDataset` for the windows with lazily
+            generated features, otherwise the features, labels, cell ids
+            and cycle indices (`None` unless there are many examples per
+            cell) of the examples whose labels are not NaN.
+        """
+        features = self.feature_extractor(cells)
+        labels = self.label_annotator(cells)
+        cell_ids = [cell.cell_id for cell in cells]
+
+        # Windows with lazily generated features
+        if isinstance(features, WindowDataset):
+            return self.label_windows(features, labels)
+
+        # One example per (cell, cycle) for the trajectory labels or features
+        cycles = None
+        if isinstance(labels, RaggedTensor) \
+                or isinstance(features, RaggedTensor):
+            features, labels, cell_ids, cycles = self.flatten_trajectories(
+                features, labels, cell_ids)
+
+        # Omit NaN label cells, i.e., any of the labels of multiple targets
+        mask = ~torch.isnan(labels.view(len(labels), -1)).any(1)
+        features = features[mask]
+        labels = labels[mask]
+        cell_ids = [
+            cell_id for cell_id, keep in zip(cell_ids, mask.tolist()) if keep]
+        if cycles is not None:
+            cycles = cycles[mask]
+
+        return features, labels, cell_ids, cycles
+
+    def label_windows(self,
+                      windows: WindowDataset,
+                      labels) -> WindowDataset:
+        """Label each window with the label of the cycle it predicts, and
+        omit the windows of which the label is NaN or not available, e.g.,
+        after the end of life.
+
+        The labels are the `RaggedTensor` of the cycles of each cell, or a
+        label per cell shared by its windows.
+        """
+        cells, cycles = windows.windows[:, 0], windows.cycle_indices
+        if isinstance(labels, RaggedTensor):
+            if len(labels.values) == 0 or len(cycles) == 0:
+                return windows.subset(
+                    torch.zeros(len(cells), dtype=torch.bool), labels.values)
+            label_cycles = self.label_annotator.cycle_index(
+                labels.positions())
+            # The labels are sorted by the cell and then the cycle, so that
+            # the label of a window is found by a binary search
+            scale = int(max(label_cycles.max(), cycles.max())) + 1
+            keys = labels.row_ids() * scale + label_cycles
+            query = cells * scale + cycles
+            index = torch.searchsorted(keys, query).clamp(max=len(keys) - 1)
+            found = keys[index] == query
+            labels = labels.values[index]
+        else:
+            found = torch.ones(len(cells), dtype=torch.bool)
+            labels = labels[cells]
+        keep = found & ~torch.isnan(labels.view(len(labels), -1)).any(1)
+        return windows.subset(keep, labels[keep])
+
+    def flatten_trajectories(self, features, labels, cell_ids: list):
+        """Flatten the rows of a `RaggedTensor` of features or labels into
+        one example per (cell, cycle).
+
+        When both are `RaggedTensor`s, the features of a cycle are paired
+        with the label of the same cycle index, so that the extractor and
+        the annotator may start from different cycles or use different
+        strides, and the cycles without either, e.g., the features after
+        the end of life, are omitted. A per-cell tensor is repeated for
+        every example of the cell.
+
+        Returns:
+            the features, labels, cell ids and cycle indices of the
+            examples.
+        """
+        if isinstance(features, RaggedTensor) \
+                and isinstance(labels, RaggedTensor):
+            return self._align_trajectories(features, labels, cell_ids)
+        if isinstance(labels, RaggedTensor):
+            lengths = labels.lengths
+            cycles = self.label_annotator.cycle_index(labels.positions())
+            labels = labels.values
+            features = torch.repeat_interleave(features, lengths, dim=0)
+        else:
+            lengths = features.lengths
+            cycles = self.feature_extractor.cycle_index(features.positions())
+            features = features.values
+            labels = torch.repeat_interleave(labels, lengths, dim=0)
+        cell_ids = [
+            cell_id for cell_id, n in zip(cell_ids, lengths.tolist())
+            for _ in range(n)
+        ]
+        return features, labels, cell_ids, cycles
+
+    def _align_trajectories(self,
+                            features: RaggedTensor,
+                            labels: RaggedTensor,
+                            cell_ids: list):
+        assert len(features) == len(labels), (len(features), len(labels))
+        cells = features.row_ids()
+        cycles = self.feature_extractor.cycle_index(features.positions())
+        if len(labels.values) == 0 or len(cycles) == 0:
+            index = torch.zeros(len(cycles), dtype=torch.long)
+            found = torch.zeros(len(cycles), dtype=torch.bool)
+        else:
+            label_cycles = self.label_annotator.cycle_index(
+                labels.positions())
+            # As in `label_windows`, the labels are sorted by the cell and
+            # then the cycle, so that the label of a cycle is found by a
+            # binary search
+            scale = int(max(label_cycles.max(), cycles.max())) + 1
+            keys = labels.row_ids() * scale + label_cycles
+            query = cells * scale + cycles
+            index = torch.searchsorted(keys, query).clamp(max=len(keys) - 1)
+            found = keys[index] == query
+        cell_ids = [cell_ids[i] for i in cells[found].tolist()]
+        return (features.values[found], labels.values[index[found]],
+                cell_ids, cycles[found])
+
     def get_raw_data(self):
         return self.train_cells, self.test_cells
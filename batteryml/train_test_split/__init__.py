@@ -1,14 +1,23 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
-from .MATR_split import (
-    MATRCLOTestTrainTestSplitter,
-    MATRPrimaryTestTrainTestSplitter,
-    MATRSecondaryTestTrainTestSplitter
-)
-from .HUST_split import HUSTTrainTestSplitter
-from .random_split import RandomTrainTestSplitter
-from .CRUH_split import CRUHTrainTestSplitter
-from .CRUSH_split import CRUSHTrainTestSplitter
-from .MIX100_split import MIX100TrainTestSplitter
-from .SNL_split import SNLTrainTestSplitter
\ No newline at end of file
+from batteryml.builders import TRAIN_TEST_SPLITTERS
+from batteryml.utils import lazy_exports
+
+_EXPORTS = {
+    'MATRCLOTestTrainTestSplitter': '.MATR_split',
+    'MATRPrimaryTestTrainTestSplitter': '.MATR_split',
+    'MATRSecondaryTestTrainTestSplitter': '.MATR_split',
+    'HUSTTrainTestSplitter': '.HUST_split',
+    'RandomTrainTestSplitter': '.random_split',
+    'CRUHTrainTestSplitter': '.CRUH_split',
+    'CRUSHTrainTestSplitter': '.CRUSH_split',
+    'MIX100TrainTestSplitter': '.MIX100_split',
+    'SNLTrainTestSplitter': '.SNL_split',
+    'GroupKFoldTrainTestSplitter': '.cross_validation',
+    'RepeatedRandomTrainTestSplitter': '.cross_validation',
+}
+for _name, _module in _EXPORTS.items():
+    TRAIN_TEST_SPLITTERS.register_lazy(_name, _module, __name__)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,148 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import abc
+import json
+import pickle
+import random
+
+from pathlib import Path
+from typing import List, Tuple
+
+from batteryml.builders import TRAIN_TEST_SPLITTERS
+from batteryml.train_test_split.base import BaseTrainTestSplitter
+
+
+GROUP_KEYS = ['cell', 'dataset', 'protocol']
+
+
+def cell_group(path: str, group_by: str) -> str:
+    """Group of a cell file, i.e., the cell itself, its dataset given by
+    the prefix of the cell id such as `MATR` of `MATR_b1c4`, or its
+    cycling protocols, which are read from the file."""
+    assert group_by in GROUP_KEYS, f'Unknown group {group_by}'
+    stem = Path(path).stem
+    if group_by == 'cell':
+        return stem
+    if group_by == 'dataset':
+        return stem.split('_')[0]
+    with open(path, 'rb') as f:
+        obj = pickle.load(f)
+    return json.dumps([
+        obj.get('charge_protocol') or [],
+        obj.get('discharge_protocol') or []
+    ], sort_keys=True, default=str)
+
+
+class BaseCrossValidationSplitter(BaseTrainTestSplitter):
+    """Splitters of several train/test folds. The cells of a group are
+    always in the same side of a fold, and `split` returns the `fold`-th
+    fold, so that the splitters also work as single splits.
+
+    Args:
+        cell_data_path (list): see `BaseTrainTestSplitter`.
+        group_by (str): `cell`, `dataset` or `protocol`, see `cell_group`.
+        fold (int): fold returned by `split`.
+    """
+    def __init__(self,
+                 cell_data_path: List[str],
+                 group_by: str = 'cell',
+                 fold: int = 0):
+        BaseTrainTestSplitter.__init__(self, cell_data_path)
+        assert group_by in GROUP_KEYS, f'Unknown group {group_by}'
+        self.group_by = group_by
+        self.fold = fold
+
+    @abc.abstractmethod
+    def folds(self) -> List[Tuple[List, List]]:
+        """Train and test cell files of every fold."""
+
+    def split(self) -> Tuple[List, List]:
+        return self.folds()[self.fold]
+
+    def groups(self) -> dict:
+        """Sorted cell files of each group."""
+        groups = {}
+        for path in sorted(str(x) for x in self._file_list):
+            groups.setdefault(cell_group(path, self.group_by), []).append(
+                path)
+        return groups
+
+
+@TRAIN_TEST_SPLITTERS.register()
+class GroupKFoldTrainTestSplitter(BaseCrossValidationSplitter):
+    """K-fold cross validation over the groups of cells, where each group
+    is the test data of exactly one fold.
+
+    The groups are shuffled with `seed` and assigned from the largest to
+    the fold with the fewest cells, so that the folds are balanced.
+    """
+    def __init__(self,
+                 cell_data_path: List[str],
+                 n_splits: int = 5,
+                 group_by: str = 'dataset',
+                 seed: int = 0,
+                 fold: int = 0):
+        BaseCrossValidationSplitter.__init__(
+            self, cell_data_path, group_by, fold)
+        assert n_splits >= 2, n_splits
+        self.n_splits = n_splits
+        self.seed = seed
+
+    def folds(self) -> List[Tuple[List, List]]:
+        groups = self.groups()
+        assert len(groups) >= self.n_splits, \
+            f'Cannot split {len(groups)} groups into {self.n_splits} folds'
+        keys = sorted(groups)
+        random.Random(self.seed).shuffle(keys)
+        # Stable sort keeps the shuffled order of the groups of equal size
+        keys.sort(key=lambda key: -len(groups[key]))
+        tests = [[] for _ in range(self.n_splits)]
+        for key in keys:
+            smallest = min(range(self.n_splits), key=lambda i: len(tests[i]))
+            tests[smallest] += groups[key]
+
+        folds = []
+        for test in tests:
+            test_set = set(test)
+            train = [
+                path for key in sorted(groups) for path in groups[key]
+                if path not in test_set
+            ]
+            folds.append((train, sorted(test)))
+        return folds
+
+
+@TRAIN_TEST_SPLITTERS.register()
+class RepeatedRandomTrainTestSplitter(BaseCrossValidationSplitter):
+    """Random train/test splits of the groups of cells repeated with the
+    seeds `seed`, `seed + 1`, ... With `group_by: cell`, the first split is
+    the one of `RandomTrainTestSplitter` with the same seed.
+    """
+    def __init__(self,
+                 cell_data_path: List[str],
+                 n_repeats: int = 5,
+                 group_by: str = 'cell',
+                 seed: int = 0,
+                 fold: int = 0,
+                 *,
+                 train_test_split_ratio: float = 0.6):
+        BaseCrossValidationSplitter.__init__(
+            self, cell_data_path, group_by, fold)
+        assert n_repeats >= 1, n_repeats
+        self.n_repeats = n_repeats
+        self.seed = seed
+        self.p = train_test_split_ratio
+
+    def folds(self) -> List[Tuple[List, List]]:
+        groups = self.groups()
+        folds = []
+        for repeat in range(self.n_repeats):
+            keys = sorted(groups)
+            random.Random(self.seed + repeat).shuffle(keys)
+            split_point = int(self.p * len(keys))
+            folds.append((
+                [path for key in keys[:split_point] for path in groups[key]],
+                [path for key in keys[split_point:] for path in groups[key]]
+            ))
+        return folds
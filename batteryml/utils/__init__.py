@@ -1,5 +1,6 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
+from .lazy import lazy_exports
 from .registry import Registry
 from .config import import_config
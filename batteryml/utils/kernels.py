@@ -0,0 +1,160 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Numba kernels of the feature extractors and the preprocessors.
+
+The kernels are compiled for explicit signatures with `cache=True`, so the
+machine code is written to `__pycache__` (or `NUMBA_CACHE_DIR`) by the
+first process and only loaded by the later ones, such as the pool workers
+and sweep jobs, instead of being JIT-compiled in each of them. The public
+functions cast the inputs to the compiled types.
+"""
+
+import numpy as np
+
+from numba import njit
+
+
+@njit('float64[:](float64[:], int64, float64)', cache=True)
+def _smooth(x, window_size, sigma):
+    res = np.empty_like(x)
+    meds = np.empty_like(x)
+    for i in range(len(x)):
+        low = max(0, i-window_size)
+        high = min(len(x), i+window_size+1)
+        meds[i] = np.median(x[low: high])
+    base = np.std(np.abs(x - meds))
+    for i in range(len(x)):
+        if np.abs(meds[i] - x[i]) > base * sigma:
+            res[i] = meds[i]
+        else:
+            res[i] = x[i]
+    return meds
+
+
+@njit('float64(float64[:], float64[:])', cache=True)
+def _get_charge_time(I, t):  # noqa
+    res = 0.
+    for i in range(1, len(I)):
+        if I[i] < 0:
+            res += t[i] - t[i-1]
+    return res
+
+
+@njit('float64[:](float64[:], float64[:], boolean, float64)', cache=True)
+def _calc_Q(I, t, is_charge, time_unit):  # noqa
+    Q = np.zeros_like(I)
+    for i in range(1, len(I)):
+        if is_charge and I[i] > 0:
+            Q[i] = Q[i-1] + I[i] * (t[i] - t[i-1]) / time_unit
+        elif not is_charge and I[i] < 0:
+            Q[i] = Q[i-1] - I[i] * (t[i] - t[i-1]) / time_unit
+        else:
+            Q[i] = Q[i-1]
+    return Q
+
+
+@njit(['int64[:](int64[:])', 'float64[:](float64[:])'], cache=True)
+def _organize_cycle_index(cycle_index):
+    current_cycle, prev_value = cycle_index[0], cycle_index[0]
+    for i in range(1, len(cycle_index)):
+        if cycle_index[i] != prev_value:
+            current_cycle += 1
+            prev_value = cycle_index[i]
+        cycle_index[i] = current_cycle
+    return cycle_index
+
+
+@njit('boolean[:](float64[:], int64, float64)', cache=True)
+def _find_cycle_ends(current, lag, tolerance):
+    is_cycle_end = np.zeros(len(current), dtype=np.bool_)
+    enter_discharge_steps = 0
+    for i in range(len(current)):
+        I = current[i]  # noqa
+        if i > 0 and i < len(current) - 1:
+            # Process the non-smoothness
+            if np.abs(current[i] - current[i-1]) > tolerance \
+                    and np.abs(current[i] - current[i+1]) > tolerance:
+                I = current[i+1]  # noqa
+        if I < 0:  # discharge
+            enter_discharge_steps += 1
+        else:
+            enter_discharge_steps = 0
+        nms_size = 500
+        if enter_discharge_steps == lag:
+            t = i - lag + 1
+            if t > nms_size and np.max(is_cycle_end[t-nms_size:t]) > 0:
+                continue
+            is_cycle_end[t] = True
+
+    return is_cycle_end
+
+
+@njit('boolean[:](float64[:], float64)', cache=True)
+def _find_time_anomalies(time, tolerance):
+    prev = time[0]
+    result = np.ones(len(time), dtype=np.bool_)
+    for i in range(1, len(time)):
+        if time[i] - prev > tolerance:
+            result[i] = False
+        else:
+            prev = time[i]
+    return result
+
+
+@njit('boolean[:](float64[:], float64, int64)', cache=True)
+def _remove_abnormal_cycle(Qd, eps, window):  # noqa
+    to_remove = np.zeros(len(Qd), dtype=np.bool_)
+    for i in range(window, len(Qd)-window):
+        prev = max(0, i - window)
+        if np.abs(Qd[i] - np.median(Qd[prev:i])) > eps \
+                and np.abs(Qd[i] - np.median(Qd[i:i+window])) > eps:
+            to_remove[i] = True
+    return to_remove
+
+
+def _float_array(x) -> np.ndarray:
+    return np.asarray(x, dtype=np.float64)
+
+
+def smooth(x, window_size: int = 10, sigma: float = 3) -> np.ndarray:
+    """Running median of `x` over a window of `2 * window_size + 1`."""
+    return _smooth(_float_array(x), window_size, sigma)
+
+
+def get_charge_time(I, t) -> float:  # noqa
+    """Total time with a negative current."""
+    return _get_charge_time(_float_array(I), _float_array(t))
+
+
+def calc_Q(I, t, is_charge: bool, time_unit: float = 3600.):  # noqa
+    """Accumulated charge or discharge capacity in Ah from the current in A
+    and the time in `time_unit`s of an hour, e.g., 36e5 for milliseconds.
+    """
+    return _calc_Q(_float_array(I), _float_array(t), is_charge, time_unit)
+
+
+def organize_cycle_index(cycle_index) -> np.ndarray:
+    """Renumber the cycle index consecutively from the first one, on a
+    copy of the index."""
+    cycle_index = np.array(cycle_index)
+    if np.issubdtype(cycle_index.dtype, np.integer):
+        return _organize_cycle_index(cycle_index.astype(np.int64))
+    return _organize_cycle_index(cycle_index.astype(np.float64))
+
+
+def find_cycle_ends(current, lag: int = 10, tolerance: float = 0.1):
+    """Mask of the records where a discharge of `lag` steps starts."""
+    return _find_cycle_ends(_float_array(current), lag, tolerance)
+
+
+def find_time_anomalies(time, tolerance: float = 1e5) -> np.ndarray:
+    """Mask of the records whose time does not jump by over `tolerance`
+    from the previous valid record."""
+    return _find_time_anomalies(_float_array(time), tolerance)
+
+
+def remove_abnormal_cycle(Qd, eps: float = 0.05, window: int = 5):  # noqa
+    """Mask of the cycles whose capacity deviates from the medians of both
+    the previous and the next `window` cycles by over `eps`."""
+    return _remove_abnormal_cycle(_float_array(Qd), eps, window)
@@ -0,0 +1,34 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import sys
+import importlib
+
+from typing import Callable, Dict, Tuple
+
+
+def lazy_exports(package: str,
+                 exports: Dict[str, str]) -> Tuple[Callable, Callable]:
+    """Module `__getattr__` and `__dir__` (PEP 562) of a package whose
+    attributes are only imported from their submodules on first access.
+    The exports are also set as `__all__` of the package, so that they are
+    imported by `from package import *`.
+
+    Args:
+        package (str): `__name__` of the package.
+        exports (Dict[str, str]): the attribute names and the modules
+            defining them, relative to the package, e.g., `'.cnn'`.
+    """
+    def __getattr__(name: str):
+        if name not in exports:
+            raise AttributeError(
+                f'module {package!r} has no attribute {name!r}')
+        value = getattr(importlib.import_module(exports[name], package), name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(exports))
+
+    sys.modules[package].__all__ = list(exports)
+    return __getattr__, __dir__
@@ -1,6 +1,9 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
+import importlib
+
+
 class Registry:
     """Build a custom class instance using a dict.
 
@@ -29,10 +32,19 @@ class Registry:
 
     mymodel = MODELS.build(config)
     ```
+
+    Classes in modules with heavy dependencies can be registered by the
+    module defining them, which is only imported when the class is first
+    requested:
+
+    ```python
+    MODELS.register_lazy('MyModel', 'src.models.my_model')
+    ```
     """
     def __init__(self, name: str):
         self.name = name
         self.class_mapping = {}
+        self.lazy_mapping = {}
 
     def register(self, name=None):
         def _register(cls):
@@ -43,6 +55,22 @@ class Registry:
             return cls
         return _register
 
+    def register_lazy(self, name: str, module: str, package: str = None):
+        """Register a class by its module, e.g., `'.cnn'` relative to
+        `package`, where the class is registered with `register`."""
+        self.lazy_mapping[name] = (module, package)
+
+    def get(self, name: str):
+        """Return the registered class, importing its module if needed."""
+        if name not in self.class_mapping and name in self.lazy_mapping:
+            importlib.import_module(*self.lazy_mapping[name])
+        if name not in self.class_mapping:
+            raise KeyError(f'{name} is not registered to {self.name}!')
+        return self.class_mapping[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.class_mapping or name in self.lazy_mapping
+
     def build(self, config: dict, error_handle: str = 'raise', **kwargs):
         if config is None:
             return
@@ -50,8 +78,8 @@ class Registry:
         if name is None:
             return
 
-        if name in self.class_mapping:
-            return self.class_mapping[name](**{
+        if name in self:
+            return self.get(name)(**{
                 k: v for k, v in config.items()
                 if k != 'name' and k not in kwargs
             }, **kwargs)
@@ -0,0 +1,110 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Downsampling of long traces to the points that are visible at the
+resolution of a figure."""
+
+import numpy as np
+
+from typing import Tuple
+
+DECIMATION_METHODS = ['minmax', 'lttb']
+
+
+def minmax_decimate(x: np.ndarray,
+                    y: np.ndarray,
+                    n_bins: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the points of the minimum and the maximum `y` of each of the
+    `n_bins` equal-width columns of `x`, e.g., the pixel columns of the
+    axes, in their original order, which keeps the envelope of the trace
+    as drawn at full resolution."""
+    x, y = np.asarray(x), np.asarray(y)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    if len(x) <= 2 * n_bins:
+        return x, y
+    low, high = x.min(), x.max()
+    if high == low:
+        columns = np.zeros(len(x), dtype=np.int64)
+    else:
+        columns = ((x - low) / (high - low) * n_bins).astype(np.int64)
+        columns = columns.clip(max=n_bins - 1)
+    if np.all(columns[1:] >= columns[:-1]):
+        # Sorted `x`, e.g., time, of which the columns are contiguous
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        index = np.arange(len(x))
+        keep = []
+        for reduce in [np.minimum, np.maximum]:
+            extreme = np.repeat(
+                reduce.reduceat(y, starts), np.diff(np.r_[starts, len(x)]))
+            # First point of each column with the extreme value
+            keep.append(np.minimum.reduceat(
+                np.where(y == extreme, index, len(x)), starts))
+        keep = np.unique(np.concatenate(keep))
+        return x[keep], y[keep]
+
+    # Sorted by the column and then by `y`, so that the first and the last
+    # point of each column are its minimum and maximum
+    order = np.lexsort((y, columns))
+    sorted_columns = columns[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(sorted_columns) != 0])
+    ends = np.r_[starts[1:], len(order)] - 1
+    keep = np.unique(np.concatenate([order[starts], order[ends]]))
+    return x[keep], y[keep]
+
+
+def lttb(x: np.ndarray,
+         y: np.ndarray,
+         n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling to `n_out` points, which
+    keeps the first and the last point and, from each bucket in between,
+    the point forming the largest triangle with the point kept from the
+    previous bucket and the mean of the next bucket. It preserves the
+    visual shape better than the min-max decimation for smooth traces."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    every = (n - 2) / (n_out - 2)
+    bounds = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    # Means of the buckets, the last one being the last point
+    sizes = np.diff(np.r_[bounds, n])
+    mean_x = np.add.reduceat(x, bounds) / sizes
+    mean_y = np.add.reduceat(y, bounds) / sizes
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = bounds[i], bounds[i + 1]
+        # Twice the area of the triangle of each point of the bucket, as a
+        # linear function of the point
+        dx, dy = x[a] - mean_x[i + 1], mean_y[i + 1] - y[a]
+        area = np.abs(
+            y[start:end] * dx + x[start:end] * dy
+            + (mean_x[i + 1] * y[a] - x[a] * mean_y[i + 1]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def decimate(x: np.ndarray,
+             y: np.ndarray,
+             n_columns: int,
+             method: str = 'minmax') -> Tuple[np.ndarray, np.ndarray]:
+    """Downsample a trace drawn over `n_columns` pixel columns, to the
+    minimum and maximum of each column with `minmax_decimate` or a point
+    per column with `lttb`. The trace is kept as is if `method` is
+    `None`."""
+    if method is None:
+        return np.asarray(x), np.asarray(y)
+    assert method in DECIMATION_METHODS, f'Unknown decimation {method}'
+    if method == 'minmax':
+        return minmax_decimate(x, y, max(1, n_columns))
+    return lttb(x, y, max(3, n_columns))
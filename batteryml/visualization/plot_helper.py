@@ -1,8 +1,22 @@
 # Licensed under the MIT License.
 # Copyright (c) Microsoft Corporation.
 
+import os
 import matplotlib.pyplot as plt
 import numpy as np
+
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+from batteryml.visualization.decimation import decimate
+from batteryml.visualization.summary import cycle_summary, load_cycle_summary
+
+
+def _pixel_columns(figsize) -> int:
+    """Width of a figure in pixels, the resolution of the decimation."""
+    return int(figsize[0] * plt.rcParams['figure.dpi'])
+
+
 def plot_capacity_degradation(battery_data,
                               figsize=(12, 12),
                               normalize=True,
@@ -51,8 +65,18 @@ def plot_cycle_attribute(cycle_infos,
                            n_legend_cols=3,
                            x_feature = 'time_in_s',
                            fontsize='small',
-                           markerscale=0.5):
+                           markerscale=0.5,
+                           decimation='minmax',
+                           max_legend_entries=30):
+    """Plot an attribute of the selected cycles.
+
+    Each trace is downsampled to the pixel columns of the figure, see
+    `decimate` (`minmax`, `lttb` or `None` for the raw samples), and the
+    legend is drawn once, with at most `max_legend_entries` evenly spaced
+    cycles.
+    """
     plt.figure(figsize=figsize)
+    n_columns = _pixel_columns(figsize)
 
     if cycle_indices:
         cycle_infos = [cycle_infos[i] for i in cycle_indices]
@@ -66,8 +90,7 @@ def plot_cycle_attribute(cycle_infos,
         x = [getattr(cycle_info, 'cycle_number') for cycle_info in cycle_infos]
         plt.plot(x, y)
         xlabel = 'cycle'
-
-    if key_fea == 'coulombic_efficiency':
+    elif key_fea == 'coulombic_efficiency':
         # build coulombic_efficiency
         y = [max(cycle_info.discharge_capacity_in_Ah) / max(cycle_info.charge_capacity_in_Ah)  for cycle_info in cycle_infos]
         x = [getattr(cycle_info, 'cycle_number') for cycle_info in cycle_infos]
@@ -75,26 +98,130 @@ def plot_cycle_attribute(cycle_infos,
         xlabel = 'cycle'
     else:
         colors = plt.cm.jet(np.linspace(0, 1, length))
+        xlabel = x_feature
+        handles = []
 
         for color, cycle_info in zip(colors, cycle_infos):
 
             y = getattr(cycle_info, key_fea)
-            if isinstance(y, np.float64):
+            if y is None or isinstance(y, np.float64):
                 continue
-            if x_feature and  hasattr(cycle_info, x_feature):
+            if x_feature and getattr(cycle_info, x_feature, None) is not None:
                 x = getattr(cycle_info, x_feature)
             else:
-                x = [i for i in range(len(y))]
-
-            plt.plot(x[index_start:index_end], y[index_start:index_end],color=color, label=f'Cycle {cycle_info.cycle_number}')
-            plt.legend(bbox_to_anchor=(1.04, 1), loc="upper left", ncol=n_legend_cols, fontsize=fontsize, markerscale=markerscale)
-            xlabel = x_feature
+                x = np.arange(len(y))
+
+            x, y = decimate(
+                np.asarray(x)[index_start:index_end],
+                np.asarray(y)[index_start:index_end],
+                n_columns, decimation)
+            handles.append(plt.plot(
+                x, y, color=color, label=f'Cycle {cycle_info.cycle_number}'
+            )[0])
+
+        if handles:
+            step = max(1, -(-len(handles) // max_legend_entries))
+            plt.legend(handles=handles[::step],
+                       bbox_to_anchor=(1.04, 1), loc="upper left",
+                       ncol=n_legend_cols, fontsize=fontsize,
+                       markerscale=markerscale)
     plt.grid()
     plt.xlabel(xlabel)
     plt.ylabel(key_fea)
     plt.title(title)
 
 
+def plot_capacity_fade(cells,
+                       figsize=(12, 8),
+                       normalize=True,
+                       title='',
+                       n_legend_cols=3,
+                       max_legend_entries=30,
+                       ylim=None,
+                       decimation='minmax',
+                       ax=None):
+    """Overview of the capacity fade of many cells, e.g., thousands, from
+    their per-cycle summaries, which are cached next to the cell files (see
+    `load_cycle_summary`) so that the raw traces are loaded only once.
+
+    Args:
+        cells (list): see `plot_summary_trend`.
+        normalize (bool): plot the capacity relative to the nominal one.
+        decimation (str): downsampling of the curves, see `decimate`.
+        ax (Axes): axes to draw on, a new figure if `None`.
+    """
+    def capacity(summary):
+        if normalize:
+            return summary['discharge_capacity'] \
+                / summary['nominal_capacity_in_Ah']
+        return summary['discharge_capacity']
+
+    plot_summary_trend(
+        cells, capacity, figsize=figsize, title=title, ylabel='Capacity',
+        n_legend_cols=n_legend_cols, max_legend_entries=max_legend_entries,
+        ylim=ylim, decimation=decimation, ax=ax)
+
+
+def plot_summary_trend(cells,
+                       values,
+                       figsize=(12, 8),
+                       title='',
+                       ylabel='',
+                       n_legend_cols=3,
+                       max_legend_entries=30,
+                       ylim=None,
+                       decimation='minmax',
+                       ax=None):
+    """Per-cycle trend of many cells from their per-cycle summaries.
+
+    All curves are drawn as a single collection, and the cells are only
+    named in the legend if there are at most `max_legend_entries` of them.
+
+    Args:
+        cells (list): paths of the processed cell files, `BatteryData`, or
+            summaries of `cycle_summary`.
+        values (callable): per-cycle values to plot of a summary, e.g.,
+            `lambda summary: summary['internal_resistance']`.
+        decimation (str): downsampling of the curves, see `decimate`.
+        ax (Axes): axes to draw on, a new figure if `None`.
+    """
+    if ax is None:
+        plt.figure(figsize=figsize)
+        ax = plt.gca()
+    n_columns = int(ax.get_window_extent().width)
+
+    segments, names = [], []
+    for cell in cells:
+        if isinstance(cell, dict):
+            summary = cell
+        elif isinstance(cell, (str, os.PathLike)):
+            summary = load_cycle_summary(cell)
+        else:
+            summary = cycle_summary(cell)
+        y = values(summary)
+        x = np.arange(len(y)) + 1
+        x, y = decimate(x, y, n_columns, decimation)
+        segments.append(np.column_stack([x, y]))
+        names.append(str(summary['cell_id']))
+
+    colors = plt.cm.jet(np.linspace(0, 1, len(segments)))
+    ax.add_collection(LineCollection(segments, colors=colors))
+    ax.autoscale()
+
+    if 0 < len(names) <= max_legend_entries:
+        handles = [
+            Line2D([], [], color=color, label=name)
+            for color, name in zip(colors, names)
+        ]
+        ax.legend(handles=handles, bbox_to_anchor=(1.04, 1),
+                  loc="upper left", ncol=n_legend_cols)
+    ax.grid()
+    ax.set_title(title or f'{len(names)} cells')
+    ax.set_xlabel('Cycles')
+    ax.set_ylabel(ylabel)
+    if ylim:
+        ax.set_ylim(ylim)
+
 
 def plot_result(ground_truth_y, y_pred):
     # normalized_y = (y - y.min()) / (y.max() - y.min()) 
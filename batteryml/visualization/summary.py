@@ -0,0 +1,143 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Per-cycle summaries of the cells, cached next to the processed files so
+that overviews of many cells do not load the raw traces."""
+
+import os
+import pickle
+import numpy as np
+
+from typing import Callable, Dict
+
+from batteryml.data.battery_data import BatteryData
+from batteryml.feature.trajectory import CYCLE_FEATURES
+
+SUMMARY_SUFFIX = '.summary.npz'
+CURVES_SUFFIX = '.curves.npz'
+
+
+def cycle_summary(cell_data: BatteryData) -> Dict[str, np.ndarray]:
+    """Cycle numbers and the per-cycle summaries of `CYCLE_FEATURES`, in
+    absolute units, with the id and the nominal capacity of the cell."""
+    cycles = cell_data.cycle_data
+    summary = {
+        'cell_id': np.array(str(cell_data.cell_id)),
+        'cycle_number': np.array(
+            [cycle.cycle_number for cycle in cycles], dtype=float),
+        'nominal_capacity_in_Ah': np.array(
+            np.nan if cell_data.nominal_capacity_in_Ah is None
+            else cell_data.nominal_capacity_in_Ah, dtype=float),
+    }
+    for name, func in CYCLE_FEATURES.items():
+        summary[name] = np.array(
+            [func(cycle) for cycle in cycles], dtype=float)
+    return summary
+
+
+def sample_cycles(num_cycles: int, n: int) -> list:
+    """Indices of `n` evenly spaced cycles, with the first and the last."""
+    if num_cycles <= n:
+        return list(range(num_cycles))
+    return sorted(set(np.linspace(0, num_cycles - 1, n).round().astype(int)))
+
+
+def sampled_curves(cell_dict: dict, n: int) -> Dict[str, np.ndarray]:
+    """Discharge capacity and voltage traces of `n` evenly sampled cycles
+    of a loaded cell file, concatenated with the `offsets` of the cycles.
+    Cycles without these traces are skipped."""
+    cycles = cell_dict.get('cycle_data') or []
+    numbers, capacity, voltage, offsets = [], [], [], [0]
+    for index in sample_cycles(len(cycles), n):
+        cycle = cycles[index]
+        q = cycle.get('discharge_capacity_in_Ah')
+        v = cycle.get('voltage_in_V')
+        if q is None or v is None:
+            continue
+        numbers.append(cycle['cycle_number'])
+        capacity.append(np.asarray(q, dtype=float))
+        voltage.append(np.asarray(v, dtype=float))
+        offsets.append(offsets[-1] + len(capacity[-1]))
+    return {
+        'num_sampled': np.array(n),
+        'cycle_number': np.array(numbers, dtype=float),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'discharge_capacity': np.concatenate(capacity or [np.zeros(0)]),
+        'voltage': np.concatenate(voltage or [np.zeros(0)]),
+    }
+
+
+def is_cached(path: str, suffix: str) -> bool:
+    """Whether the cache of a cell file is newer than the file."""
+    cache_path = str(path) + suffix
+    return os.path.exists(cache_path) \
+        and os.path.getmtime(cache_path) >= os.path.getmtime(path)
+
+
+def load_cycle_summary(path: str,
+                       cell_dict: dict = None) -> Dict[str, np.ndarray]:
+    """Summary of a processed cell file, computed once and kept as
+    `<path>.summary.npz`, which is rebuilt when the cell file is newer.
+
+    Args:
+        cell_dict (dict): content of the cell file if already loaded, from
+            which the summary is computed if needed.
+    """
+    def compute():
+        if cell_dict is not None:
+            return cycle_summary(BatteryData.from_dict(cell_dict))
+        return cycle_summary(BatteryData.load(path))
+
+    return _load_cached(path, SUMMARY_SUFFIX, compute)
+
+
+def load_sampled_curves(path: str,
+                        n: int,
+                        cell_dict: dict = None) -> Dict[str, np.ndarray]:
+    """`sampled_curves` of a processed cell file, kept as
+    `<path>.curves.npz` and rebuilt when the cell file is newer or `n`
+    changes, so that the raw traces are only read once.
+
+    Args:
+        cell_dict (dict): content of the cell file if already loaded.
+    """
+    def compute():
+        if cell_dict is not None:
+            return sampled_curves(cell_dict, n)
+        with open(path, 'rb') as f:
+            return sampled_curves(pickle.load(f), n)
+
+    return _load_cached(
+        path, CURVES_SUFFIX, compute,
+        valid=lambda curves: int(curves['num_sampled']) == n)
+
+
+def _load_cached(path: str,
+                 suffix: str,
+                 compute: Callable[[], dict],
+                 valid: Callable[[dict], bool] = None) -> dict:
+    cache_path = str(path) + suffix
+    if is_cached(path, suffix):
+        try:
+            with np.load(cache_path) as data:
+                result = {key: data[key] for key in data.files}
+            if valid is None or valid(result):
+                return result
+        except Exception:
+            # E.g., a truncated file of an interrupted report, which is
+            # rebuilt below
+            pass
+
+    result = compute()
+    # Written through a temporary file, so that the parallel workers of a
+    # report never read a partially written cache
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **result)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # E.g., the directory of the cell file is read-only
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return result
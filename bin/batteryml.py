@@ -8,11 +8,11 @@ import argparse
 
 from pathlib import Path
 
-from batteryml.preprocess import (
-    DOWNLOAD_LINKS, download_file, SUPPORTED_SOURCES
-)
-from batteryml.pipeline import Pipeline
-from batteryml.builders import PREPROCESSORS
+# Only the light modules needed by the parser are imported here, the
+# commands import the rest so that `--help` and `download` start fast
+from batteryml.preprocess import SUPPORTED_SOURCES
+from batteryml.preprocess.download import DOWNLOAD_LINKS
+from batteryml.runtime import EXPORT_FORMATS
 
 
 def main():
@@ -71,20 +71,186 @@ def main():
         help="Run evaluation. Will skip eval if this flag is not provided.")
     run_parser.add_argument(
         "--metric", default="RMSE,MAE,MAPE",
-        help="Metrics for evaluation, seperated by comma")
+        help="Metrics for evaluation, seperated by comma, among RMSE, MAE, "
+             "MAPE, R2 and the percentiles of the absolute (percentage) "
+             "errors such as AE_P90 or APE_P50. COVERAGE and WIDTH score "
+             "the prediction intervals.")
+    run_parser.add_argument(
+        "--alpha", type=float, default=0.1,
+        help="Miscoverage rate of the prediction intervals, which are "
+             "supported by the Gaussian process and random forest models, "
+             "the NN models applying dropout and the multi-seed ensembles")
+    run_parser.add_argument(
+        "--group-by", "--group_by", dest="group_by", default=None,
+        choices=["dataset", "chemistry", "protocol", "cell"],
+        help="Also score each group of test cells")
+    run_parser.add_argument(
+        "--bootstrap", type=int, default=0,
+        help="Number of bootstrap resamples of the confidence intervals "
+             "of the scores, none by default")
+    run_parser.add_argument(
+        "--confidence", type=float, default=0.95,
+        help="Confidence level of the bootstrap intervals")
     run_parser.add_argument(
         "--seed", type=int, default=0, help="random seed")
+    run_parser.add_argument(
+        "--seeds", type=str, default=None,
+        help="Random seeds seperated by comma, e.g. 0,1,2. All seeds are "
+             "trained in one process as a vectorized ensemble and "
+             "evaluated one by one. Overrides --seed.")
     run_parser.add_argument(
         "--epochs", type=int, help="number of epochs override")
     run_parser.add_argument(
         "--skip_if_executed", type=str, default='False', help="skip train/evaluate if the model executed")
+    run_parser.add_argument(
+        "--cv", action="store_true",
+        help="Cross validate over the folds of the train/test splitter, "
+             "e.g. GroupKFoldTrainTestSplitter, instead of --train/--eval")
+    run_parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of processes running the cross validation folds")
+    run_parser.add_argument(
+        "--results-db", "--results_db", dest="results_db", default=None,
+        help="SQLite results store to add the evaluation to, defaults to "
+             "workspaces/results.db, 'none' to disable")
     run_parser.set_defaults(func=run)
 
+    # sweep command
+    sweep_parser = subparsers.add_parser(
+        "sweep",
+        help="Train and evaluate many configs and seeds in parallel")
+    sweep_parser.add_argument(
+        "configs", nargs="+",
+        help="Config files or glob patterns, e.g. 'configs/baselines/**/*.yaml'")
+    sweep_parser.add_argument(
+        "--seeds", default="0", help="Random seeds, e.g. 0-9 or 0,1,5-7")
+    sweep_parser.add_argument(
+        "--workspace-root", "--workspace_root", dest="workspace_root",
+        default="workspaces",
+        help="Root directory of the workspaces, the workspace of "
+             "configs/a/b.yaml is <workspace-root>/a/b")
+    sweep_parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes")
+    sweep_parser.add_argument(
+        "--cpu-budget", "--cpu_budget", dest="cpu_budget", type=int,
+        default=None, help="Total CPU threads shared by the workers")
+    sweep_parser.add_argument(
+        "--device", default="cpu", help="Running device")
+    sweep_parser.add_argument(
+        "--metric", default="RMSE,MAE,MAPE",
+        help="Metrics for evaluation, seperated by comma")
+    sweep_parser.add_argument(
+        "--rerun", action="store_true",
+        help="Rerun the jobs that already have results. By default, "
+             "finished jobs are skipped to resume an interrupted sweep.")
+    sweep_parser.add_argument(
+        "--results-db", "--results_db", dest="results_db", default=None,
+        help="SQLite results store, defaults to <workspace-root>/results.db")
+    sweep_parser.set_defaults(func=sweep)
+
+    # results command
+    results_parser = subparsers.add_parser(
+        "results", help="Build result tables from the results store")
+    results_parser.add_argument(
+        "--db", default=None,
+        help="Path to the results store, defaults to workspaces/results.db")
+    results_parser.add_argument(
+        "--metric", default="RMSE", help="Metric of the leaderboard")
+    results_parser.add_argument(
+        "--config", default=None,
+        help="SQL LIKE pattern of the configs, e.g. 'configs/baselines/%%'")
+    results_parser.add_argument(
+        "--long", action="store_true",
+        help="Print the scores of every (config, seed, metric) instead of "
+             "the leaderboard")
+    results_parser.add_argument(
+        "--output", default=None,
+        help="Save the table to a CSV file")
+    results_parser.set_defaults(func=results)
+
+    # serve command
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve the predictions of a trained model over HTTP")
+    serve_parser.add_argument(
+        "config", help="Path to the config file")
+    serve_parser.add_argument(
+        "--workspace", required=True,
+        help="Workspace of the trained model")
+    serve_parser.add_argument(
+        "--ckpt", default=None,
+        help="Checkpoint to serve, defaults to latest.ckpt in the workspace")
+    serve_parser.add_argument(
+        "--device", default="cpu", help="Running device")
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Host to bind")
+    serve_parser.add_argument(
+        "--port", type=int, default=8000, help="Port to bind")
+    serve_parser.add_argument(
+        "--unix-socket", "--unix_socket", dest="unix_socket", default=None,
+        help="Bind to a Unix socket instead of a port")
+    serve_parser.add_argument(
+        "--max-batch-size", "--max_batch_size", dest="max_batch_size",
+        type=int, default=64, help="Maximum number of requests in a batch")
+    serve_parser.add_argument(
+        "--max-wait-ms", "--max_wait_ms", dest="max_wait_ms",
+        type=float, default=5.,
+        help="Maximum time a request waits for its batch to fill up")
+    serve_parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Do not log requests")
+    serve_parser.add_argument(
+        "--data-dir", "--data_dir", dest="data_dir", default=None,
+        help="Allow the requests to load cell pickles by path under this "
+             "directory, which must only contain trusted files since "
+             "unpickling runs code. Disabled by default.")
+    serve_parser.set_defaults(func=serve)
+
+    # export command
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export a trained model with its transformations for "
+             "deployment")
+    export_parser.add_argument(
+        "config", help="Path to the config file")
+    export_parser.add_argument(
+        "--workspace", required=True,
+        help="Workspace of the trained model")
+    export_parser.add_argument(
+        "--ckpt", default=None,
+        help="Checkpoint to export, defaults to latest.ckpt in the workspace")
+    export_parser.add_argument(
+        "--output", default=None,
+        help="Export directory, defaults to export/ in the workspace")
+    export_parser.add_argument(
+        "--format", choices=EXPORT_FORMATS, default="torchscript",
+        help="Format of the exported model")
+    export_parser.set_defaults(func=export)
+
+    # report command
+    report_parser = subparsers.add_parser(
+        "report",
+        help="Render QA figures of processed cells to PNG and HTML")
+    report_parser.add_argument(
+        "cells", nargs="+",
+        help="Processed cell files, directories or glob patterns, "
+             "e.g. data/processed/MATR")
+    report_parser.add_argument(
+        "--output", default="reports", help="Directory of the report")
+    report_parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes")
+    report_parser.add_argument(
+        "--cycles", type=int, default=8,
+        help="Number of sampled cycles of the V-Q curves of each cell")
+    report_parser.add_argument(
+        "--dpi", type=int, default=100, help="Resolution of the figures")
+    report_parser.set_defaults(func=report)
+
     args = parser.parse_args()
     args.func(args)
 
 
 def download(args):
+    from batteryml.preprocess.download import download_file
+
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
     raw_dir = Path(args.output_dir)
@@ -97,6 +263,11 @@ def download(args):
 
 
 def preprocess(args):
+    import logging
+    from batteryml.builders import PREPROCESSORS
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
     assert os.path.exists(
         args.raw_dir), f'Input path not exist: {args.raw_dir}'
     if not os.path.exists(args.output_dir):
@@ -113,9 +284,24 @@ def preprocess(args):
 
 
 def run(args):
+    from batteryml.pipeline import Pipeline
+    from batteryml.results import RESULTS_DB
+
     # Convert skip_if_executed to boolean
     args.skip_if_executed = args.skip_if_executed.lower() in ['true', '1', 'yes']
-    pipeline = Pipeline(args.config, args.workspace)
+    results_db = args.results_db or RESULTS_DB
+    if str(results_db).strip().lower() == 'none':
+        results_db = None
+    pipeline = Pipeline(args.config, args.workspace, results_db=results_db)
+    if args.cv:
+        return pipeline.cross_validate(
+            seed=args.seed,
+            device=args.device,
+            metric=args.metric.split(','),
+            workers=args.workers,
+            alpha=args.alpha)
+    if args.seeds is not None:
+        return run_ensemble(args, pipeline)
     model, dataset = None, None  # Reuse to save setup cost
     if args.train:
         model, dataset = pipeline.train(
@@ -134,9 +320,130 @@ def run(args):
             model=model,
             dataset=dataset,
             ckpt_to_resume=args.ckpt_to_resume,
-            skip_if_executed=args.skip_if_executed
+            skip_if_executed=args.skip_if_executed,
+            alpha=args.alpha,
+            group_by=args.group_by,
+            bootstrap=args.bootstrap,
+            confidence=args.confidence
         )
 
 
+def run_ensemble(args, pipeline):
+    seeds = [int(seed) for seed in args.seeds.split(',')]
+    models, dataset = [None] * len(seeds), None
+    if args.train:
+        trained, trained_seeds, dataset = pipeline.train_ensemble(
+            seeds=seeds,
+            epochs=args.epochs,
+            device=args.device,
+            dataset=dataset,
+            skip_if_executed=args.skip_if_executed)
+        for seed, model in zip(trained_seeds, trained):
+            models[seeds.index(seed)] = model
+    if args.eval:
+        metric = args.metric.split(',')
+        for seed, model in zip(seeds, models):
+            pipeline.evaluate(
+                seed=seed,
+                device=args.device,
+                metric=metric,
+                model=model,
+                dataset=dataset,
+                ckpt_to_resume=args.ckpt_to_resume,
+                skip_if_executed=args.skip_if_executed,
+                alpha=args.alpha,
+                group_by=args.group_by,
+                bootstrap=args.bootstrap,
+                confidence=args.confidence
+            )
+        # The spread over the seeds gives the intervals of the ensemble
+        if len(seeds) > 1 and all(model is not None for model in models):
+            pipeline.evaluate_ensemble(
+                models, seeds, dataset, metric=metric, alpha=args.alpha)
+
+
+def sweep(args):
+    from batteryml.sweep import Sweep, find_configs, parse_seeds
+
+    configs = find_configs(args.configs)
+    assert configs, f'No config matches {args.configs}'
+    Sweep(configs,
+          parse_seeds(args.seeds),
+          workspace_root=args.workspace_root,
+          workers=args.workers,
+          cpu_budget=args.cpu_budget,
+          device=args.device,
+          metric=args.metric.split(','),
+          rerun=args.rerun,
+          results_db=args.results_db).run()
+
+
+def results(args):
+    from batteryml.results import RESULTS_DB, ResultsStore
+
+    db = args.db or RESULTS_DB
+    assert os.path.exists(db), f'Results store not exist: {db}'
+    store = ResultsStore(db)
+    if args.long:
+        table = store.scores(args.config)
+    else:
+        table = store.leaderboard(args.metric, args.config)
+    if args.output is not None:
+        table.to_csv(args.output)
+    print(table.to_string())
+
+
+def serve(args):
+    from batteryml.online import OnlineInferenceEngine
+    from batteryml.serve import PredictionServer
+
+    engine = OnlineInferenceEngine.from_workspace(
+        args.config, args.workspace, args.ckpt, args.device)
+    server = PredictionServer(
+        engine,
+        host=args.host,
+        port=args.port,
+        unix_socket=args.unix_socket,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        quiet=args.quiet,
+        data_dir=args.data_dir)
+    address = args.unix_socket or f'http://{args.host}:{args.port}'
+    print(f'Serving {args.workspace} on {address}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def export(args):
+    from batteryml.export import export_model
+
+    try:
+        export_model(
+            args.config,
+            args.workspace,
+            output=args.output,
+            ckpt_to_resume=args.ckpt,
+            format=args.format)
+    except NotImplementedError as e:
+        # E.g., the tree ensembles and the kernel models
+        raise SystemExit(f'{args.config} is not exportable: {e}')
+
+
+def report(args):
+    from batteryml.report import Report, find_cells
+
+    cells = find_cells(args.cells)
+    assert cells, f'No cell file matches {args.cells}'
+    Report(cells,
+           output=args.output,
+           workers=args.workers,
+           num_cycles=args.cycles,
+           dpi=args.dpi).run()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,83 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Benchmark the CPU performance profiles of the NN RUL predictors.
+
+Each config is trained for a few epochs under every profile and a markdown
+table of the epoch time and the final test RMSE is printed, e.g.,
+
+    python scripts/benchmark_cpu_profile.py \
+        configs/baselines/nn_models/*/matr_1.yaml --epochs 20 --threads 8
+"""
+
+import os
+import time
+import argparse
+
+from batteryml.pipeline import Pipeline, build_dataset, set_seed
+
+
+PROFILES = {
+    'default': {},
+    'threads': {'num_threads': None},
+    'bf16': {'precision': 'bf16'},
+    'channels_last': {'channels_last': True},
+    'compile': {'compile': {'backend': 'inductor'}},
+    'compile+bf16': {'compile': {'backend': 'inductor'}, 'precision': 'bf16'},
+    'compile-autotune': {
+        'compile': {'mode': 'max-autotune-no-cudagraphs'}
+    },
+}
+
+
+def benchmark(config_path, profile, epochs, threads, seed):
+    pipeline = Pipeline(config_path, 'none')
+    model_config = pipeline.config['model']
+    if 'channels_last' in profile and \
+            model_config['name'] != 'CNNRULPredictor':
+        return None
+    profile = dict(profile)
+    if 'num_threads' in profile:
+        profile['num_threads'] = threads
+    model_config.update(profile)
+    dataset, _ = build_dataset(pipeline.config, 'cpu')
+
+    set_seed(seed)
+    start = time.perf_counter()
+    model, dataset = pipeline.train(
+        seed=seed, epochs=epochs, skip_if_executed=False, dataset=dataset)
+    elapsed = time.perf_counter() - start
+    rmse = dataset.evaluate(model.predict(dataset), 'RMSE')
+    return model_config['name'], elapsed / epochs, rmse
+
+
+def main():
+    parser = argparse.ArgumentParser(__doc__)
+    parser.add_argument('configs', nargs='+', help='NN model configs')
+    parser.add_argument('--profiles', default=','.join(PROFILES),
+                        help='Profiles to benchmark, seperated by comma')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=os.cpu_count(),
+                        help='Intra-op threads of the "threads" profile')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    for config_path in args.configs:
+        for name in args.profiles.split(','):
+            result = benchmark(
+                config_path, PROFILES[name],
+                args.epochs, args.threads, args.seed)
+            if result is not None:
+                rows.append((config_path, name, *result))
+
+    print('| Config | Predictor | Profile | Sec/epoch (incl. compile) '
+          '| Final RMSE |')
+    print('|---|---|---|---|---|')
+    for config_path, name, predictor, epoch_time, rmse in rows:
+        print(f'| {config_path} | {predictor} | {name} '
+              f'| {epoch_time:.3f} | {rmse:.1f} |')
+
+
+if __name__ == '__main__':
+    main()
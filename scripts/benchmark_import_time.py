@@ -0,0 +1,85 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Benchmark the startup time of the batteryml CLI and library.
+
+Each scenario runs in a fresh interpreter under `python -X importtime`.
+A markdown table of the median wall time and the slowest top-level
+imports is printed. Run it from the root of the repository, e.g.,
+
+    python scripts/benchmark_import_time.py --repeats 5
+"""
+
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+from collections import defaultdict
+
+
+SCENARIOS = {
+    'cli --help': ['-m', 'bin.batteryml', '--help'],
+    'cli download --help': ['-m', 'bin.batteryml', 'download', '--help'],
+    'import batteryml': ['-c', 'import batteryml'],
+    'build a sklearn model': [
+        '-c',
+        'from batteryml.builders import MODELS; '
+        'MODELS.build({"name": "RidgeRULPredictor"})'
+    ],
+    'build a torch model': [
+        '-c',
+        'from batteryml.builders import MODELS; '
+        'MODELS.build({"name": "CNNRULPredictor", "in_channels": 1, '
+        '"channels": 4, "input_height": 10, "input_width": 10})'
+    ],
+}
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative import time in seconds of the top-level packages."""
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented, keep the outermost ones
+        if name.startswith('  '):
+            continue
+        packages[name.strip().split('.')[0]] += int(cumulative) / 1e6
+    return packages
+
+
+def benchmark(args: list, repeats: int):
+    wall_times, packages = [], {}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', *args],
+            capture_output=True, text=True, check=True)
+        wall_times.append(time.perf_counter() - start)
+        packages = parse_importtime(result.stderr)
+    return statistics.median(wall_times), packages
+
+
+def main():
+    parser = argparse.ArgumentParser(__doc__)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='Scenarios to benchmark, seperated by comma')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5,
+                        help='Number of the slowest imports to show')
+    args = parser.parse_args()
+
+    print('| Scenario | Wall time (s) | Slowest imports (s) |')
+    print('|---|---|---|')
+    for name in args.scenarios.split(','):
+        wall_time, packages = benchmark(SCENARIOS[name], args.repeats)
+        slowest = sorted(packages.items(), key=lambda x: -x[1])[:args.top]
+        slowest = ', '.join(f'{pkg} {t:.2f}' for pkg, t in slowest)
+        print(f'| {name} | {wall_time:.2f} | {slowest} |')
+
+
+if __name__ == '__main__':
+    main()
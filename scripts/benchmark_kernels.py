@@ -0,0 +1,110 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+"""Benchmark the first-call latency of the numba kernels.
+
+Each mode runs in a fresh interpreter, as a pool worker or a sweep job
+does, and times the import of `batteryml.utils.kernels` and the first and
+second calls of every kernel:
+
+    jit       compile on the first call without caching, as the kernels
+              were before they had signatures and `cache=True`
+    cold      compile for the signatures and fill an empty on-disk cache
+    warm      load the compiled kernels from the on-disk cache
+
+Example:
+
+    python scripts/benchmark_kernels.py
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+
+WORKER = r'''
+import sys
+import json
+import time
+import numpy as np
+
+start = time.perf_counter()
+from batteryml.utils import kernels
+import_time = time.perf_counter() - start
+
+if sys.argv[1] == 'jit':
+    from numba import njit
+    for name in dir(kernels):
+        func = getattr(kernels, name)
+        if name.startswith('_') and hasattr(func, 'py_func'):
+            setattr(kernels, name, njit(func.py_func))
+
+rng = np.random.default_rng(0)
+x = rng.normal(size=1000)
+current = rng.normal(size=10000)
+time_in_s = np.cumsum(rng.random(10000))
+calls = {
+    'smooth': lambda: kernels.smooth(x),
+    'get_charge_time': lambda: kernels.get_charge_time(current, time_in_s),
+    'calc_Q': lambda: kernels.calc_Q(current, time_in_s, True),
+    'organize_cycle_index': lambda: kernels.organize_cycle_index(
+        np.repeat(np.arange(100), 100)),
+    'find_cycle_ends': lambda: kernels.find_cycle_ends(current),
+    'find_time_anomalies': lambda: kernels.find_time_anomalies(time_in_s),
+    'remove_abnormal_cycle': lambda: kernels.remove_abnormal_cycle(x),
+}
+result = {'import': import_time}
+for name, call in calls.items():
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    result[name] = times
+print(json.dumps(result))
+'''
+
+
+def run(mode: str, cache_dir: str) -> dict:
+    env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER, mode],
+        env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(__doc__)
+    parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        results = {'cold': run('cold', cache_dir)}
+        results['warm'] = run('warm', cache_dir)
+        # Imported from the warm cache, then recompiled lazily
+        results['jit'] = run('jit', cache_dir)
+
+    modes = list(results)
+    print('| Kernel | ' + ' | '.join(
+        f'{mode} first / second call (ms)' for mode in modes) + ' |')
+    print('|---' * (len(modes) + 1) + '|')
+    print('| import | ' + ' | '.join(
+        f'{results[mode]["import"] * 1000:.1f}' for mode in modes) + ' |')
+    totals = {mode: results[mode]['import'] for mode in modes}
+    for name in results['cold']:
+        if name == 'import':
+            continue
+        cells = []
+        for mode in modes:
+            first, second = results[mode][name]
+            totals[mode] += first
+            cells.append(f'{first * 1000:.1f} / {second * 1000:.3f}')
+        print(f'| {name} | ' + ' | '.join(cells) + ' |')
+    print('| total startup | ' + ' | '.join(
+        f'{totals[mode] * 1000:.1f}' for mode in modes) + ' |')
+
+
+if __name__ == '__main__':
+    main()
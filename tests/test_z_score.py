@@ -0,0 +1,33 @@
+# Licensed under the MIT License.
+# Copyright (c) Microsoft Corporation.
+
+import torch
+
+from batteryml.data.transformation.z_score import ZScoreDataTransformation
+
+
+def test_partial_fit_and_merge_match_fit():
+    torch.manual_seed(0)
+    data = torch.randn(1000, 7) * 50 + 1e4
+
+    expected = ZScoreDataTransformation()
+    expected.fit(data)
+
+    workers = []
+    for rows in torch.tensor_split(data, 3):
+        worker = ZScoreDataTransformation()
+        for chunk in torch.tensor_split(rows, 4):
+            worker.partial_fit(chunk)
+        workers.append(worker)
+    # A worker without any rows, e.g., of an empty shard
+    workers.append(ZScoreDataTransformation().partial_fit(data[:0]))
+
+    merged = ZScoreDataTransformation()
+    for worker in reversed(workers):
+        merged.merge(worker)
+
+    assert merged._mean.dtype == data.dtype
+    torch.testing.assert_close(merged._mean, expected._mean)
+    torch.testing.assert_close(merged._std, expected._std)
+    torch.testing.assert_close(
+        merged.transform(data), expected.transform(data))